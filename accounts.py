@@ -1,28 +1,35 @@
+import asyncio
+import logging
 import os
+import tempfile
+import time
 from typing import Dict, Optional, Tuple
 
 import socks
 from telethon import TelegramClient, events
+from telethon.crypto import AuthKey
 from telethon.errors import SessionPasswordNeededError
+from telethon.sessions import SQLiteSession
 
 from config import (
     API_HASH,
     API_ID,
     FORWARD_TO_ID,
-    SESSIONS_DIR,
     TELEGRAM_SERVICE_ID,
 )
+from db import load_session_data, session_name_from_path
+from limiter import AUTH, FORWARD, throttled
+from models import Account
+from session_store import DatabaseSession
+import latency
+import tracing
+
+logger = logging.getLogger(__name__)
 
 # Active clients dictionary: account_id -> TelegramClient
 ACCOUNT_CLIENTS: Dict[int, TelegramClient] = {}
 
 
-def ensure_sessions_dir():
-    """Ensure sessions directory exists"""
-    if not os.path.exists(SESSIONS_DIR):
-        os.makedirs(SESSIONS_DIR, exist_ok=True)
-
-
 def build_proxy_tuple(
     host: Optional[str],
     port: Optional[int],
@@ -38,33 +45,47 @@ def build_proxy_tuple(
         return (socks.SOCKS5, host, int(port))
 
 
-async def get_or_create_client(account: dict) -> TelegramClient:
+async def _connect(account_id: int, client: TelegramClient):
+    """Connect a client, recording how long it took (failures included)"""
+    started = time.perf_counter()
+    try:
+        await client.connect()
+    except Exception as e:
+        elapsed = time.perf_counter() - started
+        latency.record(account_id, latency.CONNECT, elapsed)
+        tracing.api_call(account_id, latency.CONNECT, "connect", elapsed, error=e)
+        raise
+    elapsed = time.perf_counter() - started
+    latency.record(account_id, latency.CONNECT, elapsed)
+    tracing.api_call(account_id, latency.CONNECT, "connect", elapsed)
+
+
+async def get_or_create_client(account: Account) -> TelegramClient:
     """Get existing or create new TelegramClient for account"""
-    account_id = account["id"]
+    account_id = account.id
     
     # Return existing client if already connected
     if account_id in ACCOUNT_CLIENTS:
         client = ACCOUNT_CLIENTS[account_id]
         if not client.is_connected():
-            await client.connect()
+            await _connect(account_id, client)
         return client
     
-    ensure_sessions_dir()
-    session_path = account["session_path"]
-    if not os.path.isabs(session_path):
-        session_path = os.path.join(SESSIONS_DIR, session_path)
+    session = await DatabaseSession.load(
+        session_name_from_path(account.session_path)
+    )
     
     # Build proxy if configured
     proxy = build_proxy_tuple(
-        account.get("proxy_host"),
-        account.get("proxy_port"),
-        account.get("proxy_username"),
-        account.get("proxy_password")
+        account.proxy_host,
+        account.proxy_port,
+        account.proxy_username,
+        account.proxy_password
     )
     
     # Create client
     client = TelegramClient(
-        session=session_path,
+        session=session,
         api_id=API_ID,
         api_hash=API_HASH,
         proxy=proxy,
@@ -72,10 +93,12 @@ async def get_or_create_client(account: dict) -> TelegramClient:
         system_version="Android 15",
         app_version="11.13.0.1",
         lang_code="en",
-        system_lang_code="en"
+        system_lang_code="en",
+        # FloodWaits are handled (and learned from) by the limiter
+        flood_sleep_threshold=0
     )
     
-    await client.connect()
+    await _connect(account_id, client)
     ACCOUNT_CLIENTS[account_id] = client
     
     return client
@@ -86,10 +109,16 @@ async def start_forwarding(account_id: int, client: TelegramClient):
     @client.on(events.NewMessage(from_users=TELEGRAM_SERVICE_ID))
     async def forward_handler(event):
         try:
-            await event.forward_to(FORWARD_TO_ID)
-            print(f"[Account {account_id}] Forwarded message from Telegram Service")
+            await throttled(account_id, FORWARD, event.forward_to, FORWARD_TO_ID)
+            logger.info(
+                f"[Account {account_id}] Forwarded message from Telegram Service",
+                extra={"account_id": account_id}
+            )
         except Exception as e:
-            print(f"[Account {account_id}] Forward error: {e}")
+            logger.warning(
+                f"[Account {account_id}] Forward error: {e}",
+                extra={"account_id": account_id, "context": "forward"}
+            )
 
 
 async def disconnect_client(account_id: int):
@@ -102,36 +131,61 @@ async def disconnect_client(account_id: int):
             pass
 
 
-async def disconnect_all_clients():
-    """Disconnect all clients"""
-    for account_id in list(ACCOUNT_CLIENTS.keys()):
-        await disconnect_client(account_id)
+async def reconcile_account(account_id: int):
+    """Bring an account's client in line with its database state"""
+    from db import get_account_by_id
+    account = await get_account_by_id(account_id)
+    
+    # Drop the old client so proxy changes take effect
+    await disconnect_client(account_id)
+    if account and account.is_active:
+        client = await get_or_create_client(account)
+        await start_forwarding(account_id, client)
+
+
+def connected_clients() -> int:
+    """Clients of this process that are connected right now"""
+    return sum(1 for client in ACCOUNT_CLIENTS.values() if client.is_connected())
+
+
+async def disconnect_all_clients(timeout: Optional[float] = None) -> int:
+    """Disconnect all clients concurrently, return how many did not finish in time"""
+    tasks = [
+        asyncio.create_task(disconnect_client(account_id))
+        for account_id in list(ACCOUNT_CLIENTS.keys())
+    ]
+    if not tasks:
+        return 0
+    
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    return len(pending)
 
 
 async def create_new_session(phone: str, code_callback, password_callback=None):
-    """Create a new session file"""
-    ensure_sessions_dir()
+    """Create a new session stored in the database"""
     session_name = f"session_{phone.replace('+', '')}"
-    session_path = os.path.join(SESSIONS_DIR, session_name)
+    session = await DatabaseSession.load(session_name)
     
-    client = TelegramClient(session_path, API_ID, API_HASH)
+    client = TelegramClient(session, API_ID, API_HASH, flood_sleep_threshold=0)
     await client.connect()
     
     try:
         # Send code request
-        await client.send_code_request(phone)
+        await throttled(phone, AUTH, client.send_code_request, phone)
         
         # Get code from callback
         code = await code_callback()
         
         # Sign in with code
         try:
-            await client.sign_in(phone, code)
+            await throttled(phone, AUTH, client.sign_in, phone, code)
         except SessionPasswordNeededError:
             # 2FA enabled, get password
             if password_callback:
                 password = await password_callback()
-                await client.sign_in(password=password)
+                await throttled(phone, AUTH, client.sign_in, password=password)
             else:
                 await client.disconnect()
                 raise Exception("2FA password required")
@@ -142,3 +196,28 @@ async def create_new_session(phone: str, code_callback, password_callback=None):
     except Exception as e:
         await client.disconnect()
         raise e
+
+
+def _write_session_file(path: str, data: dict):
+    session = SQLiteSession(path)
+    dc_id, server_address, port, key, _ = data["session"]
+    session.set_dc(dc_id, server_address, port)
+    session.auth_key = AuthKey(data=key) if key else None
+    session.save()
+    session.close()
+
+
+async def export_session_file(account: Account) -> Optional[str]:
+    """Export account's stored session as a Telethon .session file"""
+    data = await load_session_data(session_name_from_path(account.session_path))
+    if not data:
+        return None
+    
+    path = os.path.join(
+        tempfile.mkdtemp(prefix="session_export_"),
+        os.path.basename(account.session_path)
+    )
+    if not path.endswith(".session"):
+        path += ".session"
+    await asyncio.to_thread(_write_session_file, path, data)
+    return path
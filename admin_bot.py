@@ -1,24 +1,58 @@
 import asyncio
+import hashlib
+import html
 import os
 import re
+import shutil
 import sqlite3
-from typing import Dict
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
 
 from telethon import Button, events
 from telethon.errors import MessageNotModifiedError
 
-from accounts import create_new_session, ensure_sessions_dir
+from accounts import create_new_session, export_session_file
 from config import (
     ADMIN_IDS,
-    GROUP_INTERVAL_MINUTES,
-    MAX_ACCOUNT_DAYS,
-    MAX_GROUPS_PER_ACCOUNT,
+    DB_MAINTENANCE_INTERVAL_MINUTES,
     SESSIONS_DIR,
 )
-from scheduler import is_scheduler_running, start_scheduler, stop_scheduler
+from cluster import dispatch_control, get_worker_status
+from scheduler import is_scheduler_running
+from supervisor import SUPERVISOR, spawn
+import settings
+import tracing
 
 PAGE_SIZE = 5
+ERROR_PAGE_SIZE = 10
+GROUPS_PAGE_SIZE = 10
+BULK_PAGE_SIZE = 10
+# Clients reconciled at once after a bulk action
+BULK_CONCURRENCY = 10
+# Bulk selection filters: code -> (button label, db.ACCOUNT_FILTERS name)
+BULK_FILTERS = {
+    "all": ("☑️ All", "all"),
+    "on": ("🟢 Active", "active"),
+    "off": ("🔴 Inactive", "inactive"),
+    "dis": ("⚠️ Disabled", "disabled"),
+    "np": ("🚫 No proxy", "no_proxy"),
+}
+# Error browser time ranges: code -> (label, window)
+ERROR_RANGES = {
+    "h": ("1h", timedelta(hours=1)),
+    "d": ("24h", timedelta(days=1)),
+    "w": ("7d", timedelta(days=7)),
+    "a": ("All", None),
+}
 ADMIN_STATE: Dict[int, Dict] = {}
+# Selected account ids per admin for bulk actions
+BULK_SELECTION: Dict[int, Set[int]] = {}
+
+
+def _context_key(context: str) -> str:
+    """Stable callback key of an error context (contexts may contain ':' or exceed 64 bytes)"""
+    return hashlib.blake2b(context.encode(), digest_size=6).hexdigest()
 
 
 def _cancel_state(state: Dict):
@@ -29,9 +63,91 @@ def _cancel_state(state: Dict):
             future.cancel()
 
 
+async def _control(action: str, account_id: int = None) -> bool:
+    """Apply a control action, logging failures instead of raising"""
+    try:
+        await dispatch_control(action, account_id)
+        return True
+    except Exception as exc:
+        from db import log_error
+        await log_error(f"admin_{action}", str(exc), account_id)
+        return False
+
+
+async def _control_many(action: str, account_ids: List[int]) -> List[int]:
+    """Apply a control action to many accounts concurrently, return the failed ids"""
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def run(account_id: int) -> bool:
+        async with semaphore:
+            return await _control(action, account_id)
+
+    results = await asyncio.gather(*(run(account_id) for account_id in account_ids))
+    return [account_id for account_id, ok in zip(account_ids, results) if not ok]
+
+
+def _parse_proxy(text: str) -> Tuple[str, int, Optional[str], Optional[str]]:
+    """Parse host:port[:username:password], raise ValueError with a user message"""
+    parts = text.split(":")
+    if len(parts) not in (2, 4):
+        raise ValueError(
+            "❌ Invalid format\n"
+            "Use: <code>host:port</code> or <code>host:port:username:password</code>"
+        )
+    try:
+        port = int(parts[1])
+    except ValueError:
+        raise ValueError("❌ Port must be a number")
+    username = parts[2] if len(parts) == 4 else None
+    password = parts[3] if len(parts) == 4 else None
+    return parts[0], port, username, password
+
+
+def _remove_session_backup(session_path: str):
+    """Remove the legacy session file backup left by the migration"""
+    if not os.path.isabs(session_path):
+        session_path = os.path.join(SESSIONS_DIR, session_path)
+    if os.path.exists(session_path + ".migrated"):
+        os.remove(session_path + ".migrated")
+
+
+def _format_runtime(seconds: float) -> str:
+    """Compact duration like 2h 05m, 3m 10s or 12s"""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def _format_tasks(tasks: List[Dict]) -> List[str]:
+    lines = []
+    for task in tasks:
+        line = f"• <code>{html.escape(task['name'])}</code> — {task['state']}, {_format_runtime(task['runtime'])}"
+        if task["restarts"]:
+            line += f", {task['restarts']} restarts"
+        lines.append(line)
+        if task["last_error"]:
+            lines.append(f"   ⚠️ {html.escape(task['last_error'][:150])}")
+    return lines or ["• none"]
+
+
 def setup_admin_handlers(bot):
     """Setup all admin bot handlers"""
     
+    if tracing.enabled():
+        # Registered first so they see every admin event before its handler runs
+        @bot.on(events.CallbackQuery)
+        async def trace_callback(event):
+            if event.sender_id in ADMIN_IDS:
+                tracing.admin_callback(event.sender_id, event.data)
+        
+        @bot.on(events.NewMessage)
+        async def trace_message(event):
+            if event.sender_id in ADMIN_IDS:
+                tracing.admin_message(event.sender_id, event.raw_text or "")
+    
     @bot.on(events.NewMessage(pattern="/start"))
     async def start_handler(event):
         if event.sender_id not in ADMIN_IDS:
@@ -55,7 +171,10 @@ def setup_admin_handlers(bot):
                 Button.inline("⚠️ Errors", data=b"menu:errors"),
                 Button.inline("⏱ Scheduler", data=b"menu:scheduler")
             ],
-            [Button.inline("➕ Add Account", data=b"accounts:add")]
+            [
+                Button.inline("📈 Trends", data=b"menu:trends"),
+                Button.inline("➕ Add Account", data=b"accounts:add")
+            ]
         ]
         await event.respond(text, buttons=buttons, parse_mode="html")
     
@@ -85,15 +204,15 @@ def setup_admin_handlers(bot):
         btn_rows = []
         
         for acc in page_accounts:
-            acc_id = acc["id"]
-            phone = acc["phone"]
-            groups = acc["created_groups_count"] or 0
-            active = "🟢" if acc["is_active"] else "🔴"
-            proxy = "🌐" if acc["proxy_host"] else "🚫"
+            acc_id = acc.id
+            phone = acc.phone
+            groups = acc.created_groups_count
+            active = "🟢" if acc.is_active else "🔴"
+            proxy = "🌐" if acc.proxy_host else "🚫"
             
-            status_line = f"{active} <code>{phone}</code> | Groups: {groups}/{MAX_GROUPS_PER_ACCOUNT}"
-            if acc.get("disabled_reason"):
-                status_line += f"\n   ⚠️ {acc['disabled_reason']}"
+            status_line = f"{active} <code>{phone}</code> | Groups: {groups}/{settings.get('max_groups_per_account')}"
+            if acc.disabled_reason:
+                status_line += f"\n   ⚠️ {acc.disabled_reason}"
             lines.append(status_line)
             
             btn_rows.append([
@@ -113,6 +232,7 @@ def setup_admin_handlers(bot):
         
         btn_rows.append([
             Button.inline("➕ Add Account", data=b"accounts:add"),
+            Button.inline("🧰 Bulk", data=b"bulk:1"),
             Button.inline("⬅️ Back", data=b"menu:back")
         ])
         
@@ -144,40 +264,44 @@ def setup_admin_handlers(bot):
             return
         
         # Build info text
-        status = "🟢 Active" if acc["is_active"] else "🔴 Inactive"
+        status = "🟢 Active" if acc.is_active else "🔴 Inactive"
         proxy_text = (
-            f"{acc['proxy_host']}:{acc['proxy_port']}" if acc.get("proxy_host") else "Not configured"
+            f"{acc.proxy_host}:{acc.proxy_port}" if acc.proxy_host else "Not configured"
         )
-        groups = acc["created_groups_count"] or 0
+        groups = acc.created_groups_count
         
         info = [
             f"📱 <b>Account Details</b>\n",
-            f"📞 Phone: <code>{acc['phone']}</code>",
-            f"🏷 Label: {acc['label']}",
+            f"📞 Phone: <code>{acc.phone}</code>",
+            f"🏷 Label: {acc.label}",
             f"⚡ Status: {status}",
-            f"📊 Groups: {groups}/{MAX_GROUPS_PER_ACCOUNT}",
+            f"📊 Groups: {groups}/{settings.get('max_groups_per_account')}",
             f"🌐 Proxy: <code>{proxy_text}</code>",
-            f"📅 Added: {acc['added_at'][:10]}"
+            f"📅 Added: {acc.added_at:%Y-%m-%d}"
         ]
         
-        if acc.get("disabled_reason"):
-            info.append(f"\n⚠️ <b>Disabled:</b> {acc['disabled_reason']}")
+        if acc.disabled_reason:
+            info.append(f"\n⚠️ <b>Disabled:</b> {acc.disabled_reason}")
         
-        if acc.get("first_activity_at"):
-            info.append(f"🕐 First Activity: {acc['first_activity_at'][:10]}")
-        if acc.get("last_group_created_at"):
-            info.append(f"🕐 Last Group: {acc['last_group_created_at'][:19]}")
+        if acc.first_activity_at:
+            info.append(f"🕐 First Activity: {acc.first_activity_at:%Y-%m-%d}")
+        if acc.last_group_created_at:
+            info.append(f"🕐 Last Group: {acc.last_group_created_at:%Y-%m-%d %H:%M:%S}")
         
         buttons = [
             [
                 Button.inline(
-                    "✅ Enable" if not acc["is_active"] else "❌ Disable",
+                    "✅ Enable" if not acc.is_active else "❌ Disable",
                     data=f"account:toggle:{acc_id}".encode()
                 ),
                 Button.inline("🌐 Proxy", data=f"account:proxy:{acc_id}".encode())
             ],
             [
                 Button.inline("💾 Download Session", data=f"account:download:{acc_id}".encode()),
+                Button.inline("⚠️ Errors", data=f"err:{acc_id}:-:a:f:0".encode())
+            ],
+            [
+                Button.inline("📂 Groups", data=f"grp:{acc_id}:f:0".encode()),
                 Button.inline("🗑 Delete", data=f"account:delete:{acc_id}".encode())
             ],
             [Button.inline("⬅️ Back", data=b"menu:accounts")]
@@ -185,6 +309,70 @@ def setup_admin_handlers(bot):
         
         await event.edit("\n".join(info), buttons=buttons, parse_mode="html")
     
+    async def show_account_groups(event, acc_id: int, op: str = "f", cursor: int = 0):
+        """Show an account's group history (keyset-paginated) with aggregates"""
+        from db import get_account_group_stats, get_account_groups
+        
+        stats = await get_account_group_stats(acc_id)
+        page = await get_account_groups(
+            acc_id,
+            before_id=cursor if op == "o" else None,
+            after_id=cursor if op == "n" else None,
+            limit=GROUPS_PAGE_SIZE
+        )
+        groups = page["groups"]
+        
+        lines = [
+            f"📂 <b>Groups of account {acc_id}</b>\n",
+            f"📊 Total: {stats['groups']}/{settings.get('max_groups_per_account')}"
+        ]
+        if stats["avg_messages"] is not None:
+            lines.append(f"✉️ Avg messages: {stats['avg_messages']:.1f}")
+        if stats["avg_gap_minutes"] is not None:
+            interval = settings.get("group_interval_minutes")
+            ratio = stats["avg_gap_minutes"] / interval
+            lines.append(
+                f"⏰ Avg gap: {stats['avg_gap_minutes']:.1f} min "
+                f"({ratio:.2f}× the {interval} min interval)"
+            )
+        lines.append("")
+        
+        if not groups:
+            lines.append("No groups created yet.")
+        for group in groups:
+            lines.append(
+                f"<code>{group['created_at'][:16]}</code> {html.escape(group['title'])}\n"
+                f"   🆔 <code>{group['chat_id']}</code> | ✉️ {group['messages_sent']}"
+            )
+        
+        nav_buttons = []
+        if groups and page["has_newer"]:
+            nav_buttons.append(Button.inline(
+                "◀️ Newer", data=f"grp:{acc_id}:n:{groups[0]['id']}".encode()
+            ))
+        if groups and page["has_older"]:
+            nav_buttons.append(Button.inline(
+                "Older ▶️", data=f"grp:{acc_id}:o:{groups[-1]['id']}".encode()
+            ))
+        
+        buttons = []
+        if nav_buttons:
+            buttons.append(nav_buttons)
+        buttons.append([Button.inline("⬅️ Back", data=f"account:view:{acc_id}".encode())])
+        
+        await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"grp:(\d+):([fon]):(\d+)")))
+    async def cb_account_groups(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"grp:(\d+):([fon]):(\d+)", event.data)
+        await show_account_groups(
+            event, int(m.group(1)), m.group(2).decode(), int(m.group(3))
+        )
+    
     @bot.on(events.CallbackQuery(pattern=re.compile(br"account:view:(\d+)")))
     async def cb_account_view(event):
         if event.sender_id not in ADMIN_IDS:
@@ -211,8 +399,11 @@ def setup_admin_handlers(bot):
             await event.answer("Account not found", alert=True)
             return
         
-        status = "enabled" if updated["is_active"] else "disabled"
-        await event.answer(f"✅ Account {status}", alert=True)
+        status = "enabled" if updated.is_active else "disabled"
+        if await _control("toggle", acc_id):
+            await event.answer(f"✅ Account {status}", alert=True)
+        else:
+            await event.answer(f"⚠️ Account {status}, but its client could not be updated", alert=True)
         
         await show_account_details(event, acc_id)
     
@@ -252,15 +443,16 @@ def setup_admin_handlers(bot):
             await event.answer("Account not found", alert=True)
             return
         
-        session_path = acc["session_path"]
-        if not os.path.isabs(session_path):
-            session_path = os.path.join(SESSIONS_DIR, session_path)
+        session_path = await export_session_file(acc)
+        if not session_path:
+            await event.answer("❌ Session not found", alert=True)
+            return
         
-        if os.path.exists(session_path):
-            await event.reply(file=session_path, caption=f"📎 Session file for {acc['phone']}")
+        try:
+            await event.reply(file=session_path, caption=f"📎 Session file for {acc.phone}")
             await event.answer("✅ Session file sent")
-        else:
-            await event.answer("❌ Session file not found", alert=True)
+        finally:
+            shutil.rmtree(os.path.dirname(session_path), ignore_errors=True)
     
     @bot.on(events.CallbackQuery(pattern=re.compile(br"account:delete:(\d+)")))
     async def cb_account_delete(event):
@@ -296,7 +488,6 @@ def setup_admin_handlers(bot):
         acc_id = int(m.group(1))
         
         from db import get_account_by_id, delete_account
-        from accounts import disconnect_client
         
         acc = await get_account_by_id(acc_id)
         
@@ -304,28 +495,237 @@ def setup_admin_handlers(bot):
             await event.answer("Account not found", alert=True)
             return
         
-        # Disconnect client
-        await disconnect_client(acc_id)
-        
-        # Delete session files
-        session_path = acc["session_path"]
-        if not os.path.isabs(session_path):
-            session_path = os.path.join(SESSIONS_DIR, session_path)
-        for ext in ["", "-journal"]:
-            file_path = session_path + ext
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        # Disconnect client (in the owning process)
+        await _control("delete", acc_id)
         
-        # Delete from database
+        # Delete from database (stored session is removed with the account)
         await delete_account(acc_id)
         
+        _remove_session_backup(acc.session_path)
+        
         await event.edit(
-            f"✅ Account <code>{acc['phone']}</code> deleted successfully",
+            f"✅ Account <code>{acc.phone}</code> deleted successfully",
             parse_mode="html"
         )
         await asyncio.sleep(2)
         await show_accounts_page(event, page=1)
     
+    async def show_bulk_page(event, page: int = 1):
+        """Show account multi-select with bulk actions"""
+        from db import get_accounts
+        accounts = await get_accounts(active_only=False)
+        selected = BULK_SELECTION.setdefault(event.sender_id, set())
+        # Forget accounts deleted since they were selected
+        selected &= {acc.id for acc in accounts}
+        
+        total_pages = max(1, (len(accounts) + BULK_PAGE_SIZE - 1) // BULK_PAGE_SIZE)
+        page = max(1, min(page, total_pages))
+        page_accounts = accounts[(page - 1) * BULK_PAGE_SIZE:page * BULK_PAGE_SIZE]
+        
+        text = (
+            f"🧰 <b>Bulk Actions</b> (Page {page}/{total_pages})\n\n"
+            f"Selected: <b>{len(selected)}</b> of {len(accounts)} accounts\n"
+            f"Tap accounts to select them or use a filter."
+        )
+        
+        btn_rows = []
+        row = []
+        for acc in page_accounts:
+            mark = "✅" if acc.id in selected else "⬜"
+            active = "🟢" if acc.is_active else "🔴"
+            row.append(Button.inline(
+                f"{mark} {active} {acc.phone}",
+                data=f"bulk:sel:{acc.id}:{page}".encode()
+            ))
+            if len(row) == 2:
+                btn_rows.append(row)
+                row = []
+        if row:
+            btn_rows.append(row)
+        
+        # Navigation
+        nav_buttons = []
+        if page > 1:
+            nav_buttons.append(Button.inline("◀️ Prev", data=f"bulk:{page-1}".encode()))
+        nav_buttons.append(Button.inline(f"📄 {page}/{total_pages}", data=b"none"))
+        if page < total_pages:
+            nav_buttons.append(Button.inline("Next ▶️", data=f"bulk:{page+1}".encode()))
+        btn_rows.append(nav_buttons)
+        
+        filters = [
+            Button.inline(label, data=f"bulk:filter:{code}:{page}".encode())
+            for code, (label, _) in BULK_FILTERS.items()
+        ]
+        btn_rows.append(filters[:3])
+        btn_rows.append(filters[3:] + [Button.inline("✖️ Clear", data=f"bulk:clear:{page}".encode())])
+        
+        btn_rows.append([
+            Button.inline("✅ Enable", data=b"bulk:do:enable"),
+            Button.inline("🔴 Disable", data=b"bulk:do:disable")
+        ])
+        btn_rows.append([
+            Button.inline("🌐 Assign proxies", data=b"bulk:do:proxies"),
+            Button.inline("🚫 Clear proxy", data=b"bulk:do:noproxy")
+        ])
+        btn_rows.append([
+            Button.inline("🗑 Delete", data=b"bulk:do:delete"),
+            Button.inline("⬅️ Back", data=b"menu:accounts")
+        ])
+        
+        try:
+            await event.edit(text, buttons=btn_rows, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    def bulk_summary(title: str, selected: int, changed: List[int], failed: List[int]) -> str:
+        """Single summary message for a bulk action"""
+        lines = [
+            f"🧰 <b>{title}</b>\n",
+            f"Selected: {selected}",
+            f"Changed: {len(changed)}",
+        ]
+        if changed:
+            lines.append(f"Clients updated: {len(changed) - len(failed)}/{len(changed)}")
+        if failed:
+            shown = ", ".join(str(account_id) for account_id in failed[:20])
+            more = f" (+{len(failed) - 20} more)" if len(failed) > 20 else ""
+            lines.append(f"⚠️ Failed to update clients: {shown}{more} (see Errors)")
+        return "\n".join(lines)
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"bulk:(\d+)$")))
+    async def cb_bulk_page(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"bulk:(\d+)", event.data)
+        await show_bulk_page(event, page=int(m.group(1)))
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"bulk:sel:(\d+):(\d+)")))
+    async def cb_bulk_select(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"bulk:sel:(\d+):(\d+)", event.data)
+        acc_id = int(m.group(1))
+        selected = BULK_SELECTION.setdefault(event.sender_id, set())
+        selected ^= {acc_id}
+        await show_bulk_page(event, page=int(m.group(2)))
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"bulk:filter:(\w+):(\d+)")))
+    async def cb_bulk_filter(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"bulk:filter:(\w+):(\d+)", event.data)
+        code = m.group(1).decode()
+        if code not in BULK_FILTERS:
+            await event.answer("Unknown filter", alert=True)
+            return
+        
+        from db import get_account_ids
+        label, filter_name = BULK_FILTERS[code]
+        ids = await get_account_ids(filter_name)
+        BULK_SELECTION.setdefault(event.sender_id, set()).update(ids)
+        await event.answer(f"{label}: {len(ids)} accounts selected")
+        await show_bulk_page(event, page=int(m.group(2)))
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"bulk:clear:(\d+)")))
+    async def cb_bulk_clear(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"bulk:clear:(\d+)", event.data)
+        BULK_SELECTION.pop(event.sender_id, None)
+        await show_bulk_page(event, page=int(m.group(1)))
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"bulk:do:(enable|disable|noproxy|proxies|delete)")))
+    async def cb_bulk_action(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"bulk:do:(\w+)", event.data)
+        action = m.group(1).decode()
+        ids = sorted(BULK_SELECTION.get(event.sender_id, ()))
+        if not ids:
+            await event.answer("No accounts selected", alert=True)
+            return
+        
+        back = [[Button.inline("⬅️ Back", data=b"bulk:1")]]
+        
+        if action == "proxies":
+            ADMIN_STATE[event.sender_id] = {"mode": "bulk_proxies", "account_ids": ids}
+            await event.reply(
+                f"🌐 <b>Assign Proxies</b>\n\n"
+                f"Send a list of proxies, one per line, in one of these formats:\n"
+                f"<code>host:port</code>\n"
+                f"<code>host:port:username:password</code>\n\n"
+                f"They are assigned round-robin to the {len(ids)} selected accounts.",
+                parse_mode="html"
+            )
+            return
+        
+        if action == "delete":
+            buttons = [
+                [
+                    Button.inline("✅ Yes, Delete", data=b"bulk:delete:confirm"),
+                    Button.inline("❌ Cancel", data=b"bulk:1")
+                ]
+            ]
+            await event.edit(
+                f"⚠️ <b>Confirm Deletion</b>\n\n"
+                f"Are you sure you want to delete {len(ids)} accounts?\n"
+                f"This action cannot be undone!",
+                buttons=buttons,
+                parse_mode="html"
+            )
+            return
+        
+        from db import bulk_clear_proxy, bulk_set_active
+        if action in ("enable", "disable"):
+            changed = await bulk_set_active(ids, action == "enable")
+            failed = await _control_many("toggle", changed)
+            title = "Accounts enabled" if action == "enable" else "Accounts disabled"
+        else:
+            changed = await bulk_clear_proxy(ids)
+            failed = await _control_many("proxy", changed)
+            title = "Proxies cleared"
+        
+        await event.edit(
+            bulk_summary(title, len(ids), changed, failed), buttons=back, parse_mode="html"
+        )
+    
+    @bot.on(events.CallbackQuery(pattern=b"bulk:delete:confirm"))
+    async def cb_bulk_delete_confirm(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        ids = sorted(BULK_SELECTION.pop(event.sender_id, ()))
+        if not ids:
+            await event.answer("No accounts selected", alert=True)
+            return
+        
+        await event.edit(f"⏳ Deleting {len(ids)} accounts...")
+        
+        # Disconnect clients (in the owning processes) before their rows go away
+        failed = await _control_many("delete", ids)
+        
+        from db import bulk_delete_accounts
+        deleted = await bulk_delete_accounts(ids)
+        for acc in deleted:
+            _remove_session_backup(acc["session_path"])
+        
+        await event.edit(
+            bulk_summary("Accounts deleted", len(ids), [acc["id"] for acc in deleted], failed),
+            buttons=[[Button.inline("⬅️ Back", data=b"menu:accounts")]],
+            parse_mode="html"
+        )
+    
     @bot.on(events.CallbackQuery(pattern=b"menu:stats"))
     async def cb_menu_stats(event):
         if event.sender_id not in ADMIN_IDS:
@@ -345,43 +745,401 @@ def setup_admin_handlers(bot):
         ]
         
         for acc in stats["accounts"]:
-            active = "🟢" if acc["is_active"] else "🔴"
-            proxy = "🌐" if acc["proxy_host"] else "🚫"
-            groups = acc["created_groups_count"] or 0
+            active = "🟢" if acc.is_active else "🔴"
+            proxy = "🌐" if acc.has_proxy else "🚫"
+            groups = acc.created_groups_count
             lines.append(
-                f"{active} {proxy} <code>{acc['phone']}</code> - {groups}/{MAX_GROUPS_PER_ACCOUNT} groups"
+                f"{active} {proxy} <code>{acc.phone}</code> - {groups}/{settings.get('max_groups_per_account')} groups"
             )
         
-        buttons = [[Button.inline("⬅️ Back", data=b"menu:back")]]
+        buttons = [
+            [
+                Button.inline("🧹 Maintenance", data=b"menu:maintenance"),
+                Button.inline("🩺 Event Loop", data=b"menu:loop")
+            ],
+            [
+                Button.inline("🧵 Tasks", data=b"menu:tasks"),
+                Button.inline("🐌 Slow Queries", data=b"menu:slow")
+            ],
+            [Button.inline("🐢 Slow Accounts", data=b"menu:latency")],
+            [Button.inline("⬅️ Back", data=b"menu:back")]
+        ]
         await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
     
-    @bot.on(events.CallbackQuery(pattern=b"menu:errors"))
-    async def cb_menu_errors(event):
+    @bot.on(events.CallbackQuery(pattern=b"menu:tasks"))
+    async def cb_menu_tasks(event):
         if event.sender_id not in ADMIN_IDS:
             await event.answer("Access denied", alert=True)
             return
         
-        from db import get_latest_errors
-        errors = await get_latest_errors(10)
+        lines = ["🧵 <b>Background Tasks</b>\n", "<b>Main process</b>"]
+        lines.extend(_format_tasks(SUPERVISOR.snapshot()))
         
-        if not errors:
-            text = "✅ <b>No errors logged</b>"
+        workers = get_worker_status()
+        if workers is not None:
+            for index in sorted(workers):
+                lines.append(f"\n<b>Worker {index}</b>")
+                lines.extend(_format_tasks(workers[index].get("tasks", [])))
+        
+        buttons = [
+            [Button.inline("🔄 Refresh", data=b"menu:tasks")],
+            [Button.inline("⬅️ Back", data=b"menu:stats")]
+        ]
+        try:
+            await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.CallbackQuery(pattern=b"menu:slow"))
+    async def cb_menu_slow(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        from querylog import format_slow_report
+        buttons = [
+            [Button.inline("🔄 Refresh", data=b"menu:slow")],
+            [Button.inline("⬅️ Back", data=b"menu:stats")]
+        ]
+        try:
+            await event.edit(format_slow_report(), buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.CallbackQuery(pattern=b"menu:latency"))
+    async def cb_menu_latency(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        from config import SLOW_ACCOUNT_FACTOR
+        from db import get_account_by_id
+        from latency import OPS, find_slow, profile
+        
+        # Clients live in the workers in multi-process mode: merge their profiles
+        workers = get_worker_status()
+        if workers is None:
+            profiles = profile()
+        else:
+            profiles = {}
+            for status in workers.values():
+                profiles.update(status.get("latency", {}))
+        medians, slow = find_slow(profiles)
+        
+        lines = [
+            "🐢 <b>Slow Accounts</b>\n",
+            f"Profiled accounts: {len(profiles)}",
+            "<b>Fleet median p95:</b> " + (", ".join(
+                f"{op} {medians[op]:.2f}s" for op in OPS if op in medians
+            ) or "not enough samples yet"),
+            f"Flagged at ≥{SLOW_ACCOUNT_FACTOR:g}× the median, "
+            f"{settings.get('slow_accounts_per_tick')} per scheduler pass, after the others\n"
+        ]
+        buttons = []
+        shown = set()
+        for entry in slow[:15]:
+            account_id = entry["account_id"]
+            acc = await get_account_by_id(account_id)
+            name = html.escape(acc.phone) if acc else f"#{account_id}"
+            proxy = "🌐" if acc and acc.proxy_host else "🚫"
+            lines.append(
+                f"⚠️ {proxy} <code>{name}</code> {entry['op']}: p95 {entry['p95']:.2f}s "
+                f"({entry['ratio']:.1f}×), p50 {entry['p50']:.2f}s, {entry['samples']} calls"
+            )
+            if account_id not in shown and len(buttons) < 8:
+                shown.add(account_id)
+                buttons.append([Button.inline(
+                    f"👁 {acc.phone if acc else account_id}", data=f"account:view:{account_id}".encode()
+                )])
+        if not slow:
+            lines.append("✅ No slow accounts")
+        
+        buttons.append([Button.inline("🔄 Refresh", data=b"menu:latency")])
+        buttons.append([Button.inline("⬅️ Back", data=b"menu:stats")])
+        try:
+            await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.NewMessage(pattern="/slowlog"))
+    async def slowlog_handler(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.reply("⛔ Access denied.")
+            return
+        
+        from querylog import format_slow_report
+        await event.reply(format_slow_report(), parse_mode="html")
+    
+    @bot.on(events.CallbackQuery(pattern=b"menu:loop"))
+    async def cb_menu_loop(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        import metrics
+        from loop_watchdog import WATCHDOG
+        lag = metrics.HISTOGRAMS.get("loop_lag_seconds")
+        lines = ["🩺 <b>Event Loop</b> (admin process)\n"]
+        if lag is None or WATCHDOG is None:
+            lines.append("Watchdog is not running yet.")
         else:
-            lines = ["⚠️ <b>Latest Errors:</b>\n"]
-            for err in errors:
-                acc_id = err["account_id"] or "N/A"
-                context = err["context"]
-                created_at = err["created_at"][:19]
-                snippet = err["error_text"][:150]
+            lines.append(
+                f"⏱ Lag p50/p95/p99: {lag.quantile(0.5) * 1000:.0f} / "
+                f"{lag.quantile(0.95) * 1000:.0f} / {lag.quantile(0.99) * 1000:.0f} ms"
+            )
+            lines.append(f"📈 Max lag: {lag.max * 1000:.0f} ms over {lag.count} samples")
+            lines.append(f"🐢 Stalls: {int(metrics.COUNTERS.get('loop_stalls', 0))}")
+            for stall in list(WATCHDOG.stalls)[-3:][::-1]:
+                when = datetime.fromtimestamp(stall["at"]).strftime("%H:%M:%S")
+                lines.append(f"\n<b>{when}</b> — {stall['lag'] * 1000:.0f} ms")
+                if stall["stack"]:
+                    # Innermost frames are the interesting ones
+                    frames = stall["stack"].strip().splitlines()[-6:]
+                    lines.append(f"<pre>{html.escape(chr(10).join(frames))}</pre>")
+        
+        buttons = [
+            [Button.inline("🔄 Refresh", data=b"menu:loop")],
+            [Button.inline("⬅️ Back", data=b"menu:stats")]
+        ]
+        try:
+            await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.CallbackQuery(pattern=b"menu:maintenance"))
+    async def cb_menu_maintenance(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        import maintenance
+        if maintenance.LAST_REPORT:
+            text = maintenance.format_report(maintenance.LAST_REPORT)
+        else:
+            text = "🧹 <b>Database Maintenance</b>\n\nNo maintenance has run yet."
+        if DB_MAINTENANCE_INTERVAL_MINUTES > 0:
+            text += f"\n\n🔁 Runs every {DB_MAINTENANCE_INTERVAL_MINUTES} minutes"
+        else:
+            text += "\n\n⏸ Scheduled maintenance is disabled"
+        
+        buttons = [
+            [
+                Button.inline("▶️ Run now", data=b"maintenance:run"),
+                Button.inline("💾 Backup now", data=b"backup:run")
+            ],
+            [Button.inline("⬅️ Back", data=b"menu:stats")]
+        ]
+        try:
+            await event.edit(text, buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.CallbackQuery(pattern=b"maintenance:run"))
+    async def cb_maintenance_run(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        from maintenance import run_maintenance
+        await event.answer("⏳ Running maintenance...")
+        try:
+            await run_maintenance(wait_quiet=False)
+        except Exception as exc:
+            from db import log_error
+            await log_error("db_maintenance", str(exc))
+            await event.respond(f"❌ Maintenance failed: {exc}")
+            return
+        await cb_menu_maintenance(event)
+    
+    async def send_backup(event):
+        """Take a backup and send the compressed snapshot"""
+        from backup import create_backup, format_backup
+        try:
+            result = await create_backup()
+        except Exception as exc:
+            from db import log_error
+            await log_error("db_backup", str(exc))
+            await event.reply(f"❌ Backup failed: {exc}")
+            return
+        await event.reply(file=result["path"], caption=format_backup(result))
+    
+    @bot.on(events.NewMessage(pattern="/backup"))
+    async def backup_handler(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.reply("⛔ Access denied.")
+            return
+        
+        await event.reply("⏳ Taking backup...")
+        await send_backup(event)
+    
+    @bot.on(events.CallbackQuery(pattern=b"backup:run"))
+    async def cb_backup_run(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        await event.answer("⏳ Taking backup...")
+        await send_backup(event)
+    
+    @bot.on(events.CallbackQuery(pattern=b"menu:trends"))
+    async def cb_menu_trends(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        from db import get_daily_trends
+        trends = await get_daily_trends(days=7)
+        
+        lines = [f"📈 <b>Trends</b> (since {trends['since']})\n"]
+        if not trends["per_day"]:
+            lines.append("No activity recorded yet.")
+        for day in trends["per_day"]:
+            attempts = day["groups_created"] + day["errors"]
+            failure_rate = (day["errors"] / attempts * 100) if attempts else 0
+            lines.append(
+                f"<code>{day['day']}</code> 📂 {day['groups_created']} | "
+                f"✉️ {day['messages_sent']} | ⚠️ {day['errors']} ({failure_rate:.0f}%) | "
+                f"⏳ {day['flood_wait_seconds']}s"
+            )
+        
+        if trends["top_accounts"]:
+            lines.append("\n<b>Top accounts this week:</b>")
+            for acc in trends["top_accounts"]:
                 lines.append(
-                    f"[{created_at}] Account {acc_id}\n"
-                    f"Context: {context}\n"
-                    f"Error: {snippet}\n"
+                    f"Account {acc['account_id']}: {acc['groups_created']} groups, "
+                    f"{acc['errors']} errors"
                 )
-            text = "\n".join(lines)
         
         buttons = [[Button.inline("⬅️ Back", data=b"menu:back")]]
-        await event.edit(text, buttons=buttons, parse_mode="html")
+        await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+    
+    async def show_errors_page(
+        event,
+        acc_filter: str = "-",
+        ctx_filter: str = "-",
+        time_range: str = "a",
+        op: str = "f",
+        cursor: int = 0
+    ):
+        """Show a filtered, keyset-paginated page of errors"""
+        from db import browse_errors, get_error_contexts
+        
+        account_id = None if acc_filter == "-" else int(acc_filter)
+        context = None
+        if ctx_filter != "-":
+            contexts = {_context_key(name): name for name in await get_error_contexts()}
+            context = contexts.get(ctx_filter)
+            if context is None:
+                # Every error of that context was cleaned up since the button was sent
+                await event.answer("ℹ️ No errors left with that context", alert=True)
+                ctx_filter = "-"
+        since = None
+        if ERROR_RANGES[time_range][1]:
+            since = datetime.utcnow() - ERROR_RANGES[time_range][1]
+        
+        page = await browse_errors(
+            account_id=account_id,
+            context=context,
+            since=since,
+            before_id=cursor if op == "o" else None,
+            after_id=cursor if op == "n" else None,
+            limit=ERROR_PAGE_SIZE
+        )
+        errors = page["errors"]
+        
+        lines = [
+            "⚠️ <b>Errors</b>",
+            f"👤 {account_id or 'All accounts'} | 🏷 {html.escape(context or 'All contexts')} | "
+            f"🕐 {ERROR_RANGES[time_range][0]}\n"
+        ]
+        if not errors:
+            lines.append("✅ <b>No errors logged</b>")
+        for err in errors:
+            acc_id = err["account_id"] or "N/A"
+            created_at = err["created_at"][:19]
+            snippet = html.escape(err["error_text"][:150])
+            lines.append(
+                f"[{created_at}] Account {acc_id}\n"
+                f"Context: {html.escape(err['context'])}\n"
+                f"Error: {snippet}\n"
+            )
+        
+        base = f"err:{acc_filter}:{ctx_filter}"
+        range_buttons = [
+            Button.inline(
+                f"• {label}" if key == time_range else label,
+                data=f"{base}:{key}:f:0".encode()
+            )
+            for key, (label, _) in ERROR_RANGES.items()
+        ]
+        filter_buttons = [
+            Button.inline("🏷 Context", data=f"errctx:{acc_filter}:{time_range}".encode())
+        ]
+        if acc_filter != "-":
+            filter_buttons.append(
+                Button.inline("👤 All accounts", data=f"err:-:{ctx_filter}:{time_range}:f:0".encode())
+            )
+        nav_buttons = []
+        if errors and page["has_newer"]:
+            nav_buttons.append(Button.inline(
+                "◀️ Newer", data=f"{base}:{time_range}:n:{errors[0]['id']}".encode()
+            ))
+        if errors and page["has_older"]:
+            nav_buttons.append(Button.inline(
+                "Older ▶️", data=f"{base}:{time_range}:o:{errors[-1]['id']}".encode()
+            ))
+        
+        buttons = [range_buttons, filter_buttons]
+        if nav_buttons:
+            buttons.append(nav_buttons)
+        buttons.append([Button.inline("⬅️ Back", data=b"menu:back")])
+        
+        try:
+            await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.CallbackQuery(pattern=b"menu:errors"))
+    async def cb_menu_errors(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        await show_errors_page(event)
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"err:(-|\d+):(-|[0-9a-f]{12}):([hdwa]):([fon]):(\d+)")))
+    async def cb_errors_page(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"err:(-|\d+):(-|[0-9a-f]{12}):([hdwa]):([fon]):(\d+)", event.data)
+        acc_filter, ctx_filter, time_range, op, cursor = (
+            part.decode() for part in m.groups()
+        )
+        await show_errors_page(event, acc_filter, ctx_filter, time_range, op, int(cursor))
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"errctx:(-|\d+):([hdwa])")))
+    async def cb_errors_context(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"errctx:(-|\d+):([hdwa])", event.data)
+        acc_filter, time_range = (part.decode() for part in m.groups())
+        
+        from db import get_error_contexts
+        contexts = await get_error_contexts()
+        
+        buttons = [
+            [Button.inline(
+                context, data=f"err:{acc_filter}:{_context_key(context)}:{time_range}:f:0".encode()
+            )]
+            for context in contexts[:20]
+        ]
+        buttons.append([
+            Button.inline("🏷 All contexts", data=f"err:{acc_filter}:-:{time_range}:f:0".encode())
+        ])
+        await event.edit("🏷 <b>Filter by context:</b>", buttons=buttons, parse_mode="html")
     
     @bot.on(events.CallbackQuery(pattern=b"menu:scheduler"))
     async def cb_menu_scheduler(event):
@@ -395,16 +1153,25 @@ def setup_admin_handlers(bot):
         text = (
             f"⏱ <b>Scheduler Status:</b> {status}\n\n"
             f"<b>Settings:</b>\n"
-            f"⏰ Interval: {GROUP_INTERVAL_MINUTES} minutes\n"
-            f"📊 Max Groups: {MAX_GROUPS_PER_ACCOUNT} per account\n"
-            f"📅 Max Days: {MAX_ACCOUNT_DAYS} days"
+            f"⏰ Interval: {settings.get('group_interval_minutes')} minutes\n"
+            f"📊 Max Groups: {settings.get('max_groups_per_account')} per account\n"
+            f"📅 Max Days: {settings.get('max_account_days')} days"
         )
         
+        workers = get_worker_status()
+        if workers is not None:
+            text += "\n\n<b>Workers:</b>"
+            for index in sorted(workers):
+                info = workers[index]
+                age = int(time.time() - info["at"])
+                text += f"\n🧩 #{index} (pid {info['pid']}): {info['clients']} clients, {age}s ago"
+        
         buttons = [
             [
                 Button.inline("▶️ Start", data=b"scheduler:start"),
                 Button.inline("⏹ Stop", data=b"scheduler:stop")
             ],
+            [Button.inline("⚙️ Settings", data=b"menu:settings")],
             [Button.inline("⬅️ Back", data=b"menu:back")]
         ]
         
@@ -418,7 +1185,7 @@ def setup_admin_handlers(bot):
         if event.sender_id not in ADMIN_IDS:
             await event.answer("Access denied", alert=True)
             return
-        start_scheduler()
+        await _control("scheduler_start")
         await event.answer("✅ Scheduler started", alert=True)
         await cb_menu_scheduler(event)
     
@@ -427,17 +1194,121 @@ def setup_admin_handlers(bot):
         if event.sender_id not in ADMIN_IDS:
             await event.answer("Access denied", alert=True)
             return
-        stop_scheduler()
+        await _control("scheduler_stop")
         await event.answer("⏹ Scheduler stopped", alert=True)
         await cb_menu_scheduler(event)
     
+    @bot.on(events.CallbackQuery(pattern=b"menu:settings"))
+    async def cb_menu_settings(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        from db import get_settings
+        stored = await get_settings()
+        
+        lines = ["⚙️ <b>Runtime Settings</b>\n"]
+        buttons = []
+        row = []
+        for key, setting in settings.SETTINGS.items():
+            value = settings.get(key)
+            line = f"{setting.label}: <b>{setting.format(value)}</b>"
+            if value != setting.default:
+                line += f" (env {setting.format(setting.default)})"
+            lines.append(line)
+            row.append(Button.inline(setting.label, data=f"set:edit:{key}".encode()))
+            if len(row) == 2:
+                buttons.append(row)
+                row = []
+        if row:
+            buttons.append(row)
+        
+        last = max(
+            (entry for entry in stored.values() if entry["previous"] is not None),
+            key=lambda entry: entry["updated_at"],
+            default=None
+        )
+        if last and last["key"] in settings.SETTINGS:
+            setting = settings.SETTINGS[last["key"]]
+            lines.append(
+                f"\n🕘 Last change: {setting.label} "
+                f"{setting.format(setting.parse(last['previous']))} → "
+                f"{setting.format(setting.parse(last['value']))} "
+                f"by {last['updated_by']} at {last['updated_at'][:16].replace('T', ' ')}"
+            )
+            buttons.append([Button.inline("↩️ Undo last change", data=b"set:undo")])
+        lines.append("\nChanges apply right away to the scheduler, rate limits and DB pool.")
+        buttons.append([Button.inline("⬅️ Back", data=b"menu:scheduler")])
+        
+        try:
+            await event.edit("\n".join(lines), buttons=buttons, parse_mode="html")
+        except MessageNotModifiedError:
+            pass
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"set:edit:(\w+)")))
+    async def cb_setting_edit(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        
+        m = re.match(br"set:edit:(\w+)", event.data)
+        key = m.group(1).decode()
+        setting = settings.SETTINGS.get(key)
+        if setting is None:
+            await event.answer("Unknown setting", alert=True)
+            return
+        
+        ADMIN_STATE[event.sender_id] = {"mode": "editing_setting", "key": key}
+        
+        text = (
+            f"⚙️ <b>{setting.label}</b>\n\n"
+            f"Current: <b>{setting.format(settings.get(key))}</b>\n"
+            f"Default (env): {setting.format(setting.default)}\n"
+            f"Allowed: {setting.minimum:g} – {setting.maximum:g}\n\n"
+            f"Send the new value, or /cancel."
+        )
+        await event.reply(text, parse_mode="html")
+    
+    async def _answer_rollback(event, key: Optional[str]):
+        from settings import rollback_setting
+        result = await rollback_setting(key, event.sender_id)
+        if result is None:
+            await event.answer("Nothing to roll back", alert=True)
+            return
+        key, old, new = result
+        setting = settings.SETTINGS[key]
+        if not await _control("settings"):
+            await event.answer(
+                f"⚠️ {setting.label} saved as {setting.format(new)}, but some workers "
+                f"did not apply it (see Errors)", alert=True
+            )
+            return
+        await event.answer(
+            f"↩️ {setting.label}: {setting.format(old)} → {setting.format(new)}", alert=True
+        )
+    
+    @bot.on(events.CallbackQuery(pattern=re.compile(br"set:rollback:(\w+)")))
+    async def cb_setting_rollback(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        m = re.match(br"set:rollback:(\w+)", event.data)
+        await _answer_rollback(event, m.group(1).decode())
+    
+    @bot.on(events.CallbackQuery(pattern=b"set:undo"))
+    async def cb_setting_undo(event):
+        if event.sender_id not in ADMIN_IDS:
+            await event.answer("Access denied", alert=True)
+            return
+        await _answer_rollback(event, None)
+        await cb_menu_settings(event)
+    
     @bot.on(events.CallbackQuery(pattern=b"accounts:add"))
     async def cb_accounts_add(event):
         if event.sender_id not in ADMIN_IDS:
             await event.answer("Access denied", alert=True)
             return
         
-        ensure_sessions_dir()
         ADMIN_STATE[event.sender_id] = {"mode": "adding_account_phone"}
         
         text = (
@@ -540,7 +1411,7 @@ def setup_admin_handlers(bot):
                 finally:
                     ADMIN_STATE.pop(event.sender_id, None)
 
-            asyncio.create_task(run_flow())
+            spawn(f"add_account:{phone}", run_flow)
             return
 
         if state and state.get("mode") == "adding_account_flow":
@@ -558,6 +1429,32 @@ def setup_admin_handlers(bot):
                     await event.reply("⏳ در حال تایید رمز...")
                 return
         
+        # Changing a runtime setting
+        if state and state.get("mode") == "editing_setting":
+            from settings import update_setting
+            key = state["key"]
+            setting = settings.SETTINGS[key]
+            try:
+                old, new = await update_setting(key, text, event.sender_id)
+            except ValueError as exc:
+                await event.reply(str(exc))
+                return
+            ADMIN_STATE.pop(event.sender_id, None)
+            
+            buttons = [
+                [Button.inline("↩️ Rollback", data=f"set:rollback:{key}".encode())],
+                [Button.inline("⚙️ Settings", data=b"menu:settings")]
+            ]
+            if await _control("settings"):
+                reply = f"✅ {setting.label}: {setting.format(old)} → {setting.format(new)}"
+            else:
+                reply = (
+                    f"⚠️ {setting.label} saved as {setting.format(new)}, "
+                    f"but some workers did not apply it (see Errors)"
+                )
+            await event.reply(reply, buttons=buttons)
+            return
+        
         # Setting proxy
         if state and state.get("mode") == "setting_proxy":
             acc_id = state.get("account_id")
@@ -567,31 +1464,51 @@ def setup_admin_handlers(bot):
                 from db import update_proxy
                 await update_proxy(acc_id, None, None, None, None)
                 ADMIN_STATE.pop(event.sender_id, None)
+                await _control("proxy", acc_id)
                 await event.reply(f"✅ Proxy cleared for account {acc_id}")
                 return
             
             # Parse proxy format
-            parts = text.split(":")
-            if len(parts) not in (2, 4):
-                await event.reply(
-                    "❌ Invalid format\n"
-                    "Use: <code>host:port</code> or <code>host:port:username:password</code>",
-                    parse_mode="html"
-                )
-                return
-            
-            host = parts[0]
             try:
-                port = int(parts[1])
-            except ValueError:
-                await event.reply("❌ Port must be a number")
+                host, port, username, password = _parse_proxy(text)
+            except ValueError as exc:
+                await event.reply(str(exc), parse_mode="html")
                 return
             
-            username = parts[2] if len(parts) == 4 else None
-            password = parts[3] if len(parts) == 4 else None
-            
             from db import update_proxy
             await update_proxy(acc_id, host, port, username, password)
             ADMIN_STATE.pop(event.sender_id, None)
-            await event.reply(f"✅ Proxy updated for account {acc_id}")
+            if await _control("proxy", acc_id):
+                await event.reply(f"✅ Proxy updated for account {acc_id}")
+            else:
+                await event.reply(f"⚠️ Proxy saved for account {acc_id}, but reconnecting failed (see Errors)")
+            return
+        
+        # Assigning proxies to selected accounts
+        if state and state.get("mode") == "bulk_proxies":
+            proxies = []
+            for line in text.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    proxies.append(_parse_proxy(line))
+                except ValueError as exc:
+                    await event.reply(
+                        f"{exc}\n\nLine: <code>{html.escape(line)}</code>", parse_mode="html"
+                    )
+                    return
+            if not proxies:
+                await event.reply("❌ Send at least one proxy")
+                return
+            
+            from db import bulk_assign_proxies
+            ids = state["account_ids"]
+            ADMIN_STATE.pop(event.sender_id, None)
+            assignments = await bulk_assign_proxies(ids, proxies)
+            failed = await _control_many("proxy", list(assignments))
+            await event.reply(
+                bulk_summary(f"{len(proxies)} proxies assigned", len(ids), list(assignments), failed),
+                parse_mode="html"
+            )
             return
@@ -0,0 +1,162 @@
+import asyncio
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+from config import (
+    BACKUP_DIR,
+    BACKUP_INTERVAL_HOURS,
+    BACKUP_KEEP,
+    DB_BUSY_TIMEOUT,
+)
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pages copied per backup step, and the pause between steps (seconds)
+BACKUP_STEP_PAGES = 64
+BACKUP_STEP_SLEEP = 0.005
+
+BACKUP_PREFIX = "data-"
+BACKUP_SUFFIX = ".db.gz"
+
+_BACKUP_LOCK = asyncio.Lock()
+
+
+class BackupCancelled(Exception):
+    """Raised inside the backup thread when the backup task is cancelled"""
+
+
+def _copy_snapshot(target_path: str, cancelled: threading.Event) -> int:
+    """Copy the database page by page from one WAL snapshot, return the page count"""
+    from db import read_only_uri
+    source = sqlite3.connect(read_only_uri(), uri=True, timeout=DB_BUSY_TIMEOUT)
+    target = sqlite3.connect(target_path)
+    try:
+        # Holding a read transaction pins the snapshot: commits from other
+        # connections no longer restart the copy, and writers never wait on it
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+
+        progress = {"total": 0}
+
+        def on_step(status, remaining, total):
+            progress["total"] = total
+            if cancelled.is_set():
+                raise BackupCancelled()
+
+        source.backup(
+            target, pages=BACKUP_STEP_PAGES, progress=on_step, sleep=BACKUP_STEP_SLEEP
+        )
+        result = target.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise RuntimeError(f"Backup failed quick_check: {result}")
+        return progress["total"]
+    finally:
+        target.close()
+        source.close()
+
+
+def _compress(source_path: str, target_path: str):
+    with open(source_path, "rb") as src, gzip.open(target_path, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _rotate(keep: int) -> int:
+    """Delete the oldest snapshots beyond `keep`, return how many were removed"""
+    snapshots = sorted(
+        glob.glob(os.path.join(BACKUP_DIR, f"{BACKUP_PREFIX}*{BACKUP_SUFFIX}")),
+        key=os.path.getmtime
+    )
+    removed = 0
+    for path in snapshots[:max(0, len(snapshots) - keep)]:
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def _run_backup(cancelled: threading.Event) -> Dict[str, Any]:
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    final_path = os.path.join(BACKUP_DIR, f"{BACKUP_PREFIX}{stamp}{BACKUP_SUFFIX}")
+    counter = 1
+    while os.path.exists(final_path):
+        final_path = os.path.join(BACKUP_DIR, f"{BACKUP_PREFIX}{stamp}-{counter}{BACKUP_SUFFIX}")
+        counter += 1
+    raw_path = final_path[:-len(BACKUP_SUFFIX)] + ".db.part"
+    try:
+        pages = _copy_snapshot(raw_path, cancelled)
+        raw_bytes = os.path.getsize(raw_path)
+        _compress(raw_path, final_path + ".part")
+        os.replace(final_path + ".part", final_path)
+    finally:
+        for path in (raw_path, final_path + ".part"):
+            if os.path.exists(path):
+                os.remove(path)
+    return {
+        "path": final_path,
+        "pages": pages,
+        "raw_bytes": raw_bytes,
+        "bytes": os.path.getsize(final_path),
+        "rotated": _rotate(BACKUP_KEEP),
+    }
+
+
+async def create_backup() -> Dict[str, Any]:
+    """Take a compressed online snapshot of the database into BACKUP_DIR"""
+    async with _BACKUP_LOCK:
+        cancelled = threading.Event()
+        started = time.perf_counter()
+        try:
+            # The copy sleeps between steps in its own thread, the loop never blocks
+            result = await asyncio.to_thread(_run_backup, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        result["duration"] = round(time.perf_counter() - started, 3)
+
+    metrics.inc("db_backups")
+    metrics.observe("db_backup_seconds", result["duration"])
+    metrics.set_gauge("db_backup_bytes", result["bytes"])
+    logger.info(
+        f"💾 Backup {os.path.basename(result['path'])}: {result['pages']} pages, "
+        f"{result['raw_bytes']} -> {result['bytes']} bytes in {result['duration']:.2f}s",
+        extra={"context": "db_backup", "duration": result["duration"]}
+    )
+    return result
+
+
+def format_backup(result: Dict[str, Any]) -> str:
+    """Short backup summary for the admin bot"""
+    text = (
+        f"💾 Backup {os.path.basename(result['path'])}\n"
+        f"Size: {result['raw_bytes'] / 1024:.1f} KB -> {result['bytes'] / 1024:.1f} KB gzip\n"
+        f"Took {result['duration']:.2f}s"
+    )
+    if result["rotated"]:
+        text += f", removed {result['rotated']} old snapshots"
+    return text
+
+
+async def backup_loop():
+    """Take a backup every BACKUP_INTERVAL_HOURS"""
+    if BACKUP_INTERVAL_HOURS <= 0:
+        return
+    from db import log_error
+    from notifications import notify
+
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL_HOURS * 3600)
+        try:
+            await create_backup()
+        except Exception as e:
+            logger.exception("Backup failed", extra={"context": "db_backup"})
+            await log_error(context="db_backup", error_text=str(e))
+            notify("db_backup", f"❌ Scheduled backup failed: {e}")
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time account loading on a scratch database")
+    parser.add_argument("--accounts", type=int, default=10000, help="accounts to seed")
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per query")
+    return parser.parse_args()
+
+
+def configure_environment():
+    """Scratch database (before any import of config)"""
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    os.environ["DB_PATH"] = os.path.join(scratch, "data.db")
+    os.environ["BACKUP_DIR"] = os.path.join(scratch, "backups")
+    os.environ["TRACE_PATH"] = ""
+    os.environ["HEALTH_PORT"] = "0"
+
+
+async def seed(accounts: int):
+    from db import init_db, refresh_next_due, write_transaction
+    await init_db()
+    now = datetime.utcnow().isoformat()
+    async with write_transaction() as db:
+        await db.executemany(
+            """INSERT INTO accounts (phone, session_path, label, created_groups_count,
+                                     first_activity_at, last_group_created_at,
+                                     proxy_host, proxy_port, proxy_username, proxy_password)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (f"+1555{i:07d}", f"bench_{i}.session", f"bench_{i}", i % 40, now, None,
+                 "10.0.0.1" if i % 2 else None, 1080 if i % 2 else None,
+                 "user" if i % 2 else None, "secret" if i % 2 else None)
+                for i in range(accounts)
+            ]
+        )
+    await refresh_next_due()
+
+
+async def timed(func, runs: int) -> float:
+    """Median milliseconds of func()"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def retained(func) -> int:
+    """Bytes still allocated while func()'s result is held"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = await func()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return size
+
+
+async def run(args):
+    from db import close_db, get_accounts, get_due_accounts, get_global_stats
+
+    await seed(args.accounts)
+    due = lambda: get_due_accounts(datetime.utcnow())  # noqa: E731
+    rows = [
+        ("get_accounts", get_accounts),
+        ("get_due_accounts", due),
+        ("get_global_stats", get_global_stats),
+    ]
+    print(f"{args.accounts} accounts, median of {args.runs} runs (SQLite {__import__('sqlite3').sqlite_version}, "
+          f"Python {sys.version.split()[0]})")
+    print(f"{'':<20}{'ms':>10}{'B/row':>10}")
+    for name, func in rows:
+        ms = await timed(func, args.runs)
+        per_row = await retained(func) / args.accounts
+        print(f"{name:<20}{ms:>10.1f}{per_row:>10.0f}")
+    await close_db()
+
+
+def main():
+    args = parse_args()
+    configure_environment()
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Dict, List, Optional
+
+from supervisor import SUPERVISOR, spawn
+
+logger = logging.getLogger(__name__)
+
+# Seconds between worker status reports
+STATUS_INTERVAL = 15
+# Seconds the coordinator waits for a control acknowledgement
+CONTROL_TIMEOUT = 60
+# Seconds a worker gets to shut down before it is terminated
+SHUTDOWN_TIMEOUT = 90
+
+# Actions that are broadcast to every worker instead of the owning one
+BROADCAST_ACTIONS = ("scheduler_start", "scheduler_stop", "settings")
+
+
+def shard_of(account_id: int, count: int) -> int:
+    """Index of the worker that owns an account"""
+    return account_id % count
+
+
+def _receive(conn) -> asyncio.Queue:
+    """Feed messages from a pipe into a queue (None on close) without blocking the loop"""
+    queue: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    fd = conn.fileno()
+
+    def on_readable():
+        try:
+            while conn.poll():
+                queue.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(fd)
+            queue.put_nowait(None)
+
+    loop.add_reader(fd, on_readable)
+    return queue
+
+
+async def apply_control(action: str, account_id: Optional[int] = None):
+    """Apply a control action to the clients of this process"""
+    from accounts import disconnect_client, reconcile_account
+    from latency import forget as forget_latency
+    from limiter import forget
+    from scheduler import start_scheduler, stop_scheduler
+    from settings import load_settings
+
+    if action == "scheduler_start":
+        start_scheduler()
+    elif action == "scheduler_stop":
+        stop_scheduler()
+    elif action == "settings":
+        await load_settings()
+    elif action == "delete":
+        await disconnect_client(account_id)
+        forget(account_id)
+        forget_latency(account_id)
+    elif action in ("toggle", "proxy"):
+        await reconcile_account(account_id)
+    else:
+        raise ValueError(f"Unknown control action: {action}")
+
+
+class Coordinator:
+    """Runs in the main process: owns the admin bot and the worker processes"""
+
+    def __init__(self, bot, count: int):
+        self.bot = bot
+        self.count = count
+        self.processes: List[multiprocessing.Process] = []
+        self.connections = []
+        self.status: Dict[int, Dict] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._readers: List[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self):
+        """Spawn the worker processes"""
+        ctx = multiprocessing.get_context("spawn")
+        for index in range(self.count):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=worker_entry,
+                args=(index, self.count, child_conn),
+                name=f"worker-{index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.connections.append(parent_conn)
+            self._readers.append(spawn(
+                f"worker_link:{index}",
+                lambda index=index, conn=parent_conn: self._read_loop(index, conn)
+            ))
+
+    async def _read_loop(self, index: int, conn):
+        messages = _receive(conn)
+        while True:
+            message = await messages.get()
+            if message is None:
+                if not self._stopping:
+                    logger.warning(f"Worker {index} connection closed")
+                self.status.pop(index, None)
+                return
+
+            kind = message.get("type")
+            if kind == "ack":
+                future = self._pending.pop(message["id"], None)
+                if future and not future.done():
+                    if message["ok"]:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(RuntimeError(message["error"]))
+            elif kind == "status":
+                self.status[index] = message
+            elif kind == "notify":
+                from notifications import notify
+                notify(message["kind"], message["text"], html_text=True)
+
+    async def _request(self, index: int, action: str, account_id: Optional[int]):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.connections[index].send({
+            "type": "control",
+            "id": request_id,
+            "action": action,
+            "account_id": account_id
+        })
+        try:
+            await asyncio.wait_for(future, CONTROL_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def control(self, action: str, account_id: Optional[int] = None):
+        """Send a control action to the owning worker (or all workers)"""
+        if action in BROADCAST_ACTIONS:
+            await asyncio.gather(*(
+                self._request(index, action, account_id) for index in range(self.count)
+            ))
+        else:
+            await self._request(shard_of(account_id, self.count), action, account_id)
+
+    async def stop(self):
+        """Ask workers to shut down and wait for them concurrently"""
+        self._stopping = True
+        for conn in self.connections:
+            try:
+                conn.send({"type": "shutdown"})
+            except (BrokenPipeError, OSError):
+                pass
+        await asyncio.gather(*(
+            asyncio.to_thread(process.join, SHUTDOWN_TIMEOUT) for process in self.processes
+        ))
+        for process in self.processes:
+            if process.is_alive():
+                logger.warning(f"{process.name} did not exit in time, terminating")
+                process.terminate()
+        for task in self._readers:
+            task.cancel()
+
+
+# Set in the coordinator process when running with worker processes
+COORDINATOR: Optional[Coordinator] = None
+
+
+async def start_cluster(bot, count: int) -> Coordinator:
+    """Start worker processes for account shards"""
+    global COORDINATOR
+    COORDINATOR = Coordinator(bot, count)
+    COORDINATOR.start()
+    return COORDINATOR
+
+
+async def stop_cluster():
+    """Stop worker processes (no-op in single-process mode)"""
+    if COORDINATOR is not None:
+        await COORDINATOR.stop()
+
+
+async def dispatch_control(action: str, account_id: Optional[int] = None):
+    """Apply a control action in whichever process owns the account"""
+    if COORDINATOR is not None:
+        if action in BROADCAST_ACTIONS:
+            # Keep the coordinator's scheduler flag and settings in sync for the admin screens
+            await apply_control(action, account_id)
+        await COORDINATOR.control(action, account_id)
+    else:
+        await apply_control(action, account_id)
+
+
+def get_worker_liveness() -> Optional[Dict[int, Dict]]:
+    """Per worker: process alive and seconds since its last status report"""
+    if COORDINATOR is None:
+        return None
+    now = time.time()
+    return {
+        index: {
+            "alive": process.is_alive(),
+            "status_age": (
+                round(now - COORDINATOR.status[index]["at"], 1)
+                if index in COORDINATOR.status else None
+            ),
+        }
+        for index, process in enumerate(COORDINATOR.processes)
+    }
+
+
+def get_worker_status() -> Optional[Dict[int, Dict]]:
+    """Latest status report per worker (None in single-process mode)"""
+    if COORDINATOR is None:
+        return None
+    return dict(COORDINATOR.status)
+
+
+class CoordinatorLink:
+    """Worker side of the pipe: forwards admin notifications to the coordinator"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def notify(self, kind: str, text: str):
+        self.conn.send({"type": "notify", "kind": kind, "text": text})
+
+
+def worker_entry(index: int, count: int, conn):
+    """Worker process entry point"""
+    # Shutdown is driven by the coordinator over IPC
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from logging_setup import setup_logging, stop_logging
+    setup_logging(process_name=f"worker-{index}")
+    try:
+        asyncio.run(_run_worker(index, count, conn))
+    finally:
+        stop_logging()
+
+
+async def _run_worker(index: int, count: int, conn):
+    from accounts import ACCOUNT_CLIENTS, connected_clients, get_or_create_client, start_forwarding
+    from config import SHUTDOWN_DISCONNECT_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT
+    from db import get_accounts, log_error
+    from lifecycle import close_clients_and_db, drain_scheduler_task
+    from loop_watchdog import watch_loop
+    from latency import profile as latency_profile
+    from notifications import forward_to
+    from scheduler import run_scheduler
+    from settings import load_settings
+    from tracing import enabled as tracing_enabled, run_trace_writer
+
+    phases: Dict[str, float] = {}
+    started = asyncio.Event()
+
+    async def report_status():
+        while True:
+            conn.send({
+                "type": "status",
+                "worker": index,
+                "pid": os.getpid(),
+                "clients": len(ACCOUNT_CLIENTS),
+                "connected": connected_clients(),
+                "started": started.is_set(),
+                "startup": dict(phases),
+                "latency": latency_profile(),
+                "tasks": SUPERVISOR.snapshot(),
+                "at": time.time()
+            })
+            if started.is_set():
+                await asyncio.sleep(STATUS_INTERVAL)
+                continue
+            try:
+                # Report right away once startup finishes
+                await asyncio.wait_for(started.wait(), STATUS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    # Reports start before the clients so the coordinator can tell slow from hung
+    spawn("status_report", report_status, restart=True)
+    if tracing_enabled():
+        spawn("trace_writer", run_trace_writer)
+    spawn("loop_watchdog", watch_loop, restart=True)
+
+    # Values changed from the admin bot before this worker started
+    await load_settings()
+    shard = (index, count)
+    phase_started = time.perf_counter()
+    accounts = await get_accounts(active_only=True, shard=shard)
+    for acc in accounts:
+        try:
+            client = await get_or_create_client(acc)
+            await start_forwarding(acc.id, client)
+        except Exception as e:
+            logger.exception(f"Failed to start account {acc.id}", extra={"account_id": acc.id})
+            await log_error("worker_start_account", str(e), acc.id)
+    phases["clients"] = round(time.perf_counter() - phase_started, 3)
+    logger.info(
+        f"Worker {index}/{count} started {len(ACCOUNT_CLIENTS)} clients in {phases['clients']:.1f}s"
+    )
+
+    # The coordinator coalesces and delivers notifications for all workers
+    forward_to(CoordinatorLink(conn).notify)
+    scheduler_task = spawn(
+        "scheduler", lambda: run_scheduler(shard=shard), restart=True
+    )
+    started.set()
+
+    async def handle_control(message):
+        try:
+            await apply_control(message["action"], message["account_id"])
+            conn.send({"type": "ack", "id": message["id"], "ok": True})
+        except Exception as e:
+            logger.exception(f"Control action {message['action']} failed")
+            conn.send({"type": "ack", "id": message["id"], "ok": False, "error": str(e)})
+
+    messages = _receive(conn)
+    try:
+        while True:
+            message = await messages.get()
+            if message is None or message.get("type") == "shutdown":
+                break
+            if message.get("type") == "control":
+                spawn(
+                    f"control:{message['action']}",
+                    lambda message=message: handle_control(message)
+                )
+    finally:
+        await SUPERVISOR.cancel(exclude=("scheduler",), timeout=SHUTDOWN_DISCONNECT_TIMEOUT)
+        await drain_scheduler_task(scheduler_task, SHUTDOWN_DRAIN_TIMEOUT)
+        await close_clients_and_db(SHUTDOWN_DISCONNECT_TIMEOUT)
@@ -8,6 +8,13 @@ def _get_int_env(name: str, default: int) -> int:
     return int(value)
 
 
+def _get_float_env(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
 API_ID = _get_int_env("API_ID", 16623)
 API_HASH = os.getenv("API_HASH", "8c9dbfe58437d1739540f5d53c72ae4b")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")  # Get from @BotFather
@@ -22,9 +29,100 @@ TELEGRAM_SERVICE_ID = _get_int_env("TELEGRAM_SERVICE_ID", 777000)
 
 # Database
 DB_PATH = os.getenv("DB_PATH", "data.db")
+# Seconds a writer waits for another process holding the write lock
+DB_BUSY_TIMEOUT = _get_float_env("DB_BUSY_TIMEOUT", 30)
+# Read-only connections shared by admin screens and scheduler reads
+# (default: settings.py can override it at runtime)
+DB_READ_CONNECTIONS = _get_int_env("DB_READ_CONNECTIONS", 3)
+# Background maintenance (incremental vacuum, optimize, WAL checkpoint):
+# minutes between runs (0 = disabled), seconds of work per run, and seconds
+# without writes that count as a quiet moment to start
+DB_MAINTENANCE_INTERVAL_MINUTES = _get_int_env("DB_MAINTENANCE_INTERVAL_MINUTES", 360)
+DB_MAINTENANCE_BUDGET = _get_float_env("DB_MAINTENANCE_BUDGET", 10)
+DB_MAINTENANCE_QUIET_SECONDS = _get_float_env("DB_MAINTENANCE_QUIET_SECONDS", 5)
+# Online backups: directory, hours between scheduled backups (0 = disabled)
+# and how many compressed snapshots to keep
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL_HOURS = _get_float_env("BACKUP_INTERVAL_HOURS", 24)
+BACKUP_KEEP = _get_int_env("BACKUP_KEEP", 7)
+# Statements slower than this (ms) go to the slow-query log with their
+# query plan (0 = only keep latency stats)
+SLOW_QUERY_MS = _get_float_env("SLOW_QUERY_MS", 100)
 SESSIONS_DIR = os.getenv("SESSIONS_DIR", "sessions")
 
-# Group creation limits
+# Group creation limits (defaults: settings.py can override them at runtime)
 GROUP_INTERVAL_MINUTES = _get_int_env("GROUP_INTERVAL_MINUTES", 30)
 MAX_GROUPS_PER_ACCOUNT = _get_int_env("MAX_GROUPS_PER_ACCOUNT", 450)
 MAX_ACCOUNT_DAYS = _get_int_env("MAX_ACCOUNT_DAYS", 10)
+
+# Group messages: "separate" sends one message per line,
+# "compact" packs all lines into MESSAGE_CHUNKS messages
+MESSAGE_MODE = os.getenv("MESSAGE_MODE", "separate").strip().lower()
+MESSAGE_CHUNKS = _get_int_env("MESSAGE_CHUNKS", 1)
+
+# Per-account rate limits: method class -> (calls per minute, burst)
+# (defaults: settings.py can override them at runtime)
+RATE_LIMITS = {
+    "create_channel": (
+        _get_float_env("RATE_CREATE_CHANNEL_PER_MINUTE", 1),
+        _get_float_env("RATE_CREATE_CHANNEL_BURST", 1),
+    ),
+    "send_message": (
+        _get_float_env("RATE_SEND_MESSAGE_PER_MINUTE", 20),
+        _get_float_env("RATE_SEND_MESSAGE_BURST", 3),
+    ),
+    "forward": (
+        _get_float_env("RATE_FORWARD_PER_MINUTE", 20),
+        _get_float_env("RATE_FORWARD_BURST", 3),
+    ),
+    "auth": (
+        _get_float_env("RATE_AUTH_PER_MINUTE", 3),
+        _get_float_env("RATE_AUTH_BURST", 2),
+    ),
+}
+for _method, (_per_minute, _burst) in RATE_LIMITS.items():
+    # A zero rate would never refill the bucket (and divide by zero in the limiter)
+    if _per_minute <= 0:
+        raise ValueError(f"RATE_{_method.upper()}_PER_MINUTE must be greater than 0, got {_per_minute:g}")
+# FloodWaits up to this many seconds are waited out and retried
+FLOOD_SLEEP_THRESHOLD = _get_int_env("FLOOD_SLEEP_THRESHOLD", 60)
+
+# Multi-process mode: number of worker processes (0 = single process)
+WORKER_PROCESSES = _get_int_env("WORKER_PROCESSES", 0)
+
+# Shutdown: seconds to let an in-flight group creation finish,
+# and to wait for all clients to disconnect
+SHUTDOWN_DRAIN_TIMEOUT = _get_float_env("SHUTDOWN_DRAIN_TIMEOUT", 60)
+SHUTDOWN_DISCONNECT_TIMEOUT = _get_float_env("SHUTDOWN_DISCONNECT_TIMEOUT", 15)
+
+# Seconds admin notifications are collected into one digest before sending
+NOTIFY_DIGEST_SECONDS = _get_float_env("NOTIFY_DIGEST_SECONDS", 30)
+
+# Slow accounts: p95 latency (connect, CreateChannel, send_message) this many
+# times the fleet median gets an account flagged; flagged accounts run last in
+# a scheduler pass, at most SLOW_ACCOUNTS_PER_TICK of them (default, tunable at
+# runtime; at least 1 so flagged accounts keep being measured and can recover)
+SLOW_ACCOUNT_FACTOR = _get_float_env("SLOW_ACCOUNT_FACTOR", 3)
+SLOW_ACCOUNTS_PER_TICK = _get_int_env("SLOW_ACCOUNTS_PER_TICK", 2)
+
+# Opt-in trace of Telegram API calls and admin events for offline replay
+# (JSONL, anonymized ids; empty = off), and its size limit in MB
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+TRACE_MAX_MB = _get_float_env("TRACE_MAX_MB", 100)
+
+# Local HTTP health endpoint (/live, /ready, /startup; port 0 = disabled),
+# and the fraction of active accounts that must be connected to be ready
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = _get_int_env("HEALTH_PORT", 8787)
+HEALTH_READY_FRACTION = _get_float_env("HEALTH_READY_FRACTION", 0.9)
+
+# Event loop watchdog: lag that counts as a stall (ms), and seconds of
+# stalls within a minute that trigger an admin alert
+LOOP_LAG_THRESHOLD_MS = _get_float_env("LOOP_LAG_THRESHOLD_MS", 250)
+LOOP_STALL_ALERT_SECONDS = _get_float_env("LOOP_STALL_ALERT_SECONDS", 5)
+
+# Logging: "json" (structured, one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+# Max log lines per account per minute (0 = unlimited)
+LOG_ACCOUNT_RATE = _get_int_env("LOG_ACCOUNT_RATE", 30)
@@ -1,13 +1,149 @@
+import asyncio
+import json
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Set, Tuple
+from datetime import datetime, timedelta
+
 import aiosqlite
-from typing import Optional, List, Dict, Any
-from datetime import datetime
 
-from config import DB_PATH
+from config import DB_BUSY_TIMEOUT, DB_PATH, SESSIONS_DIR
+from models import ACCOUNT_COLUMNS, SUMMARY_COLUMNS, Account, AccountSummary
+from querylog import TimedConnection
+import settings
+
+
+def _connect() -> aiosqlite.Connection:
+    """Open a short-lived connection"""
+    return aiosqlite.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT)
+
+
+def read_only_uri() -> str:
+    """URI opening DB_PATH read-only ('#', '?' and '%' in the path escaped)"""
+    return Path(os.path.abspath(DB_PATH)).as_uri() + "?mode=ro"
+
+
+# Shared write connection (opened lazily, serialized by the lock)
+_write_conn: Optional[TimedConnection] = None
+_write_lock = asyncio.Lock()
+
+# Read-only connections for queries (opened lazily up to the db_read_connections setting)
+_read_pool: "asyncio.Queue[TimedConnection]" = asyncio.Queue()
+_read_opened = 0
+
+# Commits made through write_transaction in this process
+_write_commits = 0
+
+
+async def get_write_connection() -> TimedConnection:
+    """Get the shared write connection"""
+    global _write_conn
+    if _write_conn is None:
+        conn = await _connect()
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        _write_conn = TimedConnection(conn)
+    return _write_conn
+
+
+@asynccontextmanager
+async def write_transaction():
+    """Run statements in a single transaction on the shared write connection"""
+    global _write_commits
+    async with _write_lock:
+        db = await get_write_connection()
+        # Take the write lock up front so other processes wait on busy_timeout
+        # instead of failing on a read-to-write upgrade
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            await db.commit()
+            _write_commits += 1
+        except BaseException:
+            await db.rollback()
+            raise
+
+
+@asynccontextmanager
+async def read_connection():
+    """Borrow a read-only connection (WAL readers never block the writer)"""
+    global _read_opened
+    if _read_pool.empty() and _read_opened < settings.get("db_read_connections"):
+        _read_opened += 1
+        try:
+            conn = await aiosqlite.connect(read_only_uri(), uri=True, timeout=DB_BUSY_TIMEOUT)
+        except BaseException:
+            _read_opened -= 1
+            raise
+        conn.row_factory = aiosqlite.Row
+        await conn.execute("PRAGMA query_only = 1")
+        db = TimedConnection(conn)
+    else:
+        db = await _read_pool.get()
+    try:
+        yield db
+    finally:
+        # Statements whose rows were never fetched are recorded on release
+        db.flush()
+        if _read_opened > settings.get("db_read_connections"):
+            # The pool was shrunk while this connection was out
+            _read_opened -= 1
+            await db.close()
+        else:
+            _read_pool.put_nowait(db)
+
+
+def trim_read_pool():
+    """Close idle read connections above the db_read_connections setting"""
+    global _read_opened
+    from supervisor import spawn
+    while _read_opened > settings.get("db_read_connections") and not _read_pool.empty():
+        db = _read_pool.get_nowait()
+        _read_opened -= 1
+        spawn("close_read_connection", db.close)
+
+
+async def close_db():
+    """Close the shared write connection and the read-only pool"""
+    global _write_conn, _read_opened
+    async with _write_lock:
+        if _write_conn is not None:
+            await _write_conn.close()
+            _write_conn = None
+    while not _read_pool.empty():
+        await _read_pool.get_nowait().close()
+        _read_opened -= 1
 
 
 async def init_db():
     """Initialize database tables"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
+        # Incremental vacuum needs auto_vacuum set before any page is written;
+        # existing files are converted once with a full VACUUM
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] != 2:
+            cursor = await db.execute("PRAGMA page_count")
+            has_pages = (await cursor.fetchone())[0] > 0
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            if has_pages:
+                await db.execute("VACUUM")
+        await db.execute("PRAGMA journal_mode=WAL")
+        
+        # Runtime settings changed from the admin bot (previous value kept for rollback)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            previous TEXT,
+            updated_at TEXT NOT NULL,
+            updated_by INTEGER
+        )
+        """)
+        cursor = await db.execute("SELECT key, value FROM settings")
+        settings.apply_values(await cursor.fetchall())
+        
         # Accounts table
         await db.execute("""
         CREATE TABLE IF NOT EXISTS accounts (
@@ -24,9 +160,25 @@ async def init_db():
             proxy_port INTEGER,
             proxy_username TEXT,
             proxy_password TEXT,
-            disabled_reason TEXT
+            disabled_reason TEXT,
+            next_due_at TEXT
         )
         """)
+        cursor = await db.execute("SELECT name FROM pragma_table_info('accounts')")
+        if "next_due_at" not in {row[0] for row in await cursor.fetchall()}:
+            await db.execute("ALTER TABLE accounts ADD COLUMN next_due_at TEXT")
+        # Scheduler lookups: due accounts, and active accounts by age
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accounts_next_due "
+            "ON accounts(next_due_at) WHERE next_due_at IS NOT NULL"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accounts_active_first_activity "
+            "ON accounts(first_activity_at) WHERE is_active = 1"
+        )
+        # Interval or group limit may have changed since the last run
+        # (environment defaults or stored settings)
+        await _refresh_next_due(db, "true")
         
         # Groups table
         await db.execute("""
@@ -53,94 +205,278 @@ async def init_db():
         )
         """)
         
+        # Per-account group history
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_groups_account_created "
+            "ON groups(account_id, created_at)"
+        )
+        
+        # Error browser indexes (one per filter, all ending in id for keyset paging)
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_errors_account ON errors(account_id, id)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_errors_context ON errors(context, id)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_errors_account_context "
+            "ON errors(account_id, context, id)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_errors_created ON errors(created_at)"
+        )
+        
+        # Telethon session tables (auth key / DC per session name)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS telethon_sessions (
+            name TEXT PRIMARY KEY,
+            dc_id INTEGER NOT NULL,
+            server_address TEXT,
+            port INTEGER,
+            auth_key BLOB,
+            takeout_id INTEGER
+        )
+        """)
+        
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS telethon_entities (
+            session_name TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            hash INTEGER NOT NULL,
+            username TEXT,
+            phone TEXT,
+            name TEXT,
+            date INTEGER,
+            PRIMARY KEY(session_name, id)
+        )
+        """)
+        
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS telethon_update_state (
+            session_name TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            pts INTEGER,
+            qts INTEGER,
+            date INTEGER,
+            seq INTEGER,
+            PRIMARY KEY(session_name, id)
+        )
+        """)
+        
+        # Group creation journal: one row per unfinished creation
+        # (phase "intent" before CreateChannel, "created" once the chat exists)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS group_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            group_number INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            scheduled_at TEXT NOT NULL,
+            phase TEXT NOT NULL DEFAULT 'intent',
+            chat_id TEXT,
+            group_id INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+        """)
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_group_jobs_account ON group_jobs(account_id)"
+        )
+        
+        # Daily rollup, maintained by the write path (account_id 0 = system)
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_activity'"
+        )
+        rollup_exists = await cursor.fetchone() is not None
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS daily_activity (
+            day TEXT NOT NULL,
+            account_id INTEGER NOT NULL,
+            groups_created INTEGER NOT NULL DEFAULT 0,
+            messages_sent INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            flood_wait_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(day, account_id)
+        )
+        """)
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_daily_activity_account "
+            "ON daily_activity(account_id, day)"
+        )
+        if not rollup_exists:
+            # One-time backfill from existing history
+            await db.execute("""
+            INSERT INTO daily_activity (day, account_id, groups_created, messages_sent)
+            SELECT substr(created_at, 1, 10), account_id, COUNT(*), SUM(messages_sent)
+            FROM groups GROUP BY 1, 2
+            """)
+            await db.execute("""
+            INSERT INTO daily_activity (day, account_id, errors)
+            SELECT substr(created_at, 1, 10), COALESCE(account_id, 0), COUNT(*)
+            FROM errors WHERE true GROUP BY 1, 2
+            ON CONFLICT(day, account_id) DO UPDATE SET errors = excluded.errors
+            """)
+        
         await db.commit()
 
 
+# next_due_at from a row's own columns: NULL while it can't create groups,
+# the epoch if it never has (due right away)
+_NEXT_DUE = (
+    "CASE WHEN is_active = 1 AND created_groups_count < ? THEN COALESCE("
+    "strftime('%Y-%m-%dT%H:%M:%f', last_group_created_at, ?), '1970-01-01T00:00:00'"
+    ") END"
+)
+
+
+async def _refresh_next_due(db: aiosqlite.Connection, where: str, params: Tuple = ()):
+    """Recompute next_due_at for matching rows inside the caller's transaction"""
+    await db.execute(
+        f"UPDATE accounts SET next_due_at = {_NEXT_DUE} WHERE {where}",
+        (
+            settings.get("max_groups_per_account"),
+            f"+{settings.get('group_interval_minutes')} minutes",
+            *params
+        )
+    )
+
+
+async def refresh_next_due():
+    """Recompute next_due_at for every account after the interval or group limit changed"""
+    async with write_transaction() as db:
+        await _refresh_next_due(db, "true")
+
+
 async def add_account(phone: str, session_path: str, label: str = None) -> int:
     """Add a new account"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with write_transaction() as db:
         cursor = await db.execute(
             """INSERT INTO accounts (phone, session_path, label, is_active)
                VALUES (?, ?, ?, 1)""",
             (phone, session_path, label or phone)
         )
-        await db.commit()
+        await _refresh_next_due(db, "id = ?", (cursor.lastrowid,))
         return cursor.lastrowid
 
 
-async def get_accounts(active_only: bool = False) -> List[Dict[str, Any]]:
-    """Get all accounts"""
-    query = "SELECT * FROM accounts"
+async def get_accounts(
+    active_only: bool = False,
+    shard: Optional[Tuple[int, int]] = None
+) -> List[Account]:
+    """Get all accounts (optionally only one (index, count) shard)"""
+    query = f"SELECT {ACCOUNT_COLUMNS} FROM accounts"
+    conditions = []
+    params: Tuple = ()
     if active_only:
-        query += " WHERE is_active = 1"
+        conditions.append("is_active = 1")
+    if shard:
+        conditions.append("id % ? = ?")
+        params = (shard[1], shard[0])
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
     query += " ORDER BY id"
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(query)
+    async with read_connection() as db:
+        cursor = await db.execute(query, params)
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        return [Account.from_row(row) for row in rows]
 
 
-async def get_account_by_id(account_id: int) -> Optional[Dict[str, Any]]:
+async def get_account_by_id(account_id: int) -> Optional[Account]:
     """Get account by ID"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with read_connection() as db:
         cursor = await db.execute(
-            "SELECT * FROM accounts WHERE id = ?", (account_id,)
+            f"SELECT {ACCOUNT_COLUMNS} FROM accounts WHERE id = ?", (account_id,)
         )
         row = await cursor.fetchone()
-        return dict(row) if row else None
+        return Account.from_row(row) if row else None
 
 
-async def get_account_by_phone(phone: str) -> Optional[Dict[str, Any]]:
+async def get_account_by_phone(phone: str) -> Optional[Account]:
     """Get account by phone"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with read_connection() as db:
         cursor = await db.execute(
-            "SELECT * FROM accounts WHERE phone = ?", (phone,)
+            f"SELECT {ACCOUNT_COLUMNS} FROM accounts WHERE phone = ?", (phone,)
         )
         row = await cursor.fetchone()
-        return dict(row) if row else None
+        return Account.from_row(row) if row else None
 
 
-async def toggle_account_active(account_id: int) -> Optional[Dict[str, Any]]:
+async def toggle_account_active(account_id: int) -> Optional[Account]:
     """Toggle account active status"""
-    account = await get_account_by_id(account_id)
-    if not account:
-        return None
-    
-    new_state = 0 if account["is_active"] else 1
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE accounts SET is_active = ? WHERE id = ?",
-            (new_state, account_id)
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            "UPDATE accounts SET is_active = 1 - is_active WHERE id = ?",
+            (account_id,)
         )
-        await db.commit()
-    
-    account["is_active"] = new_state
-    return account
+        if cursor.rowcount == 0:
+            return None
+        await _refresh_next_due(db, "id = ?", (account_id,))
+        cursor = await db.execute(
+            f"SELECT {ACCOUNT_COLUMNS} FROM accounts WHERE id = ?", (account_id,)
+        )
+        return Account.from_row(await cursor.fetchone())
 
 
 async def disable_account(account_id: int, reason: str):
     """Disable account with reason"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with write_transaction() as db:
         await db.execute(
             """UPDATE accounts 
-               SET is_active = 0, disabled_reason = ? 
+               SET is_active = 0, disabled_reason = ?, next_due_at = NULL 
                WHERE id = ?""",
             (reason, account_id)
         )
-        await db.commit()
+
+
+async def expire_accounts(
+    started_before: datetime,
+    reason: str,
+    shard: Optional[Tuple[int, int]] = None
+) -> List[int]:
+    """Disable every active account first used before `started_before`, return their ids"""
+    query = """UPDATE accounts
+               SET is_active = 0, disabled_reason = ?, next_due_at = NULL
+               WHERE is_active = 1 AND first_activity_at < ?"""
+    params: Tuple = (reason, started_before.isoformat())
+    if shard:
+        query += " AND id % ? = ?"
+        params += (shard[1], shard[0])
+    async with write_transaction() as db:
+        cursor = await db.execute(query + " RETURNING id", params)
+        return sorted(row[0] for row in await cursor.fetchall())
+
+
+async def get_due_accounts(
+    now: datetime,
+    shard: Optional[Tuple[int, int]] = None
+) -> List[Account]:
+    """Active accounts allowed to create a group at `now`, longest waiting first"""
+    query = f"SELECT {ACCOUNT_COLUMNS} FROM accounts WHERE next_due_at <= ?"
+    params: Tuple = (now.isoformat(),)
+    if shard:
+        query += " AND id % ? = ?"
+        params += (shard[1], shard[0])
+    query += " ORDER BY next_due_at, id"
+    
+    async with read_connection() as db:
+        cursor = await db.execute(query, params)
+        return [Account.from_row(row) for row in await cursor.fetchall()]
 
 
 async def delete_account(account_id: int) -> bool:
-    """Delete account from database"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Delete account and its stored session from database"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            "SELECT session_path FROM accounts WHERE id = ?", (account_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return False
+        await _delete_session_rows(db, session_name_from_path(row[0]))
         cursor = await db.execute(
             "DELETE FROM accounts WHERE id = ?", (account_id,)
         )
-        await db.commit()
         return cursor.rowcount > 0
 
 
@@ -152,7 +488,7 @@ async def update_proxy(
     password: Optional[str]
 ):
     """Update account proxy settings"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with write_transaction() as db:
         await db.execute(
             """UPDATE accounts
                SET proxy_host = ?, proxy_port = ?, 
@@ -160,95 +496,482 @@ async def update_proxy(
                WHERE id = ?""",
             (host, port, username, password, account_id)
         )
-        await db.commit()
+
+
+# Account filters for bulk selection: name -> WHERE clause
+ACCOUNT_FILTERS = {
+    "all": "1",
+    "active": "is_active = 1",
+    "inactive": "is_active = 0",
+    "disabled": "disabled_reason IS NOT NULL",
+    "no_proxy": "proxy_host IS NULL",
+}
+
+# Bind a whole id list as one JSON parameter (no SQLite variable limit)
+_IDS_IN = "id IN (SELECT value FROM json_each(?))"
+
+
+async def get_account_ids(filter_name: str) -> List[int]:
+    """Get ids of accounts matching an ACCOUNT_FILTERS entry"""
+    async with read_connection() as db:
+        cursor = await db.execute(
+            f"SELECT id FROM accounts WHERE {ACCOUNT_FILTERS[filter_name]} ORDER BY id"
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def bulk_set_active(account_ids: List[int], active: bool) -> List[int]:
+    """Enable/disable accounts in one statement, return the ids that changed"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            f"""UPDATE accounts SET is_active = ?
+                WHERE {_IDS_IN} AND is_active != ?
+                RETURNING id""",
+            (int(active), json.dumps(account_ids), int(active))
+        )
+        changed = sorted(row[0] for row in await cursor.fetchall())
+        await _refresh_next_due(db, _IDS_IN, (json.dumps(changed),))
+        return changed
+
+
+async def bulk_clear_proxy(account_ids: List[int]) -> List[int]:
+    """Clear proxy settings of accounts, return the ids that had one"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            f"""UPDATE accounts
+                SET proxy_host = NULL, proxy_port = NULL,
+                    proxy_username = NULL, proxy_password = NULL
+                WHERE {_IDS_IN} AND proxy_host IS NOT NULL
+                RETURNING id""",
+            (json.dumps(account_ids),)
+        )
+        return sorted(row[0] for row in await cursor.fetchall())
+
+
+async def bulk_assign_proxies(
+    account_ids: List[int],
+    proxies: List[Tuple[str, int, Optional[str], Optional[str]]]
+) -> Dict[int, Tuple]:
+    """Assign proxies round-robin over accounts, return account id -> proxy"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            f"SELECT id FROM accounts WHERE {_IDS_IN} ORDER BY id",
+            (json.dumps(account_ids),)
+        )
+        assignments = {
+            row[0]: proxies[i % len(proxies)]
+            for i, row in enumerate(await cursor.fetchall())
+        }
+        await db.executemany(
+            """UPDATE accounts
+               SET proxy_host = ?, proxy_port = ?,
+                   proxy_username = ?, proxy_password = ?
+               WHERE id = ?""",
+            [(*proxy, account_id) for account_id, proxy in assignments.items()]
+        )
+    return assignments
+
+
+async def bulk_delete_accounts(account_ids: List[int]) -> List[Dict[str, Any]]:
+    """Delete accounts and their stored sessions, return the deleted rows"""
+    ids = json.dumps(account_ids)
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            f"DELETE FROM accounts WHERE {_IDS_IN} RETURNING id, phone, session_path",
+            (ids,)
+        )
+        deleted = [
+            {"id": row[0], "phone": row[1], "session_path": row[2]}
+            for row in await cursor.fetchall()
+        ]
+        names = json.dumps([session_name_from_path(row["session_path"]) for row in deleted])
+        for table, column in _SESSION_TABLES:
+            await db.execute(
+                f"DELETE FROM {table} WHERE {column} IN (SELECT value FROM json_each(?))",
+                (names,)
+            )
+    return sorted(deleted, key=lambda row: row["id"])
 
 
 async def create_group_record(
     account_id: int, chat_id: str, title: str
 ) -> int:
     """Create a group record"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    created_at = datetime.utcnow().isoformat()
+    async with write_transaction() as db:
         cursor = await db.execute(
             """INSERT INTO groups (account_id, chat_id, title, created_at)
                VALUES (?, ?, ?, ?)""",
-            (account_id, str(chat_id), title, datetime.utcnow().isoformat())
+            (account_id, str(chat_id), title, created_at)
         )
-        await db.commit()
+        await _bump_daily_activity(db, created_at[:10], account_id, groups=1)
         return cursor.lastrowid
 
 
-async def update_group_messages(group_id: int, count: int):
-    """Update messages sent count for a group"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE groups SET messages_sent = ? WHERE id = ?",
-            (count, group_id)
+async def start_group_job(
+    account_id: int, group_number: int, title: str, scheduled_at: datetime
+) -> int:
+    """Journal the intent to create a group (before any API call)"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            """INSERT INTO group_jobs (account_id, group_number, title, scheduled_at, updated_at)
+               VALUES (?, ?, ?, ?, ?)""",
+            (account_id, group_number, title, scheduled_at.isoformat(),
+             datetime.utcnow().isoformat())
         )
-        await db.commit()
+        return cursor.lastrowid
 
 
-async def increment_account_groups(account_id: int):
-    """Increment account's created groups count"""
-    async with aiosqlite.connect(DB_PATH) as db:
+async def record_group_job_chat(job_id: int, account_id: int, chat_id: str, title: str) -> int:
+    """Save the created chat as a group row and move the job to "created", return the group id"""
+    created_at = datetime.utcnow().isoformat()
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            """INSERT INTO groups (account_id, chat_id, title, created_at)
+               VALUES (?, ?, ?, ?)""",
+            (account_id, str(chat_id), title, created_at)
+        )
+        group_id = cursor.lastrowid
+        await _bump_daily_activity(db, created_at[:10], account_id, groups=1)
         await db.execute(
-            """UPDATE accounts
-               SET created_groups_count = created_groups_count + 1
+            """UPDATE group_jobs
+               SET phase = 'created', chat_id = ?, group_id = ?, updated_at = ?
                WHERE id = ?""",
-            (account_id,)
+            (str(chat_id), group_id, created_at, job_id)
         )
-        await db.commit()
+        return group_id
 
 
-async def update_account_activity(
+async def complete_group_job(
+    job_id: int,
     account_id: int,
-    first_activity: Optional[datetime],
+    group_id: int,
+    messages_sent: int,
+    first_activity: datetime,
     last_group: datetime
 ):
-    """Update account activity timestamps"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        if first_activity:
-            await db.execute(
-                """UPDATE accounts
-                   SET first_activity_at = ?, last_group_created_at = ?
-                   WHERE id = ?""",
-                (first_activity.isoformat(), last_group.isoformat(), account_id)
-            )
-        else:
+    """Count the group for the account and close its job in one transaction"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            "SELECT created_at FROM groups WHERE id = ?", (group_id,)
+        )
+        row = await cursor.fetchone()
+        if row:
             await db.execute(
-                """UPDATE accounts
-                   SET last_group_created_at = ?
-                   WHERE id = ?""",
-                (last_group.isoformat(), account_id)
+                "UPDATE groups SET messages_sent = ? WHERE id = ?",
+                (messages_sent, group_id)
             )
-        await db.commit()
+            await _bump_daily_activity(db, row[0][:10], account_id, messages=messages_sent)
+        await db.execute(
+            """UPDATE accounts
+               SET created_groups_count = created_groups_count + 1,
+                   first_activity_at = COALESCE(first_activity_at, ?),
+                   last_group_created_at = ?
+               WHERE id = ?""",
+            (first_activity.isoformat(), last_group.isoformat(), account_id)
+        )
+        await _refresh_next_due(db, "id = ?", (account_id,))
+        await db.execute("DELETE FROM group_jobs WHERE id = ?", (job_id,))
+
+
+async def drop_group_job(job_id: int):
+    """Forget a job whose group was never created"""
+    async with write_transaction() as db:
+        await db.execute("DELETE FROM group_jobs WHERE id = ?", (job_id,))
+
+
+async def retry_group_job(job_id: int) -> int:
+    """Count a failed reconciliation attempt, return the attempts so far"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            """UPDATE group_jobs SET attempts = attempts + 1, updated_at = ?
+               WHERE id = ? RETURNING attempts""",
+            (datetime.utcnow().isoformat(), job_id)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+async def get_open_group_jobs(
+    shard: Optional[Tuple[int, int]] = None,
+    idle_before: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Unfinished group jobs (of one shard, untouched since `idle_before` if given)"""
+    query = "SELECT * FROM group_jobs"
+    conditions = []
+    params: List[Any] = []
+    if shard:
+        conditions.append("account_id % ? = ?")
+        params += [shard[1], shard[0]]
+    if idle_before:
+        conditions.append("updated_at < ?")
+        params.append(idle_before.isoformat())
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+    
+    async with read_connection() as db:
+        cursor = await db.execute(query, params)
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def get_open_group_job_accounts(shard: Optional[Tuple[int, int]] = None) -> Set[int]:
+    """Accounts that still have an unfinished group job"""
+    query = "SELECT DISTINCT account_id FROM group_jobs"
+    params: Tuple = ()
+    if shard:
+        query += " WHERE account_id % ? = ?"
+        params = (shard[1], shard[0])
+    async with read_connection() as db:
+        cursor = await db.execute(query, params)
+        return {row[0] for row in await cursor.fetchall()}
 
 
 async def log_error(context: str, error_text: str, account_id: Optional[int] = None):
     """Log an error to database"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    created_at = datetime.utcnow().isoformat()
+    async with write_transaction() as db:
         await db.execute(
             """INSERT INTO errors (account_id, context, error_text, created_at)
                VALUES (?, ?, ?, ?)""",
-            (account_id, context, error_text[:2000], datetime.utcnow().isoformat())
+            (account_id, context, error_text[:2000], created_at)
+        )
+        await _bump_daily_activity(db, created_at[:10], account_id, errors=1)
+
+
+async def record_flood_wait(account_id: int, seconds: int):
+    """Add FloodWait seconds to the account's daily activity"""
+    async with write_transaction() as db:
+        await _bump_daily_activity(
+            db, datetime.utcnow().date().isoformat(), account_id, flood_wait=seconds
         )
-        await db.commit()
 
 
-async def get_latest_errors(limit: int = 10) -> List[Dict[str, Any]]:
-    """Get latest errors"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def _bump_daily_activity(
+    db: aiosqlite.Connection,
+    day: str,
+    account_id: Optional[int],
+    groups: int = 0,
+    messages: int = 0,
+    errors: int = 0,
+    flood_wait: int = 0
+):
+    """Add to the (day, account) rollup row inside the caller's transaction"""
+    await db.execute(
+        """INSERT INTO daily_activity
+               (day, account_id, groups_created, messages_sent, errors, flood_wait_seconds)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(day, account_id) DO UPDATE SET
+               groups_created = groups_created + excluded.groups_created,
+               messages_sent = messages_sent + excluded.messages_sent,
+               errors = errors + excluded.errors,
+               flood_wait_seconds = flood_wait_seconds + excluded.flood_wait_seconds""",
+        # System-level errors (no account) are rolled up under account 0
+        (day, account_id or 0, groups, messages, errors, flood_wait)
+    )
+
+
+async def get_daily_trends(days: int = 7) -> Dict[str, Any]:
+    """Per-day totals and top accounts from the daily rollup"""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).date().isoformat()
+    async with read_connection() as db:
         cursor = await db.execute(
-            "SELECT * FROM errors ORDER BY id DESC LIMIT ?", (limit,)
+            """SELECT day,
+                      SUM(groups_created) AS groups_created,
+                      SUM(messages_sent) AS messages_sent,
+                      SUM(errors) AS errors,
+                      SUM(flood_wait_seconds) AS flood_wait_seconds
+               FROM daily_activity
+               WHERE day >= ?
+               GROUP BY day ORDER BY day""",
+            (since,)
         )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        per_day = [dict(row) for row in await cursor.fetchall()]
+        
+        cursor = await db.execute(
+            """SELECT account_id,
+                      SUM(groups_created) AS groups_created,
+                      SUM(errors) AS errors
+               FROM daily_activity
+               WHERE day >= ? AND account_id != 0
+               GROUP BY account_id
+               ORDER BY groups_created DESC LIMIT 10""",
+            (since,)
+        )
+        top_accounts = [dict(row) for row in await cursor.fetchall()]
+        
+        return {"since": since, "per_day": per_day, "top_accounts": top_accounts}
+
+
+async def browse_errors(
+    account_id: Optional[int] = None,
+    context: Optional[str] = None,
+    since: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = 10
+) -> Dict[str, Any]:
+    """Keyset-paginated error page (newest first) with optional filters"""
+    async with read_connection() as db:
+        
+        conditions = []
+        params: List[Any] = []
+        if account_id is not None:
+            conditions.append("account_id = ?")
+            params.append(account_id)
+        if context is not None:
+            conditions.append("context = ?")
+            params.append(context)
+        if since is not None:
+            # Ids grow with created_at: turn the time bound into an id bound
+            cursor = await db.execute(
+                "SELECT id FROM errors WHERE created_at >= ? ORDER BY created_at LIMIT 1",
+                (since.isoformat(),)
+            )
+            row = await cursor.fetchone()
+            if not row:
+                return {"errors": [], "has_older": False, "has_newer": False}
+            conditions.append("id >= ?")
+            params.append(row["id"])
+        
+        def where(extra: str) -> str:
+            parts = conditions + ([extra] if extra else [])
+            return (" WHERE " + " AND ".join(parts)) if parts else ""
+        
+        if after_id is not None:
+            # Newer page: walk up from the cursor, then flip to newest first
+            cursor = await db.execute(
+                f"SELECT * FROM errors{where('id > ?')} ORDER BY id ASC LIMIT ?",
+                (*params, after_id, limit + 1)
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
+            has_newer = len(rows) > limit
+            rows = list(reversed(rows[:limit]))
+            has_older = True
+        else:
+            extra = "id < ?" if before_id is not None else ""
+            extra_params = (before_id,) if before_id is not None else ()
+            cursor = await db.execute(
+                f"SELECT * FROM errors{where(extra)} ORDER BY id DESC LIMIT ?",
+                (*params, *extra_params, limit + 1)
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
+            has_older = len(rows) > limit
+            rows = rows[:limit]
+            has_newer = before_id is not None
+        
+        return {"errors": rows, "has_older": has_older and bool(rows), "has_newer": has_newer}
+
+
+async def get_account_groups(
+    account_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = 10
+) -> Dict[str, Any]:
+    """Keyset-paginated groups of an account (newest first)"""
+    async with read_connection() as db:
+        columns = "id, chat_id, title, created_at, messages_sent"
+        
+        if after_id is not None:
+            cursor = await db.execute(
+                f"""SELECT {columns} FROM groups
+                    WHERE account_id = ?
+                      AND (created_at, id) > (SELECT created_at, id FROM groups WHERE id = ?)
+                    ORDER BY created_at ASC, id ASC LIMIT ?""",
+                (account_id, after_id, limit + 1)
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
+            has_newer = len(rows) > limit
+            rows = list(reversed(rows[:limit]))
+            has_older = True
+        elif before_id is not None:
+            cursor = await db.execute(
+                f"""SELECT {columns} FROM groups
+                    WHERE account_id = ?
+                      AND (created_at, id) < (SELECT created_at, id FROM groups WHERE id = ?)
+                    ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (account_id, before_id, limit + 1)
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
+            has_older = len(rows) > limit
+            rows = rows[:limit]
+            has_newer = True
+        else:
+            cursor = await db.execute(
+                f"""SELECT {columns} FROM groups
+                    WHERE account_id = ?
+                    ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (account_id, limit + 1)
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
+            has_older = len(rows) > limit
+            rows = rows[:limit]
+            has_newer = False
+        
+        return {"groups": rows, "has_older": has_older and bool(rows), "has_newer": has_newer}
+
+
+async def get_account_group_stats(account_id: int) -> Dict[str, Any]:
+    """Group aggregates for an account from index endpoints and the daily rollup"""
+    async with read_connection() as db:
+        cursor = await db.execute(
+            """SELECT
+                   (SELECT created_at FROM groups WHERE account_id = ?
+                    ORDER BY created_at ASC LIMIT 1),
+                   (SELECT created_at FROM groups WHERE account_id = ?
+                    ORDER BY created_at DESC LIMIT 1)""",
+            (account_id, account_id)
+        )
+        first_at, last_at = await cursor.fetchone()
+        
+        cursor = await db.execute(
+            """SELECT SUM(groups_created), SUM(messages_sent)
+               FROM daily_activity WHERE account_id = ?""",
+            (account_id,)
+        )
+        groups, messages = await cursor.fetchone()
+    
+    groups = groups or 0
+    avg_gap_minutes = None
+    if groups > 1 and first_at and last_at:
+        span = datetime.fromisoformat(last_at) - datetime.fromisoformat(first_at)
+        avg_gap_minutes = span.total_seconds() / 60 / (groups - 1)
+    
+    return {
+        "groups": groups,
+        "avg_messages": (messages or 0) / groups if groups else None,
+        "avg_gap_minutes": avg_gap_minutes,
+        "first_at": first_at,
+        "last_at": last_at
+    }
+
+
+async def get_error_contexts() -> List[str]:
+    """Distinct error contexts (index skip-scan, one seek per context)"""
+    async with read_connection() as db:
+        cursor = await db.execute(
+            """WITH RECURSIVE ctx(name) AS (
+                   SELECT MIN(context) FROM errors
+                   UNION ALL
+                   SELECT (SELECT MIN(context) FROM errors WHERE context > ctx.name)
+                   FROM ctx WHERE ctx.name IS NOT NULL
+               )
+               SELECT name FROM ctx WHERE name IS NOT NULL"""
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def count_active_accounts() -> int:
+    """Number of active accounts"""
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM accounts WHERE is_active = 1")
+        return (await cursor.fetchone())[0]
 
 
 async def get_global_stats() -> Dict[str, Any]:
     """Get global statistics"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with read_connection() as db:
         
         cursor = await db.execute("SELECT COUNT(*) as cnt FROM accounts")
         total_accounts = (await cursor.fetchone())["cnt"]
@@ -264,12 +987,8 @@ async def get_global_stats() -> Dict[str, Any]:
         row = await cursor.fetchone()
         total_groups = row["total"] if row["total"] else 0
         
-        cursor = await db.execute(
-            """SELECT id, phone, label, created_groups_count, 
-                      is_active, proxy_host, disabled_reason
-               FROM accounts ORDER BY id"""
-        )
-        accounts = [dict(row) for row in await cursor.fetchall()]
+        cursor = await db.execute(f"SELECT {SUMMARY_COLUMNS} FROM accounts ORDER BY id")
+        accounts = [AccountSummary.from_row(row) for row in await cursor.fetchall()]
         
         return {
             "total_accounts": total_accounts,
@@ -277,3 +996,240 @@ async def get_global_stats() -> Dict[str, Any]:
             "total_groups": total_groups,
             "accounts": accounts
         }
+
+
+async def get_settings() -> Dict[str, Dict[str, Any]]:
+    """Stored runtime settings by key"""
+    async with read_connection() as db:
+        cursor = await db.execute(
+            "SELECT key, value, previous, updated_at, updated_by FROM settings"
+        )
+        return {row["key"]: dict(row) for row in await cursor.fetchall()}
+
+
+async def save_setting(key: str, value: str, current: str, admin_id: int):
+    """Store a setting, keeping the value it replaces (`current` if none was stored)"""
+    async with write_transaction() as db:
+        await db.execute(
+            """INSERT INTO settings (key, value, previous, updated_at, updated_by)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   previous = settings.value,
+                   value = excluded.value,
+                   updated_at = excluded.updated_at,
+                   updated_by = excluded.updated_by""",
+            (key, value, current, datetime.utcnow().isoformat(), admin_id)
+        )
+
+
+async def swap_setting(keys: List[str], admin_id: int) -> Optional[Tuple[str, str, str]]:
+    """Swap value and previous of the most recently changed of `keys`,
+    return (key, value, previous) after the swap"""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            """UPDATE settings
+               SET value = previous, previous = value, updated_at = ?, updated_by = ?
+               WHERE key = (
+                   SELECT key FROM settings
+                   WHERE key IN (SELECT value FROM json_each(?)) AND previous IS NOT NULL
+                   ORDER BY updated_at DESC LIMIT 1
+               )
+               RETURNING key, value, previous""",
+            (datetime.utcnow().isoformat(), admin_id, json.dumps(keys))
+        )
+        row = await cursor.fetchone()
+        return tuple(row) if row else None
+
+
+async def get_write_activity() -> Tuple[int, int]:
+    """Local commit count and PRAGMA data_version (changes on other processes' commits)"""
+    async with _write_lock:
+        db = await get_write_connection()
+        cursor = await db.execute("PRAGMA data_version")
+        return _write_commits, (await cursor.fetchone())[0]
+
+
+async def get_db_file_stats() -> Dict[str, int]:
+    """Page and file size figures of the database and its WAL"""
+    async with _write_lock:
+        db = await get_write_connection()
+        stats = {}
+        for pragma in ("page_size", "page_count", "freelist_count"):
+            cursor = await db.execute(f"PRAGMA {pragma}")
+            stats[pragma] = (await cursor.fetchone())[0]
+    for key, path in (("db_bytes", DB_PATH), ("wal_bytes", DB_PATH + "-wal")):
+        stats[key] = os.path.getsize(path) if os.path.exists(path) else 0
+    return stats
+
+
+async def incremental_vacuum(pages: int) -> int:
+    """Move up to `pages` free pages off the end of the file, return how many"""
+    async with _write_lock:
+        db = await get_write_connection()
+        cursor = await db.execute("PRAGMA freelist_count")
+        before = (await cursor.fetchone())[0]
+        # Run as a script: a plain execute only frees one page per step
+        await db.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        cursor = await db.execute("PRAGMA freelist_count")
+        return before - (await cursor.fetchone())[0]
+
+
+async def optimize_db():
+    """Refresh query planner statistics where SQLite thinks they are stale"""
+    async with write_transaction() as db:
+        await db.execute("PRAGMA analysis_limit=400")
+        await db.execute("PRAGMA optimize")
+
+
+async def checkpoint_wal(mode: str = "PASSIVE") -> Tuple[int, int, int]:
+    """Checkpoint the WAL, return (busy, wal frames, checkpointed frames)"""
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Unknown checkpoint mode: {mode}")
+    async with _write_lock:
+        db = await get_write_connection()
+        cursor = await db.execute(f"PRAGMA wal_checkpoint({mode})")
+        return tuple(await cursor.fetchone())
+
+
+def session_name_from_path(session_path: str) -> str:
+    """Session name used as key in the session tables"""
+    return os.path.splitext(os.path.basename(session_path))[0]
+
+
+async def load_session_data(name: str) -> Optional[Dict[str, Any]]:
+    """Load stored Telethon session data"""
+    async with read_connection() as db:
+        cursor = await db.execute(
+            """SELECT dc_id, server_address, port, auth_key, takeout_id
+               FROM telethon_sessions WHERE name = ?""",
+            (name,)
+        )
+        session_row = await cursor.fetchone()
+        if not session_row:
+            return None
+        
+        cursor = await db.execute(
+            """SELECT id, hash, username, phone, name
+               FROM telethon_entities WHERE session_name = ?""",
+            (name,)
+        )
+        entities = await cursor.fetchall()
+        
+        cursor = await db.execute(
+            """SELECT id, pts, qts, date, seq
+               FROM telethon_update_state WHERE session_name = ?""",
+            (name,)
+        )
+        update_states = await cursor.fetchall()
+        
+        return {
+            "session": session_row,
+            "entities": entities,
+            "update_states": update_states
+        }
+
+
+async def save_session_data(
+    name: str,
+    session_row: Optional[Tuple],
+    entities: List[Tuple],
+    update_states: List[Tuple]
+):
+    """Persist changed Telethon session data in one transaction"""
+    async with write_transaction() as db:
+        if session_row is not None:
+            await db.execute(
+                """INSERT OR REPLACE INTO telethon_sessions
+                   (name, dc_id, server_address, port, auth_key, takeout_id)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (name, *session_row)
+            )
+        if entities:
+            await db.executemany(
+                """INSERT OR REPLACE INTO telethon_entities
+                   (session_name, id, hash, username, phone, name, date)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [(name, *row) for row in entities]
+            )
+        if update_states:
+            await db.executemany(
+                """INSERT OR REPLACE INTO telethon_update_state
+                   (session_name, id, pts, qts, date, seq)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(name, *row) for row in update_states]
+            )
+
+
+# Session tables and the column holding the session name
+_SESSION_TABLES = (
+    ("telethon_sessions", "name"),
+    ("telethon_entities", "session_name"),
+    ("telethon_update_state", "session_name"),
+)
+
+
+async def _delete_session_rows(db: aiosqlite.Connection, name: str):
+    for table, column in _SESSION_TABLES:
+        await db.execute(f"DELETE FROM {table} WHERE {column} = ?", (name,))
+
+
+async def delete_session_data(name: str):
+    """Delete stored Telethon session data"""
+    async with write_transaction() as db:
+        await _delete_session_rows(db, name)
+
+
+def _read_session_file(path: str) -> Dict[str, Any]:
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute(
+            "SELECT dc_id, server_address, port, auth_key, takeout_id FROM sessions"
+        ).fetchone()
+        entities = conn.execute(
+            "SELECT id, hash, username, phone, name, date FROM entities"
+        ).fetchall()
+        update_states = conn.execute(
+            "SELECT id, pts, qts, date, seq FROM update_state"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {"session": row, "entities": entities, "update_states": update_states}
+
+
+async def migrate_session_files() -> int:
+    """One-time import of legacy .session files into the database"""
+    async with read_connection() as db:
+        cursor = await db.execute(
+            """SELECT session_path FROM accounts
+               WHERE session_path NOT IN (
+                   SELECT name || '.session' FROM telethon_sessions
+               )"""
+        )
+        paths = [row[0] for row in await cursor.fetchall()]
+    
+    migrated = 0
+    for session_path in paths:
+        if not os.path.isabs(session_path):
+            session_path = os.path.join(SESSIONS_DIR, session_path)
+        if not os.path.exists(session_path):
+            continue
+        
+        try:
+            data = await asyncio.to_thread(_read_session_file, session_path)
+        except sqlite3.Error as e:
+            await log_error("session_migration", f"{session_path}: {e}")
+            continue
+        if not data["session"]:
+            continue
+        
+        await save_session_data(
+            session_name_from_path(session_path),
+            data["session"],
+            data["entities"],
+            data["update_states"]
+        )
+        # Keep the original file as a backup, but never import it again
+        os.replace(session_path, session_path + ".migrated")
+        migrated += 1
+    
+    return migrated
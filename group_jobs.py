@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from telethon.tl.types import PeerChannel
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Accounts reconciled at the same time
+RECONCILE_CONCURRENCY = 5
+# Recent dialogs searched for a group whose creation was never journaled as done
+DIALOG_SCAN_LIMIT = 100
+# Seconds before a job that failed to reconcile is tried again
+RETRY_AFTER = 300
+# Failed attempts before a job is given up on
+MAX_ATTEMPTS = 5
+
+
+async def _find_channel(client, title: str):
+    """Look for a group we own with `title` among the recent dialogs"""
+    async for dialog in client.iter_dialogs(limit=DIALOG_SCAN_LIMIT):
+        entity = dialog.entity
+        if dialog.is_group and dialog.title == title and getattr(entity, "creator", False):
+            return entity
+    return None
+
+
+async def _count_sent(client, channel, expected: int) -> int:
+    """Our text messages already in the group (service messages don't count)"""
+    messages = await client.get_messages(channel, limit=expected + 10)
+    return sum(1 for message in messages if message.out and message.action is None)
+
+
+async def _reconcile_job(job: Dict[str, Any]) -> str:
+    """Finish one journaled creation without redoing work, return the outcome"""
+    from accounts import get_or_create_client
+    from db import complete_group_job, drop_group_job, get_account_by_id, record_group_job_chat
+    from scheduler import build_group_messages, generate_datetime_messages, send_group_messages
+
+    acc = await get_account_by_id(job["account_id"])
+    if acc is None:
+        await drop_group_job(job["id"])
+        return "dropped"
+
+    client = await get_or_create_client(acc)
+    outcome = "resumed"
+    group_id = job["group_id"]
+    channel = None
+
+    if job["phase"] == "intent":
+        # The process stopped around CreateChannel: did it go through?
+        channel = await _find_channel(client, job["title"])
+        if channel is None:
+            await drop_group_job(job["id"])
+            return "not_created"
+        group_id = await record_group_job_chat(job["id"], acc.id, str(channel.id), job["title"])
+        outcome = "recovered"
+    else:
+        try:
+            channel = await client.get_entity(PeerChannel(int(job["chat_id"])))
+        except ValueError:
+            # Not in the session's entity cache any more
+            channel = await _find_channel(client, job["title"])
+        if channel is None:
+            raise RuntimeError(f"Group {job['chat_id']} of job {job['id']} not found")
+
+    scheduled_at = datetime.fromisoformat(job["scheduled_at"])
+    messages = build_group_messages(generate_datetime_messages(scheduled_at))
+    sent = min(await _count_sent(client, channel, len(messages)), len(messages))
+    sent += await send_group_messages(client, acc.id, channel, messages[sent:])
+
+    await complete_group_job(
+        job["id"], acc.id, group_id, sent,
+        first_activity=acc.first_activity_at or scheduled_at,
+        last_group=scheduled_at
+    )
+    return outcome
+
+
+async def _give_up(job: Dict[str, Any]):
+    """Close a job that keeps failing; a group that exists still counts"""
+    from db import complete_group_job, drop_group_job
+    if job["phase"] != "created":
+        await drop_group_job(job["id"])
+        return
+    scheduled_at = datetime.fromisoformat(job["scheduled_at"])
+    await complete_group_job(
+        job["id"], job["account_id"], job["group_id"], 0,
+        first_activity=scheduled_at,
+        last_group=scheduled_at
+    )
+
+
+async def reconcile_group_jobs(
+    shard: Optional[Tuple[int, int]] = None,
+    all_jobs: bool = True
+) -> Optional[Dict[str, Any]]:
+    """Resume or repair unfinished group creations, accounts in parallel"""
+    from db import get_open_group_jobs, log_error, retry_group_job
+    from notifications import notify
+
+    idle_before = None if all_jobs else datetime.utcnow() - timedelta(seconds=RETRY_AFTER)
+    jobs = await get_open_group_jobs(shard, idle_before)
+    if not jobs:
+        return None
+
+    started = time.perf_counter()
+    by_account: Dict[int, list] = {}
+    for job in jobs:
+        by_account.setdefault(job["account_id"], []).append(job)
+    outcomes: Counter = Counter()
+    semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+
+    async def reconcile_account(account_id: int, account_jobs: list):
+        async with semaphore:
+            # One account's jobs in order: the oldest holds the lowest group number
+            for job in account_jobs:
+                try:
+                    outcomes[await _reconcile_job(job)] += 1
+                except Exception as e:
+                    logger.exception(
+                        f"[Account {account_id}] Failed to reconcile group job {job['id']}",
+                        extra={"account_id": account_id, "context": "group_job_reconcile"}
+                    )
+                    await log_error("group_job_reconcile", str(e), account_id)
+                    if await retry_group_job(job["id"]) >= MAX_ATTEMPTS:
+                        await _give_up(job)
+                        outcomes["given_up"] += 1
+                    else:
+                        outcomes["failed"] += 1
+                    # Later jobs of this account wait for the earlier one
+                    return
+
+    await asyncio.gather(*(
+        reconcile_account(account_id, account_jobs)
+        for account_id, account_jobs in by_account.items()
+    ))
+
+    duration = time.perf_counter() - started
+    report = {
+        "at": time.time(),
+        "jobs": len(jobs),
+        "accounts": len(by_account),
+        "duration": round(duration, 3),
+        **outcomes,
+    }
+    for outcome, count in outcomes.items():
+        metrics.inc(f"group_jobs_{outcome}", count)
+    logger.info(
+        f"🧾 Reconciled {len(jobs)} group jobs of {len(by_account)} accounts "
+        f"in {duration:.2f}s: {dict(outcomes)}",
+        extra={"context": "group_job_reconcile", "duration": round(duration, 3)}
+    )
+    notify("group_jobs", format_report(report))
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Short reconciliation summary"""
+    labels = (
+        ("resumed", "finished after the group was saved"),
+        ("recovered", "found on Telegram and saved"),
+        ("not_created", "never created, dropped"),
+        ("dropped", "account deleted, dropped"),
+        ("failed", "failed, will retry"),
+        ("given_up", "failed too often, closed"),
+    )
+    lines = [
+        f"🧾 Unfinished group creations: {report['jobs']} jobs of "
+        f"{report['accounts']} accounts ({report['duration']:.1f}s)"
+    ]
+    for key, label in labels:
+        if report.get(key):
+            lines.append(f"• {report[key]} {label}")
+    return "\n".join(lines)
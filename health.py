@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from config import HEALTH_HOST, HEALTH_PORT, HEALTH_READY_FRACTION
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds a client gets to send its request
+REQUEST_TIMEOUT = 5
+# Loop heartbeat older than this (seconds) means the loop is not making progress
+LOOP_STALE_SECONDS = 10
+# Worker status reports older than this (seconds) mark the worker as hung
+WORKER_STALE_SECONDS = 60
+
+# Startup phase -> seconds, in the order they ran
+PHASES: Dict[str, float] = {}
+# Components readiness waits for
+READY = {"db": False, "bot": False}
+
+_process_started = time.monotonic()
+_startup_seconds: Optional[float] = None
+
+
+@contextmanager
+def phase(name: str):
+    """Time one startup phase"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = round(time.perf_counter() - started, 3)
+        metrics.set_gauge(f"startup_{name}_seconds", PHASES[name])
+
+
+def mark_ready(component: str):
+    READY[component] = True
+
+
+def startup_complete() -> float:
+    """Mark startup as finished, return its total duration"""
+    global _startup_seconds
+    _startup_seconds = round(time.monotonic() - _process_started, 3)
+    metrics.set_gauge("startup_seconds", _startup_seconds)
+    return _startup_seconds
+
+
+def format_phases() -> str:
+    return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in PHASES.items())
+
+
+def liveness() -> Tuple[bool, Dict[str, Any]]:
+    """The loop is making progress here and in every worker"""
+    from cluster import get_worker_liveness
+    from loop_watchdog import WATCHDOG
+
+    report: Dict[str, Any] = {}
+    live = True
+    if WATCHDOG is not None:
+        # Answering at all proves the loop runs; a stale heartbeat means it just
+        # came out of a long stall (or the watchdog died)
+        age = WATCHDOG.heartbeat_age()
+        report["loop_heartbeat_age"] = round(age, 3)
+        report["loop_stalls"] = int(metrics.COUNTERS.get("loop_stalls", 0))
+        live = age < LOOP_STALE_SECONDS
+
+    workers = get_worker_liveness()
+    if workers is not None:
+        report["workers"] = workers
+        for worker in workers.values():
+            age = worker["status_age"]
+            if not worker["alive"] or (age is not None and age > WORKER_STALE_SECONDS):
+                live = False
+    return live, report
+
+
+async def readiness() -> Tuple[bool, Dict[str, Any]]:
+    """Database and admin bot up, startup done and enough accounts connected"""
+    from cluster import get_worker_status
+
+    report: Dict[str, Any] = {**READY, "startup_complete": _startup_seconds is not None}
+    ready = all(READY.values()) and _startup_seconds is not None
+    if not READY["db"]:
+        return False, report
+
+    from db import count_active_accounts
+    active = await count_active_accounts()
+    workers = get_worker_status()
+    if workers is None:
+        from accounts import connected_clients
+        connected = connected_clients()
+    else:
+        connected = sum(status.get("connected", 0) for status in workers.values())
+        from cluster import COORDINATOR
+        workers_started = (
+            len(workers) == COORDINATOR.count
+            and all(status.get("started") for status in workers.values())
+        )
+        report["workers_started"] = workers_started
+        ready = ready and workers_started
+    fraction = connected / active if active else 1.0
+    report.update(
+        active_accounts=active,
+        connected=connected,
+        connected_fraction=round(fraction, 3),
+    )
+    return ready and fraction >= HEALTH_READY_FRACTION, report
+
+
+def startup_report() -> Dict[str, Any]:
+    """Startup phase timings of this process (and each worker's)"""
+    from cluster import get_worker_status
+
+    report: Dict[str, Any] = {
+        "complete": _startup_seconds is not None,
+        "total": _startup_seconds,
+        "phases": dict(PHASES),
+    }
+    workers = get_worker_status()
+    if workers is not None:
+        report["workers"] = {index: status.get("startup", {}) for index, status in workers.items()}
+    return report
+
+
+async def _route(path: str) -> Tuple[int, Dict[str, Any]]:
+    if path == "/live":
+        live, report = liveness()
+        return (200 if live else 503), {"live": live, **report}
+    if path == "/ready":
+        ready, report = await readiness()
+        return (200 if ready else 503), {"ready": ready, **report}
+    if path == "/startup":
+        return 200, startup_report()
+    if path == "/":
+        live, live_report = liveness()
+        ready, ready_report = await readiness()
+        return (200 if live and ready else 503), {
+            "live": live,
+            "ready": ready,
+            "liveness": live_report,
+            "readiness": ready_report,
+            "startup": startup_report(),
+        }
+    return 404, {"error": "not found"}
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Answer one HTTP/1.0-style request and close the connection"""
+    method = "GET"
+    try:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            # Headers are not used, but must be read before answering
+            while (await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)).strip():
+                pass
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except (asyncio.TimeoutError, ValueError):
+            status, body = 400, {"error": "bad request"}
+        else:
+            if method not in ("GET", "HEAD"):
+                status, body = 405, {"error": "method not allowed"}
+            else:
+                try:
+                    status, body = await _route(target.split("?", 1)[0])
+                except Exception as e:
+                    logger.exception("Health check failed")
+                    status, body = 500, {"error": str(e)}
+        metrics.inc(f"health_requests_{status}")
+
+        payload = json.dumps(body, indent=1).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Cache-Control: no-store\r\n"
+            f"Connection: close\r\n\r\n".encode()
+        )
+        if method != "HEAD":
+            writer.write(payload)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_health_server():
+    """Serve /live, /ready and /startup on HEALTH_HOST:HEALTH_PORT"""
+    server = await asyncio.start_server(_handle, HEALTH_HOST, HEALTH_PORT)
+    logger.info(f"🩺 Health endpoint on http://{HEALTH_HOST}:{HEALTH_PORT}/")
+    async with server:
+        await server.serve_forever()
+
+
+def _get(url: str) -> Tuple[int, Dict[str, Any]]:
+    import urllib.error
+    import urllib.request
+    try:
+        with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def main():
+    """Wait for readiness and check cold-start time (exit 1 on failure), for CI"""
+    parser = argparse.ArgumentParser(description="Wait until the app is ready and print startup timings")
+    parser.add_argument("--url", default=f"http://{HEALTH_HOST}:{HEALTH_PORT}", help="health endpoint")
+    parser.add_argument("--wait", type=float, default=120, help="seconds to wait for readiness")
+    parser.add_argument("--max-startup", type=float, help="fail if startup took longer (seconds)")
+    args = parser.parse_args()
+
+    deadline = time.monotonic() + args.wait
+    status, report = 0, {}
+    while time.monotonic() < deadline:
+        try:
+            status, report = _get(f"{args.url}/ready")
+            if status == 200:
+                break
+        except OSError:
+            pass
+        time.sleep(1)
+    if status != 200:
+        print(f"Not ready after {args.wait:g}s: {json.dumps(report)}")
+        sys.exit(1)
+
+    _, startup = _get(f"{args.url}/startup")
+    print(f"Ready: startup {startup['total']:.2f}s")
+    for name, seconds in startup["phases"].items():
+        print(f"  {name:<20}{seconds:>8.2f}s")
+    for index, phases in startup.get("workers", {}).items():
+        for name, seconds in phases.items():
+            print(f"  worker {index} {name:<11}{seconds:>8.2f}s")
+    if args.max_startup is not None and startup["total"] > args.max_startup:
+        print(f"Startup took longer than {args.max_startup:g}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
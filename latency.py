@@ -0,0 +1,124 @@
+import statistics
+import time
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import SLOW_ACCOUNT_FACTOR
+import metrics
+
+# Operations profiled per account
+CONNECT = "connect"
+OPS = (CONNECT, "create_channel", "send_message")
+# Latest samples kept per account and operation (4 bytes each)
+RING_SIZE = 64
+# Samples an account needs before it is compared with the fleet
+MIN_SAMPLES = 5
+# Profiled accounts needed for a meaningful fleet median
+MIN_ACCOUNTS = 3
+# p95 must also exceed the median by this many seconds to be flagged
+MIN_EXCESS = 0.25
+# Seconds the slow-account set is reused by the scheduler
+SLOW_CACHE_SECONDS = 30
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class LatencyRing:
+    """Fixed-size ring of the latest latencies (float32 seconds)"""
+
+    __slots__ = ("samples", "next", "count")
+
+    def __init__(self):
+        self.samples = array("f", bytes(4 * RING_SIZE))
+        self.next = 0
+        self.count = 0
+
+    def add(self, seconds: float):
+        self.samples[self.next] = seconds
+        self.next = (self.next + 1) % RING_SIZE
+        self.count = min(self.count + 1, RING_SIZE)
+
+    def quantiles(self) -> Tuple[float, float]:
+        """(p50, p95) of the samples in the ring (nearest rank)"""
+        ordered = sorted(self.samples[:self.count])
+        return (
+            ordered[(len(ordered) - 1) // 2],
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        )
+
+
+# account id -> operation -> ring (this process's clients only)
+RINGS: Dict[int, Dict[str, LatencyRing]] = {}
+
+_slow_cache: Optional[Set[int]] = None
+_slow_cached_at = 0.0
+
+
+def record(account_id: int, op: str, seconds: float):
+    """Add one call's latency to the account's ring"""
+    rings = RINGS.get(account_id)
+    if rings is None:
+        rings = RINGS[account_id] = {}
+    ring = rings.get(op)
+    if ring is None:
+        ring = rings[op] = LatencyRing()
+    ring.add(seconds)
+    metrics.observe(f"telegram_{op}_seconds", seconds, LATENCY_BUCKETS)
+
+
+def forget(account_id: int):
+    RINGS.pop(account_id, None)
+
+
+def profile() -> Dict[int, Dict[str, Tuple[float, float, int]]]:
+    """account id -> operation -> (p50, p95, samples), for rings with enough samples"""
+    result: Dict[int, Dict[str, Tuple[float, float, int]]] = {}
+    for account_id, rings in RINGS.items():
+        ops = {
+            op: (*ring.quantiles(), ring.count)
+            for op, ring in rings.items() if ring.count >= MIN_SAMPLES
+        }
+        if ops:
+            result[account_id] = ops
+    return result
+
+
+def find_slow(
+    profiles: Dict[int, Dict[str, Tuple[float, float, int]]]
+) -> Tuple[Dict[str, float], List[Dict]]:
+    """Fleet median p95 per operation, and accounts whose p95 is far above it"""
+    medians: Dict[str, float] = {}
+    for op in OPS:
+        p95s = [ops[op][1] for ops in profiles.values() if op in ops]
+        if len(p95s) >= MIN_ACCOUNTS:
+            medians[op] = statistics.median(p95s)
+
+    slow = []
+    for account_id, ops in profiles.items():
+        for op, (p50, p95, count) in ops.items():
+            median = medians.get(op)
+            if median is None:
+                continue
+            if p95 >= median * SLOW_ACCOUNT_FACTOR and p95 - median >= MIN_EXCESS:
+                slow.append({
+                    "account_id": account_id,
+                    "op": op,
+                    "p50": p50,
+                    "p95": p95,
+                    "samples": count,
+                    "ratio": p95 / median if median else float("inf"),
+                })
+    slow.sort(key=lambda entry: entry["ratio"], reverse=True)
+    return medians, slow
+
+
+def slow_account_ids() -> Set[int]:
+    """Flagged accounts of this process (recomputed every SLOW_CACHE_SECONDS)"""
+    global _slow_cache, _slow_cached_at
+    now = time.monotonic()
+    if _slow_cache is None or now - _slow_cached_at > SLOW_CACHE_SECONDS:
+        _, slow = find_slow(profile())
+        _slow_cache = {entry["account_id"] for entry in slow}
+        _slow_cached_at = now
+        metrics.set_gauge("slow_accounts", len(_slow_cache))
+    return _slow_cache
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import signal
+import time
+from typing import Optional
+
+from config import SHUTDOWN_DISCONNECT_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+async def drain_scheduler_task(task: Optional[asyncio.Task], timeout: float) -> bool:
+    """Stop the scheduler from taking new jobs and wait for the current one"""
+    from scheduler import drain_scheduler
+    drain_scheduler()
+    if task is None or task.done():
+        return True
+    try:
+        await asyncio.wait_for(task, timeout)
+        return True
+    except asyncio.TimeoutError:
+        # wait_for already cancelled the in-flight job
+        return False
+    except Exception:
+        logger.exception("Scheduler failed while draining")
+        return True
+
+
+async def close_clients_and_db(disconnect_timeout: float):
+    """Disconnect all clients concurrently, then flush and close the database"""
+    from accounts import disconnect_all_clients
+    from db import close_db
+
+    started = time.perf_counter()
+    stuck = await disconnect_all_clients(timeout=disconnect_timeout)
+    if stuck:
+        logger.warning(f"{stuck} clients did not disconnect within {disconnect_timeout}s")
+    logger.info(f"Clients disconnected in {time.perf_counter() - started:.2f}s")
+
+    # Sessions were saved on disconnect; closing waits for in-flight writes
+    await close_db()
+
+
+class LifecycleManager:
+    """Owns startup/shutdown ordering on the main event loop"""
+
+    def __init__(self):
+        self.bot = None
+        self.scheduler_task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    def install_signal_handlers(self):
+        """Turn SIGINT/SIGTERM into a graceful stop request"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except NotImplementedError:
+                # Windows: Ctrl+C still raises KeyboardInterrupt
+                pass
+
+    def request_stop(self):
+        """Ask the application to shut down"""
+        self._stop.set()
+
+    async def wait_for_stop(self):
+        """Wait for a stop request or for the admin bot to disconnect"""
+        waiters = [asyncio.create_task(self._stop.wait())]
+        if self.bot is not None:
+            waiters.append(asyncio.ensure_future(self.bot.disconnected))
+        _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+    async def shutdown(self):
+        """Drain the scheduler, disconnect everything and close the database"""
+        started = time.perf_counter()
+        logger.info("🛑 Shutting down...")
+
+        # Background tasks go first; the scheduler is drained, not cancelled,
+        # and worker links stay up until the workers have exited
+        from supervisor import SUPERVISOR
+        await SUPERVISOR.cancel(
+            exclude=("scheduler", "worker_link:"), timeout=SHUTDOWN_DISCONNECT_TIMEOUT
+        )
+
+        drained = await drain_scheduler_task(self.scheduler_task, SHUTDOWN_DRAIN_TIMEOUT)
+        if not drained:
+            logger.warning(f"Scheduler did not drain within {SHUTDOWN_DRAIN_TIMEOUT}s")
+        logger.info(f"Scheduler stopped after {time.perf_counter() - started:.2f}s")
+
+        from cluster import stop_cluster
+        await stop_cluster()
+
+        if self.bot is not None and self.bot.is_connected():
+            # The notifier was cancelled above: send the last digest (workers'
+            # final events included) before the bot goes away
+            from notifications import flush_notifications
+            await flush_notifications(self.bot, SHUTDOWN_DISCONNECT_TIMEOUT)
+            await self.bot.disconnect()
+
+        await close_clients_and_db(SHUTDOWN_DISCONNECT_TIMEOUT)
+
+        logger.info(f"✅ Shutdown complete in {time.perf_counter() - started:.2f}s")
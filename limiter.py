@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Hashable, Tuple
+
+from telethon.errors import FloodWaitError
+
+from config import FLOOD_SLEEP_THRESHOLD
+import latency
+import settings
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Method classes
+CREATE_CHANNEL = "create_channel"
+SEND_MESSAGE = "send_message"
+FORWARD = "forward"
+AUTH = "auth"
+
+# Rate never drops below this fraction of the configured rate
+MIN_RATE_FACTOR = 0.1
+# Multiplicative recovery per successful call after a FloodWait
+RECOVERY_FACTOR = 1.1
+
+
+class TokenBucket:
+    """Token bucket with FloodWait back-off"""
+
+    def __init__(self, per_minute: float, burst: float):
+        self.base_rate = per_minute / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        # No tokens accrue while blocked by a FloodWait
+        start = max(self._updated, self.blocked_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def tighten(self, seconds: int):
+        """Block for the FloodWait duration and halve the rate"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+
+    def relax(self):
+        """Recover the rate gradually after successful calls"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate * RECOVERY_FACTOR)
+
+    def reconfigure(self, per_minute: float, burst: float):
+        """Switch to new limits, keeping a FloodWait back-off in proportion"""
+        self._refill(time.monotonic())
+        backoff = self.rate / self.base_rate
+        self.base_rate = per_minute / 60.0
+        self.rate = self.base_rate * backoff
+        self.capacity = max(1.0, burst)
+        self.tokens = min(self.tokens, self.capacity)
+
+
+# (account key, method class) -> bucket
+BUCKETS: Dict[Tuple[Hashable, str], TokenBucket] = {}
+
+
+def get_bucket(key: Hashable, method: str) -> TokenBucket:
+    """Get or create the bucket for an account and method class"""
+    bucket = BUCKETS.get((key, method))
+    if bucket is None:
+        bucket = TokenBucket(*settings.rate_limit(method))
+        BUCKETS[(key, method)] = bucket
+    return bucket
+
+
+def blocked_for(key: Hashable, method: str) -> float:
+    """Seconds left on the account's FloodWait block for a method class (0 if none)"""
+    bucket = BUCKETS.get((key, method))
+    if bucket is None:
+        return 0.0
+    return max(0.0, bucket.blocked_until - time.monotonic())
+
+
+def reconfigure(method: str, per_minute: float, burst: float):
+    """Apply changed limits to every existing bucket of a method class"""
+    for (_, bucket_method), bucket in BUCKETS.items():
+        if bucket_method == method:
+            bucket.reconfigure(per_minute, burst)
+
+
+def forget(key: Hashable):
+    """Drop all buckets of an account"""
+    for bucket_key in [k for k in BUCKETS if k[0] == key]:
+        del BUCKETS[bucket_key]
+
+
+async def throttled(key: Hashable, method: str, func, *args, **kwargs):
+    """Call an outgoing Telegram API function through the account's bucket"""
+    bucket = get_bucket(key, method)
+    # Per-account latency of the call itself (time waiting for a token excluded)
+    profiled = isinstance(key, int) and method in latency.OPS
+    # Request name for the trace: the request class when the client itself is called
+    name = getattr(func, "__name__", None) or (type(args[0]).__name__ if args else method)
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except FloodWaitError as e:
+            tracing.api_call(key, method, name, time.perf_counter() - started, attempt, e)
+            attempt += 1
+            bucket.tighten(e.seconds)
+            if isinstance(key, int):
+                from db import record_flood_wait
+                try:
+                    await record_flood_wait(key, e.seconds)
+                except Exception:
+                    # The FloodWait must still be retried or re-raised below
+                    logger.exception(
+                        f"[Account {key}] Failed to record FloodWait",
+                        extra={"account_id": key, "context": method}
+                    )
+            logger.warning(
+                f"[Account {key}] FloodWait {e.seconds}s on {method}, "
+                f"rate now {bucket.rate * 60:.2f}/min",
+                extra={"account_id": key, "context": method}
+            )
+            if e.seconds > FLOOD_SLEEP_THRESHOLD:
+                raise
+            continue
+        except Exception as e:
+            # A call that times out through a bad proxy is a latency sample too
+            elapsed = time.perf_counter() - started
+            if profiled:
+                latency.record(key, method, elapsed)
+            tracing.api_call(key, method, name, elapsed, attempt, e)
+            raise
+        elapsed = time.perf_counter() - started
+        if profiled:
+            latency.record(key, method, elapsed)
+        tracing.api_call(key, method, name, elapsed, attempt)
+        bucket.relax()
+        return result
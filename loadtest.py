@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+from telethon import events
+
+# Admin ids used by the simulated admins (must not clash with real ones)
+FIRST_ADMIN_ID = 900000001
+
+# Seconds a fake client reconcile takes
+FAKE_CONTROL_LATENCY = 0.1
+
+# Simulated admin actions: name -> weight
+ACTIONS = {
+    "start": 1,
+    "accounts": 3,
+    "accounts_page": 4,
+    "account_view": 4,
+    "toggle": 2,
+    "stats": 2,
+    "trends": 1,
+    "errors": 2,
+    "groups": 2,
+    "scheduler": 1,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Drive the admin bot handlers with simulated admins and a fake scheduler"
+    )
+    parser.add_argument("--admins", type=int, default=5, help="concurrent simulated admins")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--accounts", type=int, default=200, help="accounts to seed")
+    parser.add_argument("--errors", type=int, default=5000, help="error rows to seed")
+    parser.add_argument("--think", type=float, default=200, help="ms between an admin's clicks")
+    parser.add_argument("--api-latency", type=float, default=30, help="ms per fake Telegram call")
+    parser.add_argument("--no-scheduler", action="store_true", help="don't run the fake scheduler")
+    parser.add_argument("--db", help="new database file to use (default: a fresh temporary one)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    return parser.parse_args()
+
+
+def require_new_database(path: str):
+    """Exit unless path is a new or empty file: seeding and the scheduler write fake data"""
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        sys.exit(f"Refusing to use existing database {path}: pass a new file or omit --db")
+
+
+def configure_environment(args):
+    """Point config at a scratch database and the simulated admins (before any import of it)"""
+    if args.db:
+        require_new_database(args.db)
+        os.environ["DB_PATH"] = args.db
+    else:
+        scratch = tempfile.mkdtemp(prefix="loadtest-")
+        os.environ["DB_PATH"] = os.path.join(scratch, "data.db")
+        os.environ["BACKUP_DIR"] = os.path.join(scratch, "backups")
+    os.environ["ADMIN_IDS"] = ",".join(
+        str(FIRST_ADMIN_ID + i) for i in range(args.admins)
+    )
+
+
+async def fake_api_call(latency: float):
+    """Stand-in for one Telegram round trip"""
+    await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+
+
+class FakeBot:
+    """Collects handlers like TelegramClient.on and dispatches synthetic events"""
+
+    def __init__(self, api_latency: float):
+        self.api_latency = api_latency
+        self.handlers = []
+        self.api_calls = 0
+
+    def on(self, event):
+        def decorator(callback):
+            builder = event() if isinstance(event, type) else event
+            self.handlers.append((builder, callback))
+            return callback
+        return decorator
+
+    async def resolve(self):
+        for builder, _ in self.handlers:
+            await builder.resolve(self)
+
+    async def api_call(self):
+        self.api_calls += 1
+        await fake_api_call(self.api_latency)
+
+    async def send_message(self, entity, message, **kwargs):
+        await self.api_call()
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def dispatch(self, event) -> int:
+        """Run every matching handler in order (as Telethon does), return how many ran"""
+        ran = 0
+        for builder, callback in self.handlers:
+            if not isinstance(builder, event.BUILDER):
+                continue
+            passed = builder.filter(event)
+            if asyncio.iscoroutine(passed):
+                passed = await passed
+            if passed:
+                ran += 1
+                await callback(event)
+        return ran
+
+
+class FakeEvent:
+    """Replies of a synthetic event cost one fake API call each"""
+
+    # Builder type whose handlers receive this event
+    BUILDER = None
+
+    def __init__(self, bot: FakeBot, sender_id: int):
+        self.bot = bot
+        self.sender_id = sender_id
+        self.chat_id = sender_id
+        self.pattern_match = None
+
+    async def answer(self, *args, **kwargs):
+        await self.bot.api_call()
+
+    async def edit(self, *args, **kwargs):
+        await self.bot.api_call()
+
+    async def reply(self, *args, **kwargs):
+        await self.bot.api_call()
+
+    async def respond(self, *args, **kwargs):
+        await self.bot.api_call()
+
+    async def delete(self, *args, **kwargs):
+        await self.bot.api_call()
+
+
+class FakeCallbackQuery(FakeEvent):
+    BUILDER = events.CallbackQuery
+
+    def __init__(self, bot: FakeBot, sender_id: int, data: bytes):
+        super().__init__(bot, sender_id)
+        self.data = data
+        self.data_match = None
+        self.query = SimpleNamespace(data=data, chat_instance=0)
+
+
+class FakeNewMessage(FakeEvent):
+    BUILDER = events.NewMessage
+
+    def __init__(self, bot: FakeBot, sender_id: int, text: str):
+        super().__init__(bot, sender_id)
+        self.raw_text = self.text = text
+        self.message = SimpleNamespace(message=text, out=False, fwd_from=None, sender_id=sender_id)
+
+
+async def fake_control(action: str, account_id: int = None):
+    """Stand-in for reconciling a client: disconnect plus connect round trips"""
+    await fake_api_call(FAKE_CONTROL_LATENCY)
+
+
+async def seed_database(accounts: int, errors: int) -> List[int]:
+    """Create accounts, group history and errors to browse"""
+    from db import add_account, create_group_record, get_accounts, init_db, write_transaction
+    await init_db()
+    existing = await get_accounts()
+    if existing:
+        return [acc.id for acc in existing]
+
+    for i in range(accounts):
+        await add_account(f"+1555{i:07d}", f"loadtest_{i}.session", f"loadtest_{i}")
+    ids = [acc.id for acc in await get_accounts()]
+    for account_id in ids[:50]:
+        for n in range(20):
+            await create_group_record(account_id, str(-100 - n), f"LOAD • G{n:03d}")
+    async with write_transaction() as db:
+        await db.executemany(
+            "INSERT INTO errors (account_id, context, error_text) VALUES (?, ?, ?)",
+            [
+                (random.choice(ids), random.choice(("scheduler_create_group", "forward", "connect")),
+                 "synthetic error")
+                for _ in range(errors)
+            ]
+        )
+    return ids
+
+
+async def fake_scheduler(stop: asyncio.Event, api_latency: float, stats: Dict[str, int]):
+    """Scheduler-shaped load: the same reads and writes, fake Telegram calls"""
+    from db import (
+        complete_group_job,
+        get_accounts,
+        get_open_group_job_accounts,
+        log_error,
+        record_group_job_chat,
+        start_group_job,
+    )
+
+    while not stop.is_set():
+        await get_open_group_job_accounts()
+        accounts = await get_accounts(active_only=True)
+        for acc in accounts:
+            if stop.is_set():
+                break
+            now = datetime.utcnow()
+            job_id = await start_group_job(acc.id, acc.created_groups_count + 1, "LOAD • scheduler", now)
+            await fake_api_call(api_latency)  # CreateChannelRequest
+            group_id = await record_group_job_chat(job_id, acc.id, "-1", "LOAD • scheduler")
+            for _ in range(10):
+                await fake_api_call(api_latency)  # send_message
+            await complete_group_job(job_id, acc.id, group_id, 10, now, now)
+            if random.random() < 0.05:
+                await log_error("scheduler_create_group", "synthetic failure", acc.id)
+            stats["groups"] += 1
+        await asyncio.sleep(0.1)
+
+
+def pick_action(account_ids: List[int]) -> Tuple[str, object]:
+    """Random admin click: (action name, callback data or message text)"""
+    action = random.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+    account_id = random.choice(account_ids)
+    pages = max(1, len(account_ids) // 5)
+    data = {
+        "start": "/start",
+        "accounts": b"menu:accounts",
+        "accounts_page": f"menu:accounts:{random.randint(1, pages)}".encode(),
+        "account_view": f"account:view:{account_id}".encode(),
+        "toggle": f"account:toggle:{account_id}".encode(),
+        "stats": b"menu:stats",
+        "trends": b"menu:trends",
+        "errors": b"menu:errors",
+        "groups": f"grp:{account_id}:f:0".encode(),
+        "scheduler": b"menu:scheduler",
+    }[action]
+    return action, data
+
+
+async def simulated_admin(
+    bot: FakeBot,
+    admin_id: int,
+    account_ids: List[int],
+    stop: asyncio.Event,
+    think: float,
+    latencies: Dict[str, List[float]],
+    failures: Dict[str, int]
+):
+    while not stop.is_set():
+        action, data = pick_action(account_ids)
+        if isinstance(data, str):
+            event = FakeNewMessage(bot, admin_id, data)
+        else:
+            event = FakeCallbackQuery(bot, admin_id, data)
+        started = time.perf_counter()
+        try:
+            await bot.dispatch(event)
+        except Exception:
+            failures[action] = failures.get(action, 0) + 1
+            logging.getLogger("loadtest").exception(f"Handler for {action} failed")
+        latencies.setdefault(action, []).append(time.perf_counter() - started)
+        await asyncio.sleep(think * random.uniform(0.5, 1.5))
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.02):
+    """Record how late the loop wakes up after each sleep"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def format_row(name: str, values: List[float], failures: int = 0) -> str:
+    ms = [value * 1000 for value in values]
+    return (
+        f"{name:<15}{len(ms):>7}{percentile(ms, 50):>10.1f}{percentile(ms, 95):>10.1f}"
+        f"{percentile(ms, 99):>10.1f}{max(ms, default=0):>10.1f}{failures:>7}"
+    )
+
+
+def print_report(args, latencies, failures, lag, bot, stats, elapsed):
+    header = f"{'':<15}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'fail':>7}"
+    every = [value for values in latencies.values() for value in values]
+    print()
+    print(
+        f"Load test: {args.admins} admins, {args.accounts} accounts, {elapsed:.1f}s, "
+        f"fake API latency {args.api_latency:.0f}ms, scheduler "
+        f"{'off' if args.no_scheduler else 'on'}"
+    )
+    print()
+    print("Handler latency (event dispatched -> all handlers done)")
+    print(header)
+    for name in sorted(latencies):
+        print(format_row(name, latencies[name], failures.get(name, 0)))
+    print(format_row("ALL", every, sum(failures.values())))
+    print()
+    print("Event loop lag")
+    print(header)
+    print(format_row("loop", lag))
+    print()
+    print(
+        f"Throughput: {len(every) / elapsed:.1f} events/s, {bot.api_calls} fake API calls, "
+        f"{stats['groups']} scheduler groups"
+    )
+
+
+async def run(args):
+    import admin_bot
+    from db import close_db
+
+    random.seed(args.seed)
+    account_ids = await seed_database(args.accounts, args.errors)
+
+    # Reconciling clients would connect to Telegram: simulate its latency instead
+    admin_bot.dispatch_control = fake_control
+
+    bot = FakeBot(args.api_latency / 1000)
+    admin_bot.setup_admin_handlers(bot)
+    await bot.resolve()
+
+    stop = asyncio.Event()
+    latencies: Dict[str, List[float]] = {}
+    failures: Dict[str, int] = {}
+    lag: List[float] = []
+    stats = {"groups": 0}
+
+    tasks = [asyncio.create_task(measure_loop_lag(stop, lag))]
+    if not args.no_scheduler:
+        tasks.append(asyncio.create_task(fake_scheduler(stop, args.api_latency / 1000, stats)))
+    for i in range(args.admins):
+        tasks.append(asyncio.create_task(simulated_admin(
+            bot, FIRST_ADMIN_ID + i, account_ids, stop, args.think / 1000, latencies, failures
+        )))
+
+    started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    await close_db()
+    print_report(args, latencies, failures, lag, bot, stats, elapsed)
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import copy
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config import LOG_ACCOUNT_RATE, LOG_FORMAT, LOG_LEVEL
+
+# Structured fields copied from `extra=` into the JSON output
+EXTRA_FIELDS = ("account_id", "context", "duration", "suppressed")
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def __init__(self, process_name: Optional[str] = None):
+        super().__init__()
+        self.process_name = process_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if self.process_name:
+            entry["process"] = self.process_name
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AccountRateLimitFilter(logging.Filter):
+    """Drop an account's log lines beyond LOG_ACCOUNT_RATE per minute"""
+
+    def __init__(self, per_minute: int):
+        super().__init__()
+        self.per_minute = per_minute
+        # account_id -> [window start, lines in window, suppressed lines]
+        self._windows: Dict[int, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        account_id = getattr(record, "account_id", None)
+        if account_id is None or self.per_minute <= 0:
+            return True
+
+        now = time.monotonic()
+        window = self._windows.get(account_id)
+        if window is None or now - window[0] >= 60:
+            suppressed = window[2] if window else 0
+            self._windows[account_id] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+
+        if window[1] >= self.per_minute:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class _LoopQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting (and traceback rendering) to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now so later mutation can't change the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(process_name: Optional[str] = None) -> QueueListener:
+    """Route all logging through a queue drained by a background thread"""
+    global _listener
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter(process_name))
+    else:
+        prefix = f"{process_name} - " if process_name else ""
+        stream.setFormatter(logging.Formatter(
+            f"%(asctime)s - %(levelname)s - {prefix}%(name)s - %(message)s"
+        ))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _LoopQueueHandler(log_queue)
+    handler.addFilter(AccountRateLimitFilter(LOG_ACCOUNT_RATE))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,124 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Deque, Dict, Optional
+
+from config import LOOP_LAG_THRESHOLD_MS, LOOP_STALL_ALERT_SECONDS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds between heartbeats on the loop (and between sampler checks)
+TICK_INTERVAL = 0.1
+# Innermost stack frames kept per sample
+STACK_DEPTH = 12
+# Stalls kept for the admin screen
+RECENT_STALLS = 20
+# Minimum seconds between two admin alerts from one process
+ALERT_COOLDOWN = 600
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class LoopWatchdog:
+    """Measures event loop lag and samples the loop's stack while it is stalled"""
+
+    def __init__(self, threshold: float, alert_after: float):
+        self.threshold = threshold
+        self.alert_after = alert_after
+        self.stalls: Deque[Dict] = collections.deque(maxlen=RECENT_STALLS)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        # Stack captured by the sampler thread for the heartbeat it belongs to
+        self._sample: Optional[tuple] = None
+        self._stopped = threading.Event()
+        # (monotonic time, stall seconds) in the last minute
+        self._window: Deque[tuple] = collections.deque()
+        self._last_alert = 0.0
+
+    def _sampler(self):
+        """Runs in a thread: grabs the loop thread's stack once per stall"""
+        sampled_beat = None
+        while not self._stopped.wait(TICK_INTERVAL):
+            beat = self._heartbeat
+            if beat == sampled_beat:
+                continue
+            if time.monotonic() - beat - TICK_INTERVAL < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            frames = traceback.extract_stack(frame)
+            # Drop the loop machinery above the callback that is running
+            for index in range(len(frames) - 1, -1, -1):
+                if frames[index].name == "_run" and frames[index].filename.endswith(
+                    ("asyncio/events.py", "asyncio\\events.py")
+                ):
+                    frames = frames[index + 1:]
+                    break
+            stack = "".join(traceback.format_list(frames[-STACK_DEPTH:]))
+            self._sample = (beat, stack)
+            sampled_beat = beat
+
+    async def run(self):
+        """Heartbeat loop (also alerts admins about sustained stalls)"""
+        self._loop_thread = threading.get_ident()
+        thread = threading.Thread(target=self._sampler, name="loop-watchdog", daemon=True)
+        thread.start()
+        try:
+            while True:
+                beat = self._heartbeat = time.monotonic()
+                await asyncio.sleep(TICK_INTERVAL)
+                lag = max(0.0, time.monotonic() - beat - TICK_INTERVAL)
+                metrics.observe("loop_lag_seconds", lag, LAG_BUCKETS)
+                if lag >= self.threshold:
+                    sample = self._sample
+                    stack = sample[1] if sample and sample[0] == beat else None
+                    self._on_stall(lag, stack)
+        finally:
+            self._stopped.set()
+
+    def heartbeat_age(self) -> float:
+        """Seconds since the heartbeat last ran on the loop"""
+        return time.monotonic() - self._heartbeat
+
+    def _on_stall(self, lag: float, stack: Optional[str]):
+        now = time.monotonic()
+        self.stalls.append({"at": time.time(), "lag": lag, "stack": stack})
+        metrics.inc("loop_stalls")
+        logger.warning(
+            f"Event loop stalled for {lag * 1000:.0f}ms"
+            + (f"\n{stack}" if stack else " (no stack sample)"),
+            extra={"context": "loop_stall", "duration": round(lag, 3)}
+        )
+
+        self._window.append((now, lag))
+        while self._window and now - self._window[0][0] > 60:
+            self._window.popleft()
+        stalled = sum(seconds for _, seconds in self._window)
+        if stalled < self.alert_after or now - self._last_alert < ALERT_COOLDOWN:
+            return
+
+        from notifications import notify
+        self._last_alert = now
+        where = stack.strip().splitlines()[-2].strip() if stack else "unknown"
+        notify(
+            "loop_stall",
+            f"🐢 Event loop stalled {stalled:.1f}s in the last minute "
+            f"({len(self._window)} stalls, longest {max(s for _, s in self._window):.1f}s)\n"
+            f"Last stall at: {where}"
+        )
+
+
+# Watchdog of this process (set by watch_loop)
+WATCHDOG: Optional[LoopWatchdog] = None
+
+
+async def watch_loop():
+    """Run the event loop watchdog for this process"""
+    global WATCHDOG
+    WATCHDOG = LoopWatchdog(LOOP_LAG_THRESHOLD_MS / 1000, LOOP_STALL_ALERT_SECONDS)
+    await WATCHDOG.run()
@@ -4,62 +4,120 @@ import logging
 
 from telethon import TelegramClient
 
-from config import ADMIN_IDS, API_HASH, API_ID, BOT_TOKEN
+from config import ADMIN_IDS, API_HASH, API_ID, BOT_TOKEN, HEALTH_PORT, WORKER_PROCESSES
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
-)
+logger = logging.getLogger("main")
 
 
 async def main():
     """Main application entry point"""
+    import health
+    from lifecycle import LifecycleManager
+    from supervisor import SUPERVISOR
+    lifecycle = LifecycleManager()
+    lifecycle.install_signal_handlers()
+    
+    # Health probes answer from the start, so a slow startup is told apart from a hung one
+    if HEALTH_PORT:
+        SUPERVISOR.spawn("health", health.run_health_server, restart=True)
+    
+    import tracing
+    if tracing.enabled():
+        SUPERVISOR.spawn("trace_writer", tracing.run_trace_writer)
+    
     # Initialize database
-    from db import init_db
-    await init_db()
-    print("✅ Database initialized")
+    from db import init_db, migrate_session_files
+    with health.phase("db_init"):
+        await init_db()
+    logger.info("✅ Database initialized")
+    
+    with health.phase("session_migration"):
+        migrated = await migrate_session_files()
+    if migrated:
+        logger.info(f"✅ Migrated {migrated} session files into the database")
+    health.mark_ready("db")
     
     # Create admin bot
-    bot = TelegramClient("admin_bot", API_ID, API_HASH)
-    await bot.start(bot_token=BOT_TOKEN)
-    print("✅ Admin bot started")
+    with health.phase("admin_bot"):
+        bot = TelegramClient("admin_bot", API_ID, API_HASH)
+        await bot.start(bot_token=BOT_TOKEN)
+    lifecycle.bot = bot
+    logger.info("✅ Admin bot started")
+    
+    # Admin notifications from every process go out from here as digests
+    from notifications import run_notifier
+    SUPERVISOR.spawn("notifier", lambda: run_notifier(bot), restart=True)
     
     # Setup admin handlers
     from admin_bot import setup_admin_handlers
     setup_admin_handlers(bot)
-    print("✅ Admin handlers registered")
+    health.mark_ready("bot")
+    logger.info("✅ Admin handlers registered")
     
-    # Start scheduler in background
-    from scheduler import run_scheduler
-    asyncio.create_task(run_scheduler(bot))
-    print("✅ Scheduler started")
-    
-    # Start forwarding for active accounts
     from db import get_accounts
-    from accounts import get_or_create_client, start_forwarding
-    
     accounts = await get_accounts(active_only=True)
-    for acc in accounts:
-        try:
-            client = await get_or_create_client(acc)
-            await start_forwarding(acc["id"], client)
-            print(f"✅ Forwarding enabled for account {acc['id']} ({acc['phone']})")
-        except Exception as e:
-            print(f"❌ Failed to start account {acc['id']}: {e}")
     
-    print("\n🚀 System is ready!")
-    print(f"📊 Active accounts: {len(accounts)}")
-    print(f"👥 Admin IDs: {', '.join(map(str, ADMIN_IDS))}")
-    print("\nPress Ctrl+C to stop...\n")
+    if WORKER_PROCESSES > 0:
+        # Clients and scheduler run in worker processes, one shard each
+        # (their connect time is reported by each worker)
+        from cluster import start_cluster
+        with health.phase("workers"):
+            await start_cluster(bot, WORKER_PROCESSES)
+        logger.info(f"✅ Started {WORKER_PROCESSES} worker processes")
+    else:
+        # Start scheduler in background
+        from scheduler import run_scheduler
+        lifecycle.scheduler_task = SUPERVISOR.spawn(
+            "scheduler", run_scheduler, restart=True
+        )
+        logger.info("✅ Scheduler started")
+        
+        # Start forwarding for active accounts
+        from accounts import get_or_create_client, start_forwarding
+        
+        with health.phase("clients"):
+            for acc in accounts:
+                try:
+                    client = await get_or_create_client(acc)
+                    await start_forwarding(acc.id, client)
+                    logger.info(
+                        f"✅ Forwarding enabled for account {acc.id} ({acc.phone})",
+                        extra={"account_id": acc.id}
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"❌ Failed to start account {acc.id}: {e}",
+                        extra={"account_id": acc.id}
+                    )
+    
+    # Database maintenance and backups run in this process only (one database file)
+    from maintenance import maintenance_loop
+    SUPERVISOR.spawn("maintenance", maintenance_loop, restart=True)
+    from backup import backup_loop
+    SUPERVISOR.spawn("backup", backup_loop, restart=True)
+    from loop_watchdog import watch_loop
+    SUPERVISOR.spawn("loop_watchdog", watch_loop, restart=True)
     
-    await bot.run_until_disconnected()
+    startup = health.startup_complete()
+    logger.info(f"🚀 System is ready! (startup {startup:.2f}s: {health.format_phases()})")
+    logger.info(f"📊 Active accounts: {len(accounts)}")
+    logger.info(f"👥 Admin IDs: {', '.join(map(str, ADMIN_IDS))}")
+    logger.info("Press Ctrl+C to stop...")
+    
+    try:
+        await lifecycle.wait_for_stop()
+    finally:
+        # Shut down on the loop that owns the clients
+        await lifecycle.shutdown()
+        logger.info("✅ Cleanup complete")
 
 
 if __name__ == "__main__":
+    from logging_setup import setup_logging, stop_logging
+    setup_logging()
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        print("\n🛑 Shutting down...")
-        from accounts import disconnect_all_clients
-        asyncio.run(disconnect_all_clients())
-        print("✅ Cleanup complete")
+        pass
+    finally:
+        stop_logging()
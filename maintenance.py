@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from config import (
+    DB_MAINTENANCE_BUDGET,
+    DB_MAINTENANCE_INTERVAL_MINUTES,
+    DB_MAINTENANCE_QUIET_SECONDS,
+)
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Free pages released per incremental vacuum step (one short write lock each)
+VACUUM_STEP_PAGES = 256
+# Local commits per minute above which checkpoints stay PASSIVE
+BUSY_WRITE_RATE = 30
+# Longest wait for a quiet moment before running anyway (seconds)
+MAX_QUIET_WAIT = 300
+
+# Report of the latest run (shown in the admin bot)
+LAST_REPORT: Optional[Dict[str, Any]] = None
+
+_RUN_LOCK = asyncio.Lock()
+# (monotonic time, local commit count) at the end of the previous run
+_last_run: Optional[tuple] = None
+
+
+async def wait_for_quiet(quiet: float, max_wait: float) -> bool:
+    """Wait until nothing was written for `quiet` seconds (False if max_wait ran out)"""
+    from db import get_write_activity
+    deadline = time.monotonic() + max_wait
+    activity = await get_write_activity()
+    while True:
+        await asyncio.sleep(quiet)
+        current = await get_write_activity()
+        if current == activity:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        activity = current
+
+
+def _write_rate(commits: int) -> float:
+    """Local commits per minute since the previous run"""
+    if _last_run is None:
+        return 0.0
+    # Measure over at least a minute so back-to-back runs aren't noisy
+    minutes = max(1.0, (time.monotonic() - _last_run[0]) / 60)
+    return (commits - _last_run[1]) / minutes
+
+
+async def run_maintenance(wait_quiet: bool = True) -> Dict[str, Any]:
+    """Incremental vacuum, optimize and WAL checkpoint within DB_MAINTENANCE_BUDGET"""
+    global LAST_REPORT, _last_run
+    from db import (
+        checkpoint_wal,
+        get_db_file_stats,
+        get_write_activity,
+        incremental_vacuum,
+        optimize_db,
+    )
+
+    async with _RUN_LOCK:
+        quiet = True
+        if wait_quiet:
+            quiet = await wait_for_quiet(DB_MAINTENANCE_QUIET_SECONDS, MAX_QUIET_WAIT)
+
+        started = time.perf_counter()
+        deadline = started + DB_MAINTENANCE_BUDGET
+        before = await get_db_file_stats()
+        commits, _ = await get_write_activity()
+        rate = _write_rate(commits)
+        skipped = []
+
+        # Release free pages a step at a time so writers never wait long
+        freed_pages = 0
+        while before["freelist_count"] - freed_pages > 0:
+            if time.perf_counter() >= deadline:
+                skipped.append("vacuum")
+                break
+            freed = await incremental_vacuum(VACUUM_STEP_PAGES)
+            if freed <= 0:
+                break
+            freed_pages += freed
+            await asyncio.sleep(0)
+
+        if time.perf_counter() < deadline:
+            await optimize_db()
+        else:
+            skipped.append("optimize")
+
+        # TRUNCATE also shrinks the WAL file but holds the write lock while
+        # copying; under steady writes only copy what is already committed
+        mode = "TRUNCATE" if quiet and rate < BUSY_WRITE_RATE else "PASSIVE"
+        if time.perf_counter() >= deadline:
+            mode = "PASSIVE"
+        busy, wal_frames, checkpointed = await checkpoint_wal(mode)
+
+        after = await get_db_file_stats()
+        duration = time.perf_counter() - started
+        reclaimed = max(
+            0, before["db_bytes"] + before["wal_bytes"] - after["db_bytes"] - after["wal_bytes"]
+        )
+        # Baseline after our own commits (optimize) for the next rate
+        commits, _ = await get_write_activity()
+        _last_run = (time.monotonic(), commits)
+
+        report = {
+            "at": time.time(),
+            "duration": round(duration, 3),
+            "reclaimed_bytes": reclaimed,
+            "freed_pages": freed_pages,
+            "free_pages_left": after["freelist_count"],
+            "checkpoint": mode,
+            "checkpoint_busy": bool(busy),
+            "wal_frames": wal_frames,
+            "checkpointed_frames": checkpointed,
+            "write_rate": round(rate, 1),
+            "quiet": quiet,
+            "skipped": skipped,
+            "db_bytes": after["db_bytes"],
+            "wal_bytes": after["wal_bytes"],
+        }
+        LAST_REPORT = report
+
+    metrics.inc("db_maintenance_runs")
+    metrics.inc("db_maintenance_reclaimed_bytes", reclaimed)
+    metrics.observe("db_maintenance_seconds", duration)
+    metrics.set_gauge("db_file_bytes", after["db_bytes"])
+    metrics.set_gauge("db_wal_bytes", after["wal_bytes"])
+    logger.info(
+        f"🧹 DB maintenance: reclaimed {reclaimed} bytes ({freed_pages} pages), "
+        f"checkpoint {mode} in {duration:.2f}s",
+        extra={"context": "db_maintenance", "duration": round(duration, 3)}
+    )
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Human readable maintenance report for the admin bot"""
+    lines = [
+        f"🧹 <b>Database Maintenance</b>\n",
+        f"🕐 Ran: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['at']))}",
+        f"⏱ Duration: {report['duration']:.2f}s",
+        f"♻️ Reclaimed: {report['reclaimed_bytes'] / 1024:.1f} KB ({report['freed_pages']} pages)",
+        f"📄 Checkpoint: {report['checkpoint']} "
+        f"({report['checkpointed_frames']}/{report['wal_frames']} frames"
+        f"{', busy' if report['checkpoint_busy'] else ''})",
+        f"✍️ Write rate: {report['write_rate']}/min",
+        f"💾 Size: {report['db_bytes'] / 1024:.1f} KB + WAL {report['wal_bytes'] / 1024:.1f} KB",
+    ]
+    if report["free_pages_left"]:
+        lines.append(f"📉 Free pages left: {report['free_pages_left']}")
+    if not report["quiet"]:
+        lines.append("⚠️ No quiet moment found, ran anyway")
+    if report["skipped"]:
+        lines.append(f"⏭ Over budget, skipped: {', '.join(report['skipped'])}")
+    return "\n".join(lines)
+
+
+async def maintenance_loop():
+    """Run maintenance every DB_MAINTENANCE_INTERVAL_MINUTES and report to the admins"""
+    if DB_MAINTENANCE_INTERVAL_MINUTES <= 0:
+        return
+    from db import log_error
+    from notifications import notify
+
+    while True:
+        await asyncio.sleep(DB_MAINTENANCE_INTERVAL_MINUTES * 60)
+        try:
+            report = await run_maintenance()
+        except Exception as e:
+            logger.exception("DB maintenance failed", extra={"context": "db_maintenance"})
+            await log_error(context="db_maintenance", error_text=str(e))
+            continue
+
+        notify("db_maintenance", format_report(report), html_text=True)
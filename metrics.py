@@ -0,0 +1,76 @@
+import bisect
+from typing import Any, Dict, Sequence
+
+# Default histogram bucket upper bounds (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COUNTERS: Dict[str, float] = {}
+GAUGES: Dict[str, float] = {}
+HISTOGRAMS: Dict[str, "Histogram"] = {}
+
+
+class Histogram:
+    """Bucketed distribution with count and sum"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One extra slot for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+def inc(name: str, value: float = 1):
+    """Add to a counter"""
+    COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float):
+    """Set a gauge to its current value"""
+    GAUGES[name] = value
+
+
+def observe(name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS):
+    """Record a value in a histogram (created with `buckets` on first use)"""
+    histogram = HISTOGRAMS.get(name)
+    if histogram is None:
+        histogram = HISTOGRAMS[name] = Histogram(buckets)
+    histogram.observe(value)
+
+
+def snapshot() -> Dict[str, Any]:
+    """All metrics of this process as plain data"""
+    return {
+        "counters": dict(COUNTERS),
+        "gauges": dict(GAUGES),
+        "histograms": {name: h.snapshot() for name, h in HISTOGRAMS.items()},
+    }
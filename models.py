@@ -0,0 +1,115 @@
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class Account:
+    """One accounts row, timestamps parsed once at load time"""
+
+    __slots__ = (
+        "id",
+        "phone",
+        "label",
+        "session_path",
+        "is_active",
+        "created_groups_count",
+        "first_activity_at",
+        "last_group_created_at",
+        "added_at",
+        "proxy_host",
+        "proxy_port",
+        "proxy_username",
+        "proxy_password",
+        "disabled_reason",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        phone: str,
+        label: Optional[str],
+        session_path: str,
+        is_active: bool,
+        created_groups_count: int,
+        first_activity_at: Optional[datetime],
+        last_group_created_at: Optional[datetime],
+        added_at: Optional[datetime],
+        proxy_host: Optional[str],
+        proxy_port: Optional[int],
+        proxy_username: Optional[str],
+        proxy_password: Optional[str],
+        disabled_reason: Optional[str]
+    ):
+        self.id = id
+        self.phone = phone
+        self.label = label
+        self.session_path = session_path
+        self.is_active = is_active
+        self.created_groups_count = created_groups_count
+        self.first_activity_at = first_activity_at
+        self.last_group_created_at = last_group_created_at
+        self.added_at = added_at
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+        self.proxy_username = proxy_username
+        self.proxy_password = proxy_password
+        self.disabled_reason = disabled_reason
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Account":
+        """Build from a row selected with ACCOUNT_COLUMNS"""
+        (
+            account_id, phone, label, session_path, is_active, created_groups_count,
+            first_activity_at, last_group_created_at, added_at,
+            proxy_host, proxy_port, proxy_username, proxy_password, disabled_reason
+        ) = row
+        return cls(
+            account_id,
+            phone,
+            label,
+            session_path,
+            bool(is_active),
+            created_groups_count or 0,
+            _parse_timestamp(first_activity_at),
+            _parse_timestamp(last_group_created_at),
+            _parse_timestamp(added_at),
+            proxy_host,
+            proxy_port,
+            proxy_username,
+            proxy_password,
+            disabled_reason,
+        )
+
+    def __repr__(self) -> str:
+        # Proxy credentials stay out of logs
+        return f"Account(id={self.id}, phone={self.phone!r}, active={self.is_active})"
+
+
+# Column list matching Account.from_row
+ACCOUNT_COLUMNS = ", ".join(Account.__slots__)
+
+
+class AccountSummary:
+    """The accounts columns the stats screen shows (no session or proxy credentials)"""
+
+    __slots__ = ("id", "phone", "is_active", "has_proxy", "created_groups_count")
+
+    def __init__(self, id: int, phone: str, is_active: bool, has_proxy: bool, created_groups_count: int):
+        self.id = id
+        self.phone = phone
+        self.is_active = is_active
+        self.has_proxy = has_proxy
+        self.created_groups_count = created_groups_count
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "AccountSummary":
+        """Build from a row selected with SUMMARY_COLUMNS"""
+        account_id, phone, is_active, has_proxy, created_groups_count = row
+        return cls(account_id, phone, bool(is_active), bool(has_proxy), created_groups_count or 0)
+
+
+# Column list matching AccountSummary.from_row
+SUMMARY_COLUMNS = "id, phone, is_active, proxy_host IS NOT NULL, created_groups_count"
@@ -0,0 +1,157 @@
+import asyncio
+import html
+import logging
+from typing import Callable, Dict, List, Optional
+
+from telethon.errors import FloodWaitError
+
+from config import ADMIN_IDS, NOTIFY_DIGEST_SECONDS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bot API limits: messages per second overall, seconds between messages to one chat
+BOT_MESSAGES_PER_SECOND = 25
+CHAT_MESSAGE_INTERVAL = 1.0
+# Events of one kind shown in a digest (the rest are counted)
+DIGEST_ITEMS = 10
+# Telegram message length limit (with room for the "more" line)
+MESSAGE_LIMIT = 4000
+# Delivery attempts per message when the bot hits a FloodWait
+SEND_ATTEMPTS = 3
+
+# Digest heading per kind (kinds without one use the kind name)
+DIGEST_TITLES = {
+    "account_disabled": "⚠️ <b>Accounts disabled</b>",
+    "task_crash": "💥 <b>Task crashes</b>",
+    "loop_stall": "🐢 <b>Event loop stalls</b>",
+    "db_maintenance": "🧹 <b>Database maintenance</b>",
+    "db_backup": "💾 <b>Backups</b>",
+    "group_jobs": "🧾 <b>Group job reconciliation</b>",
+    "settings": "⚙️ <b>Settings changed</b>",
+}
+
+# kind -> HTML texts waiting for the next digest (insertion ordered)
+_pending: Dict[str, List[str]] = {}
+# Events dropped beyond DIGEST_ITEMS per kind
+_overflow: Dict[str, int] = {}
+_ready = asyncio.Event()
+# Set in worker processes: hands events to the coordinator instead
+_forward: Optional[Callable[[str, str], None]] = None
+
+_next_send = 0.0
+_next_chat: Dict[int, float] = {}
+
+
+def notify(kind: str, text: str, html_text: bool = False):
+    """Queue an admin notification (never blocks; delivered in the next digest)"""
+    if not html_text:
+        text = html.escape(text)
+    if _forward is not None:
+        _forward(kind, text)
+        return
+    if not ADMIN_IDS:
+        return
+    metrics.inc("notifications_queued")
+    items = _pending.setdefault(kind, [])
+    if len(items) < DIGEST_ITEMS:
+        items.append(text)
+    else:
+        _overflow[kind] = _overflow.get(kind, 0) + 1
+    _ready.set()
+
+
+def forward_to(sink: Callable[[str, str], None]):
+    """Send this process's notifications to `sink(kind, html_text)`"""
+    global _forward
+    _forward = sink
+
+
+def _section(kind: str, items: List[str], extra: int) -> str:
+    """One kind's digest section, whole items only (cutting HTML could break parsing)"""
+    if len(items) == 1 and not extra and len(items[0]) <= MESSAGE_LIMIT:
+        return items[0]
+    lines = [f"{DIGEST_TITLES.get(kind, html.escape(kind))} ({len(items) + extra})"]
+    size = len(lines[0])
+    for i, item in enumerate(items):
+        if size + 2 + len(item) > MESSAGE_LIMIT:
+            extra += len(items) - i
+            break
+        lines.append(item)
+        size += 2 + len(item)
+    if extra:
+        lines.append(f"… and {extra} more")
+    return "\n\n".join(lines)
+
+
+def _take_digests() -> List[str]:
+    """Drain the queue into messages, one section per kind"""
+    sections = [_section(kind, items, _overflow.get(kind, 0)) for kind, items in _pending.items()]
+    _pending.clear()
+    _overflow.clear()
+
+    # Pack sections into as few messages as fit
+    messages = []
+    for section in sections:
+        if messages and len(messages[-1]) + len(section) + 2 <= MESSAGE_LIMIT:
+            messages[-1] += "\n\n" + section
+        else:
+            messages.append(section)
+    return messages
+
+
+async def _pace(chat_id: int):
+    """Wait for the global and per-chat send slots"""
+    global _next_send
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    at = max(now, _next_send, _next_chat.get(chat_id, 0.0))
+    _next_send = at + 1 / BOT_MESSAGES_PER_SECOND
+    _next_chat[chat_id] = at + CHAT_MESSAGE_INTERVAL
+    if at > now:
+        await asyncio.sleep(at - now)
+
+
+async def _deliver(bot_client, chat_id: int, text: str):
+    for attempt in range(SEND_ATTEMPTS):
+        await _pace(chat_id)
+        try:
+            await bot_client.send_message(chat_id, text, parse_mode="html")
+            metrics.inc("notifications_sent")
+            return
+        except FloodWaitError as e:
+            metrics.inc("notifications_flood_waits")
+            logger.warning(f"Notification FloodWait {e.seconds}s for chat {chat_id}")
+            await asyncio.sleep(e.seconds + 1)
+        except Exception:
+            # HTML the bot rejected and blocked chats won't get better on retry
+            logger.exception(f"Failed to deliver notification to {chat_id}")
+            break
+    metrics.inc("notifications_failed")
+
+
+async def _send_digests(bot_client):
+    for text in _take_digests():
+        for admin_id in ADMIN_IDS:
+            await _deliver(bot_client, admin_id, text)
+
+
+async def run_notifier(bot_client):
+    """Send queued notifications to every admin as a digest every NOTIFY_DIGEST_SECONDS"""
+    while True:
+        await _ready.wait()
+        # Let a burst collect into one digest
+        await asyncio.sleep(NOTIFY_DIGEST_SECONDS)
+        _ready.clear()
+        await _send_digests(bot_client)
+
+
+async def flush_notifications(bot_client, timeout: float):
+    """Send what is still queued without waiting for the digest interval (shutdown path)"""
+    if not _pending:
+        return
+    _ready.clear()
+    try:
+        await asyncio.wait_for(_send_digests(bot_client), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Pending notifications not delivered within {timeout}s")
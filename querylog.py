@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+from config import DB_BUSY_TIMEOUT, SLOW_QUERY_MS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Histogram bounds for statement latency (seconds)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+# Slow executions kept in SLOW_LOG
+SLOW_LOG_SIZE = 100
+# Seconds before a statement's plan is captured again
+PLAN_REFRESH = 3600
+
+# Statements that have a query plan worth capturing
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+# Full table scan in EXPLAIN QUERY PLAN output (index and virtual table scans excluded)
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?!.*\b(?:INDEX|VIRTUAL TABLE)\b)")
+
+
+class StatementStats:
+    """Latency of one SQL statement plus its last captured plan"""
+
+    __slots__ = ("sql", "histogram", "slow", "plan", "plan_at", "explaining")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.histogram = metrics.Histogram(QUERY_BUCKETS)
+        self.slow = 0
+        self.plan: Optional[List[str]] = None
+        self.plan_at = 0.0
+        self.explaining = False
+
+    @property
+    def full_scans(self) -> List[str]:
+        """Tables the plan reads without an index"""
+        scans = []
+        for line in self.plan or ():
+            match = _FULL_SCAN.match(line.strip())
+            if match and match.group(1) != "CONSTANT":
+                scans.append(match.group(1))
+        return scans
+
+
+# Normalized SQL -> stats, for every statement db.py ran in this process
+STATEMENTS: Dict[str, StatementStats] = {}
+# Recent executions slower than SLOW_QUERY_MS (newest last)
+SLOW_LOG: "deque[Dict[str, Any]]" = deque(maxlen=SLOW_LOG_SIZE)
+
+
+def normalize_sql(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def _value_shape(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"blob[{len(value)}]"
+    if isinstance(value, str):
+        return f"str[{len(value)}]"
+    return type(value).__name__
+
+
+def param_shape(params: Any) -> str:
+    """Types and sizes of bound parameters (values never leave the process)"""
+    if not params:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {_value_shape(v)}" for k, v in params.items()) + "}"
+    return "(" + ", ".join(_value_shape(value) for value in params) + ")"
+
+
+def _explain(sql: str, params: Any) -> List[str]:
+    """EXPLAIN QUERY PLAN on a private read-only connection, as indented lines"""
+    from db import read_only_uri
+    conn = sqlite3.connect(read_only_uri(), uri=True, timeout=DB_BUSY_TIMEOUT)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+    finally:
+        conn.close()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+async def _capture_plan(stats: StatementStats, params: Any):
+    try:
+        stats.plan = await asyncio.to_thread(_explain, stats.sql, params)
+        stats.plan_at = time.monotonic()
+        if stats.full_scans:
+            logger.warning(
+                f"Slow statement scans {', '.join(stats.full_scans)}: {stats.sql[:200]}",
+                extra={"context": "slow_query"}
+            )
+    except Exception as e:
+        stats.plan = [f"EXPLAIN failed: {e}"]
+        stats.plan_at = time.monotonic()
+    finally:
+        stats.explaining = False
+
+
+def record(sql: str, params: Any, elapsed: float, shape: Optional[str] = None):
+    """Account one execution; slow ones go to SLOW_LOG and get their plan captured"""
+    key = normalize_sql(sql)
+    stats = STATEMENTS.get(key)
+    if stats is None:
+        stats = STATEMENTS[key] = StatementStats(key)
+    stats.histogram.observe(elapsed)
+    metrics.observe("db_query_seconds", elapsed, QUERY_BUCKETS)
+
+    if SLOW_QUERY_MS <= 0 or elapsed * 1000 < SLOW_QUERY_MS:
+        return
+    stats.slow += 1
+    metrics.inc("db_slow_queries")
+    SLOW_LOG.append({
+        "at": time.time(),
+        "sql": key,
+        "params": shape or param_shape(params),
+        "ms": round(elapsed * 1000, 1),
+    })
+    logger.info(
+        f"🐌 Slow statement ({elapsed * 1000:.0f} ms): {key[:200]}",
+        extra={"context": "slow_query", "duration": round(elapsed, 4)}
+    )
+
+    stale = stats.plan is None or time.monotonic() - stats.plan_at > PLAN_REFRESH
+    if stale and not stats.explaining and key.split(" ", 1)[0].upper() in _EXPLAINABLE:
+        from supervisor import spawn
+        stats.explaining = True
+        spawn("explain_query", lambda: _capture_plan(stats, params))
+
+
+class TimedCursor:
+    """Cursor whose first fetch completes the execution's timing"""
+
+    def __init__(self, cursor: aiosqlite.Cursor, sql: str, params: Any, elapsed: float):
+        self._cursor = cursor
+        self._sql = sql
+        self._params = params
+        self._elapsed = elapsed
+        self._done = False
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def finish(self):
+        if not self._done:
+            self._done = True
+            record(self._sql, self._params, self._elapsed)
+
+    async def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return await method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+            self.finish()
+
+    async def fetchone(self):
+        return await self._fetch(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._fetch(self._cursor.fetchall)
+
+    async def fetchmany(self, size: Optional[int] = None):
+        return await self._fetch(self._cursor.fetchmany, size)
+
+
+class TimedConnection:
+    """aiosqlite connection wrapper that times every statement"""
+
+    def __init__(self, conn: aiosqlite.Connection):
+        self._conn = conn
+        # Cursor still waiting for its first fetch
+        self._pending: Optional[TimedCursor] = None
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def flush(self):
+        """Record a statement whose rows were never fetched"""
+        if self._pending is not None:
+            self._pending.finish()
+            self._pending = None
+
+    async def execute(self, sql: str, parameters: Any = None) -> TimedCursor:
+        self.flush()
+        started = time.perf_counter()
+        try:
+            cursor = await self._conn.execute(sql, parameters)
+        except Exception:
+            record(sql, parameters, time.perf_counter() - started)
+            raise
+        self._pending = TimedCursor(cursor, sql, parameters, time.perf_counter() - started)
+        return self._pending
+
+    async def executemany(self, sql: str, parameters: Any) -> aiosqlite.Cursor:
+        self.flush()
+        rows = list(parameters)
+        started = time.perf_counter()
+        try:
+            return await self._conn.executemany(sql, rows)
+        finally:
+            shape = f"{len(rows)} × {param_shape(rows[0] if rows else None)}"
+            record(sql, rows[0] if rows else None, time.perf_counter() - started, shape)
+
+    async def executescript(self, sql: str) -> aiosqlite.Cursor:
+        self.flush()
+        started = time.perf_counter()
+        try:
+            return await self._conn.executescript(sql)
+        finally:
+            record(sql, None, time.perf_counter() - started)
+
+    async def commit(self):
+        self.flush()
+        started = time.perf_counter()
+        try:
+            await self._conn.commit()
+        finally:
+            record("COMMIT", None, time.perf_counter() - started)
+
+    async def rollback(self):
+        self.flush()
+        await self._conn.rollback()
+
+    async def close(self):
+        self.flush()
+        await self._conn.close()
+
+
+def top_statements(limit: int = 10) -> List[StatementStats]:
+    """Statements with slow executions, slowest first"""
+    slow = [stats for stats in STATEMENTS.values() if stats.slow]
+    slow.sort(key=lambda stats: (stats.histogram.max, stats.slow), reverse=True)
+    return slow[:limit]
+
+
+def format_slow_report(limit: int = 8) -> str:
+    """Top slow statements with full scans flagged, for the admin bot"""
+    import html
+    header = (
+        "🐌 <b>Slow Queries</b> (admin process)\n\n"
+        f"Threshold: {SLOW_QUERY_MS:g} ms, {len(STATEMENTS)} statements seen, "
+        f"{int(metrics.COUNTERS.get('db_slow_queries', 0))} slow executions"
+    )
+    blocks = []
+    for stats in top_statements(limit):
+        h = stats.histogram
+        lines = [
+            f"<b>{stats.slow}× slow</b> of {h.count} — avg {h.sum / h.count * 1000:.1f} ms, "
+            f"p95 ≤{h.quantile(0.95) * 1000:.1f} ms, max {h.max * 1000:.1f} ms"
+        ]
+        if stats.full_scans:
+            lines.append(f"⚠️ Full SCAN: {', '.join(stats.full_scans)}")
+        lines.append(f"<code>{html.escape(stats.sql[:300])}</code>")
+        if stats.plan:
+            lines.append(f"<pre>{html.escape(chr(10).join(stats.plan[:8]))}</pre>")
+        blocks.append("\n".join(lines))
+    if not blocks:
+        blocks.append("No slow statements recorded.")
+
+    recent = list(SLOW_LOG)[-5:][::-1]
+    if recent:
+        lines = ["<b>Latest</b>"]
+        for entry in recent:
+            when = time.strftime("%H:%M:%S", time.localtime(entry["at"]))
+            lines.append(
+                f"{when} {entry['ms']:g} ms {html.escape(entry['params'])} — "
+                f"<code>{html.escape(entry['sql'][:80])}</code>"
+            )
+        blocks.append("\n".join(lines))
+
+    # Drop whole blocks (never cut inside a tag) to fit a Telegram message
+    text = header
+    for block in blocks:
+        if len(text) + len(block) + 2 > 4000:
+            break
+        text += "\n\n" + block
+    return text
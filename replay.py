@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List
+
+import loadtest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Replay recorded traces against the scheduler, limiter, DB layer and admin handlers"
+    )
+    parser.add_argument("traces", nargs="+", help="trace files (TRACE_PATH and its .worker-N files)")
+    parser.add_argument("--speed", type=float, default=1, help="time compression factor")
+    parser.add_argument("--no-admin", action="store_true", help="skip admin events")
+    parser.add_argument("--db", help="new database file to use (default: a fresh temporary one)")
+    return parser.parse_args()
+
+
+def load_events(paths: List[str]) -> List[Dict[str, Any]]:
+    """All events by start time (API events are written when the call returns)"""
+    events = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    event = json.loads(line)
+                    event["start"] = event["ts"] - event.get("ms", 0) / 1000
+                    events.append(event)
+    events.sort(key=lambda event: event["start"])
+    return events
+
+
+def configure_environment(args, admins: int):
+    """Scratch database, simulated admins and no recording (before any import of config)"""
+    if args.db:
+        loadtest.require_new_database(args.db)
+        os.environ["DB_PATH"] = args.db
+    else:
+        scratch = tempfile.mkdtemp(prefix="replay-")
+        os.environ["DB_PATH"] = os.path.join(scratch, "data.db")
+        os.environ["BACKUP_DIR"] = os.path.join(scratch, "backups")
+    os.environ["ADMIN_IDS"] = ",".join(
+        str(loadtest.FIRST_ADMIN_ID + i) for i in range(max(1, admins))
+    )
+    os.environ["TRACE_PATH"] = ""
+    os.environ["HEALTH_PORT"] = "0"
+
+
+def _replayed_error(name: str, wait: int, speed: float) -> BaseException:
+    """An instance of the recorded error type (RuntimeError for unknown ones)"""
+    from telethon import errors
+    if name == "FloodWaitError":
+        return errors.FloodWaitError(None, capture=max(0, round(wait / speed)))
+    cls = getattr(errors, name, None)
+    if isinstance(cls, type) and issubclass(cls, errors.RPCError):
+        try:
+            return cls(None)
+        except TypeError:
+            pass
+    for builtin in (ConnectionError, TimeoutError, OSError):
+        if name == builtin.__name__:
+            return builtin(f"replayed {name}")
+    return RuntimeError(f"replayed {name}")
+
+
+class ReplayClient:
+    """Fake TelegramClient answering each call with the next recorded latency and error"""
+
+    def __init__(self, script: Dict[str, Deque[Dict[str, Any]]], speed: float, stats: Dict[str, int]):
+        self.script = script
+        self.speed = speed
+        self.stats = stats
+        self._next_id = 1
+
+    async def _play(self, method: str):
+        queue = self.script.get(method)
+        if not queue:
+            # More calls than recorded (e.g. after a code change): answer fast and cleanly
+            self.stats["unscripted"] += 1
+            await asyncio.sleep(0.05 / self.speed)
+            return
+        event = queue.popleft()
+        await asyncio.sleep(event.get("ms", 0) / 1000 / self.speed)
+        if "e" in event:
+            self.stats["errors"] += 1
+            raise _replayed_error(event["e"], event.get("w", 0), self.speed)
+
+    async def connect(self):
+        await self._play("connect")
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def __call__(self, request):
+        await self._play("create_channel")
+        self._next_id += 1
+        return SimpleNamespace(chats=[SimpleNamespace(id=self._next_id)])
+
+    async def send_message(self, *args, **kwargs):
+        await self._play("send_message")
+
+    async def forward(self, *args, **kwargs):
+        await self._play("forward")
+
+
+def _callback_data(data: str, accounts: Dict[str, int]) -> bytes:
+    """Put seeded account ids back where the recorder anonymized numbers"""
+    return re.sub(
+        r"#([0-9a-f]+)", lambda m: str(accounts.get(m.group(1), 1)), data
+    ).encode()
+
+
+def _action_name(event: Dict[str, Any]) -> str:
+    if event["k"] == "msg":
+        return event["t"]
+    return ":".join(part for part in event["d"].split(":")[:2] if not part.startswith("#"))
+
+
+async def run(args, events: List[Dict[str, Any]], accounts: List[str], admins: List[str]):
+    import accounts as accounts_module
+    import admin_bot
+    import settings
+    from db import close_db, get_account_by_id
+    from limiter import FORWARD, throttled
+    from scheduler import create_group_for_account
+
+    ids = await loadtest.seed_database(len(accounts), 0)
+    account_ids = dict(zip(accounts, ids))
+    admin_ids = {admin: loadtest.FIRST_ADMIN_ID + i for i, admin in enumerate(admins)}
+
+    # Recorded API calls per account and method, replayed in order
+    scripts: Dict[str, Dict[str, Deque]] = defaultdict(lambda: defaultdict(deque))
+    for event in events:
+        if event["k"] == "api" and event["a"] in account_ids:
+            scripts[event["a"]][event["m"]].append(event)
+
+    stats = {"errors": 0, "unscripted": 0, "groups": 0, "forwards": 0}
+    clients: Dict[int, ReplayClient] = {}
+    anon_of = {account_id: anon for anon, account_id in account_ids.items()}
+
+    async def fake_get_or_create_client(acc):
+        client = clients.get(acc.id)
+        if client is None:
+            client = clients[acc.id] = ReplayClient(scripts[anon_of[acc.id]], args.speed, stats)
+            await client.connect()
+        return client
+
+    accounts_module.get_or_create_client = fake_get_or_create_client
+    admin_bot.dispatch_control = loadtest.fake_control
+    # Rate limits scale with the replay speed, like the gaps between events
+    for key in settings.SETTINGS:
+        if key.startswith("rate_") and key.endswith("_per_minute"):
+            settings.VALUES[key] *= args.speed
+
+    bot = loadtest.FakeBot(0)
+    admin_bot.setup_admin_handlers(bot)
+    await bot.resolve()
+
+    latencies: Dict[str, List[float]] = {}
+    failures: Dict[str, int] = {}
+    lag: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loadtest.measure_loop_lag(stop, lag))
+
+    async def timed(name: str, coro):
+        started = time.perf_counter()
+        try:
+            await coro
+        except Exception:
+            failures[name] = failures.get(name, 0) + 1
+        latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    async def create_group(anon: str):
+        acc = await get_account_by_id(account_ids[anon])
+        stats["groups"] += 1
+        await create_group_for_account(acc, datetime.utcnow())
+
+    async def forward(anon: str):
+        client = await fake_get_or_create_client(await get_account_by_id(account_ids[anon]))
+        stats["forwards"] += 1
+        await throttled(account_ids[anon], FORWARD, client.forward)
+
+    loop = asyncio.get_running_loop()
+    origin = events[0]["start"] if events else 0
+    started = loop.time()
+    tasks = []
+    for event in events:
+        delay = started + (event["start"] - origin) / args.speed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = event["k"]
+        # Only first attempts start work: retries happen inside the limiter again
+        if kind == "api" and event["a"] in account_ids and not event.get("r"):
+            if event["m"] == "create_channel":
+                tasks.append(asyncio.create_task(timed("group", create_group(event["a"]))))
+            elif event["m"] == FORWARD:
+                tasks.append(asyncio.create_task(timed("forward", forward(event["a"]))))
+        elif kind in ("cb", "msg") and not args.no_admin:
+            sender = admin_ids[event["u"]]
+            if kind == "cb":
+                fake = loadtest.FakeCallbackQuery(bot, sender, _callback_data(event["d"], account_ids))
+            elif event["t"] != "text":
+                fake = loadtest.FakeNewMessage(bot, sender, event["t"])
+            else:
+                # Free text only means something inside a flow that needs a real login
+                continue
+            tasks.append(asyncio.create_task(timed(_action_name(event), bot.dispatch(fake))))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+    stop.set()
+    await lag_task
+    await close_db()
+
+    span = (events[-1]["ts"] - origin) if events else 0
+    header = f"{'':<15}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'fail':>7}"
+    print()
+    print(
+        f"Replay: {len(events)} events, {len(accounts)} accounts, {len(admins)} admins, "
+        f"trace span {span:.1f}s replayed in {elapsed:.1f}s (speed {args.speed:g})"
+    )
+    print()
+    print("Latency (event start -> work done)")
+    print(header)
+    for name in sorted(latencies):
+        print(loadtest.format_row(name, latencies[name], failures.get(name, 0)))
+    print()
+    print("Event loop lag")
+    print(header)
+    print(loadtest.format_row("loop", lag))
+    print()
+    print(
+        f"{stats['groups']} groups, {stats['forwards']} forwards, {stats['errors']} replayed errors, "
+        f"{stats['unscripted']} calls beyond the trace"
+    )
+
+
+def main():
+    args = parse_args()
+    events = load_events(args.traces)
+    # Login attempts are keyed by phone number and can't be replayed without Telegram
+    accounts = sorted({event["a"] for event in events if event["k"] == "api" and event["m"] != "auth"})
+    admins = sorted({event["u"] for event in events if event["k"] in ("cb", "msg")})
+    configure_environment(args, len(admins))
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    asyncio.run(run(args, events, accounts, admins))
+
+
+if __name__ == "__main__":
+    main()
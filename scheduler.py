@@ -1,11 +1,17 @@
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 
 from telethon import functions
-from telethon.errors import ChannelsTooMuchError, FloodWaitError
+from telethon.errors import ChannelsTooMuchError, FloodWaitError, RPCError
 
-from config import GROUP_INTERVAL_MINUTES, MAX_ACCOUNT_DAYS, MAX_GROUPS_PER_ACCOUNT, ADMIN_IDS
+from config import MESSAGE_CHUNKS, MESSAGE_MODE
+from limiter import CREATE_CHANNEL, SEND_MESSAGE, blocked_for, throttled
+from models import Account
+import metrics
+import settings
 
 logger = logging.getLogger(__name__)
 
@@ -30,93 +36,150 @@ def is_scheduler_running() -> bool:
     return SCHEDULER_RUNNING
 
 
-async def run_scheduler(bot_client):
-    """Main scheduler loop"""
+# Set on shutdown: no new jobs are taken, the loop exits after the current one
+_DRAINING = asyncio.Event()
+
+
+def drain_scheduler():
+    """Stop taking new jobs and let the scheduler loop exit"""
+    _DRAINING.set()
+
+
+async def _idle(seconds: float):
+    """Sleep unless the scheduler is draining"""
+    try:
+        await asyncio.wait_for(_DRAINING.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def run_scheduler(shard: Optional[Tuple[int, int]] = None):
+    """Main scheduler loop (only accounts of the (index, count) shard if given)"""
     logger.info("📅 Scheduler started")
     
-    while True:
+    # Every unfinished job is picked up on the first pass (left over from a crash)
+    reconciled_once = False
+    
+    while not _DRAINING.is_set():
         try:
             if not SCHEDULER_RUNNING:
-                await asyncio.sleep(5)
+                await _idle(5)
                 continue
             
-            # Get active accounts
-            from db import disable_account, get_accounts, log_error
-            accounts = await get_accounts(active_only=True)
+            from db import (
+                disable_account,
+                expire_accounts,
+                get_due_accounts,
+                get_open_group_job_accounts,
+                log_error,
+            )
+            from group_jobs import reconcile_group_jobs
+            from notifications import notify
+            
+            # Finish or repair half-done creations before numbering new groups
+            unfinished = await get_open_group_job_accounts(shard)
+            if unfinished:
+                await reconcile_group_jobs(shard, all_jobs=not reconciled_once)
+                unfinished = await get_open_group_job_accounts(shard)
+            reconciled_once = True
+            
             now = datetime.utcnow()
             
-            for index, acc in enumerate(accounts, start=1):
-                account_id = acc["id"]
-                created_groups = acc["created_groups_count"] or 0
-                
-                # Check if account reached max groups
-                if created_groups >= MAX_GROUPS_PER_ACCOUNT:
-                    logger.info(f"[Account {account_id}] Reached max groups ({MAX_GROUPS_PER_ACCOUNT})")
-                    continue
-                
-                # Parse timestamps
-                first_activity = (
-                    datetime.fromisoformat(acc["first_activity_at"])
-                    if acc.get("first_activity_at") else None
-                )
-                last_group = (
-                    datetime.fromisoformat(acc["last_group_created_at"])
-                    if acc.get("last_group_created_at") else None
+            # Disable every account past max_account_days in one statement
+            # (read every tick: it can be changed from the admin bot)
+            max_days = settings.get("max_account_days")
+            expired = await expire_accounts(
+                now - timedelta(days=max_days), "Exceeded maximum active days", shard
+            )
+            if expired:
+                logger.info(
+                    f"Disabled {len(expired)} accounts past {max_days} days: "
+                    f"{', '.join(map(str, expired[:20]))}{' …' if len(expired) > 20 else ''}"
                 )
+            
+            # Only accounts whose next_due_at has passed (interval and max groups
+            # are folded into it by the write path)
+            accounts = await get_due_accounts(now, shard)
+            
+            # Accounts with far slower Telegram calls than the fleet go last,
+            # and only a few per pass, so they don't hold up healthy ones
+            from latency import slow_account_ids
+            slow = slow_account_ids()
+            if slow:
+                healthy = [acc for acc in accounts if acc.id not in slow]
+                lagging = [acc for acc in accounts if acc.id in slow]
+                limit = settings.get("slow_accounts_per_tick")
+                if len(lagging) > limit:
+                    logger.info(f"Deferring {len(lagging) - limit} slow accounts to later passes")
+                    metrics.inc("scheduler_slow_deferred", len(lagging) - limit)
+                accounts = healthy + lagging[:limit]
+            
+            for acc in accounts:
+                if _DRAINING.is_set():
+                    break
+                account_id = acc.id
                 
-                # Check 10 days limit
-                if first_activity:
-                    if now - first_activity > timedelta(days=MAX_ACCOUNT_DAYS):
-                        logger.info(f"[Account {account_id}] Exceeded max days ({MAX_ACCOUNT_DAYS})")
-                        await disable_account(account_id, "Exceeded maximum active days")
-                        continue
+                # Reconciliation of an earlier job is still pending
+                if account_id in unfinished:
+                    continue
                 
-                # Check 30 minutes interval
-                if last_group:
-                    if now - last_group < timedelta(minutes=GROUP_INTERVAL_MINUTES):
-                        continue
+                # Still under a FloodWait: waiting for its bucket here would
+                # stall every other account of this pass
+                if blocked_for(account_id, CREATE_CHANNEL) or blocked_for(account_id, SEND_MESSAGE):
+                    metrics.inc("scheduler_flood_skipped")
+                    continue
                 
                 # Create group
                 try:
-                    await create_group_for_account(acc, index, now, bot_client)
+                    await create_group_for_account(acc, now)
                 except ChannelsTooMuchError as e:
                     # Disable account - too many channels/groups
-                    logger.warning(f"[Account {account_id}] Too many channels - disabling")
+                    logger.warning(
+                        f"[Account {account_id}] Too many channels - disabling",
+                        extra={"account_id": account_id}
+                    )
                     await disable_account(
                         account_id,
                         "Exceeded Telegram limit for channels/groups"
                     )
-                    if ADMIN_IDS:
-                        await bot_client.send_message(
-                            ADMIN_IDS[0],
-                            f"⚠️ Account {account_id} ({acc['phone']}) disabled\n"
-                            f"Reason: Too many channels/groups joined"
-                        )
-                    else:
-                        logger.warning("No ADMIN_IDS configured to notify about disabled account.")
+                    notify(
+                        "account_disabled",
+                        f"⚠️ Account {account_id} ({acc.phone}) disabled\n"
+                        f"Reason: Too many channels/groups joined"
+                    )
                 except FloodWaitError as e:
-                    logger.warning(f"[Account {account_id}] FloodWait: {e.seconds}s")
-                    await asyncio.sleep(e.seconds)
+                    # The limiter blocks this account's bucket; later passes skip it
+                    # until the wait is over
+                    logger.warning(
+                        f"[Account {account_id}] FloodWait: {e.seconds}s",
+                        extra={"account_id": account_id}
+                    )
                 except Exception as e:
-                    logger.exception(f"[Account {account_id}] Error creating group")
+                    logger.exception(
+                        f"[Account {account_id}] Error creating group",
+                        extra={"account_id": account_id, "context": "scheduler_create_group"}
+                    )
                     await log_error(
                         context="scheduler_create_group",
                         error_text=str(e),
                         account_id=account_id
                     )
             
-            await asyncio.sleep(30)  # Check every 30 seconds
+            await _idle(30)  # Check every 30 seconds
             
         except Exception as e:
-            logger.exception("Scheduler main loop error")
+            logger.exception("Scheduler main loop error", extra={"context": "scheduler_main_loop"})
             await log_error(context="scheduler_main_loop", error_text=str(e))
-            await asyncio.sleep(10)
+            await _idle(10)
+    
+    logger.info("📅 Scheduler drained")
 
 
-async def create_group_for_account(acc: dict, index: int, now: datetime, bot_client):
+async def create_group_for_account(acc: Account, now: datetime):
     """Create a group for an account"""
-    account_id = acc["id"]
-    created_groups = acc["created_groups_count"] or 0
+    account_id = acc.id
+    created_groups = acc.created_groups_count
+    started = time.perf_counter()
     
     # Get or create client
     from accounts import get_or_create_client
@@ -125,63 +188,80 @@ async def create_group_for_account(acc: dict, index: int, now: datetime, bot_cli
     # Generate group title
     group_number = created_groups + 1
     date_str = now.strftime("%Y-%m-%d")
-    title = f"ACC{index:02d} • G{group_number:03d} • {date_str}"
+    title = f"ACC{account_id:02d} • G{group_number:03d} • {date_str}"
+    
+    from db import complete_group_job, drop_group_job, record_group_job_chat, start_group_job
+    
+    # Journal the intent first: a crash from here on is repaired by group_jobs
+    job_id = await start_group_job(account_id, group_number, title, now)
     
     # Create supergroup (megagroup)
-    result = await client(
-        functions.channels.CreateChannelRequest(
-            title=title,
-            about="Auto-created group",
-            megagroup=True
+    try:
+        result = await throttled(
+            account_id,
+            CREATE_CHANNEL,
+            client,
+            functions.channels.CreateChannelRequest(
+                title=title,
+                about="Auto-created group",
+                megagroup=True
+            )
         )
-    )
+    except RPCError:
+        # Telegram refused the request, nothing was created
+        await drop_group_job(job_id)
+        raise
     
     channel = result.chats[0]
-    chat_id = channel.id
-    
-    # Save to database
-    from db import (
-        create_group_record,
-        increment_account_groups,
-        update_account_activity,
-        update_group_messages
-    )
-    
-    group_db_id = await create_group_record(
-        account_id=account_id,
-        chat_id=str(chat_id),
-        title=title
-    )
+    group_db_id = await record_group_job_chat(job_id, account_id, str(channel.id), title)
     
     # Generate and send messages
-    messages = generate_datetime_messages(now)
-    sent_count = 0
-    
-    for msg in messages:
-        await client.send_message(entity=channel, message=msg)
-        sent_count += 1
-        await asyncio.sleep(1)
+    messages = build_group_messages(generate_datetime_messages(now))
+    sent_count = await send_group_messages(client, account_id, channel, messages)
     
-    # Update database
-    await update_group_messages(group_db_id, sent_count)
-    await increment_account_groups(account_id)
-    
-    first_activity = (
-        datetime.fromisoformat(acc["first_activity_at"])
-        if acc.get("first_activity_at") else now
-    )
-    await update_account_activity(
-        account_id=account_id,
-        first_activity=first_activity,
+    await complete_group_job(
+        job_id, account_id, group_db_id, sent_count,
+        first_activity=acc.first_activity_at or now,
         last_group=now
     )
     
+    elapsed = time.perf_counter() - started
     logger.info(
         f"[Account {account_id}] Created group '{title}' "
-        f"(#{group_number}/{MAX_GROUPS_PER_ACCOUNT}), sent {sent_count} messages"
+        f"(#{group_number}/{settings.get('max_groups_per_account')}), sent {sent_count} messages "
+        f"in {elapsed:.2f}s ({MESSAGE_MODE} mode)",
+        extra={"account_id": account_id, "duration": round(elapsed, 3)}
     )
 
 
+async def send_group_messages(client, account_id: int, channel, messages: list) -> int:
+    """Send messages to a new group, return how many were sent"""
+    sent_count = 0
+    for msg in messages:
+        await throttled(
+            account_id, SEND_MESSAGE, client.send_message, entity=channel, message=msg
+        )
+        sent_count += 1
+    return sent_count
+
+
+def build_group_messages(lines: list) -> list:
+    """Pack message lines according to MESSAGE_MODE"""
+    if MESSAGE_MODE != "compact" or not lines:
+        return lines
+    
+    # Exactly min(MESSAGE_CHUNKS, lines) messages, the first ones one line longer
+    chunks = min(max(1, MESSAGE_CHUNKS), len(lines))
+    size, extra = divmod(len(lines), chunks)
+    messages = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        messages.append("\n".join(lines[start:end]))
+        start = end
+    return messages
+
+
 def generate_datetime_messages(dt: datetime) -> list:
     """Generate 10 datetime-based messages"""
     year = dt.year
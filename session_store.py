@@ -0,0 +1,162 @@
+import datetime
+import time
+import warnings
+from typing import Dict, Set
+
+from telethon import utils
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from telethon.tl import types
+from telethon.tl.types import PeerChannel, PeerChat, PeerUser
+
+# Telethon warns on every awaited save()/close(); this backend is async on purpose
+warnings.filterwarnings("ignore", message="Using async sessions support")
+
+
+class DatabaseSession(MemorySession):
+    """Telethon session stored in the main database instead of a .session file"""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        # Entity cache: marked id -> (id, hash, username, phone, name)
+        self._entities: Dict[int, tuple] = {}
+        self._dirty_session = False
+        self._dirty_entities: Set[int] = set()
+        self._dirty_states: Set[int] = set()
+
+    @classmethod
+    async def load(cls, name: str) -> "DatabaseSession":
+        """Load a session by name (empty session if not stored yet)"""
+        from db import load_session_data
+        session = cls(name)
+        data = await load_session_data(name)
+        if not data:
+            return session
+
+        dc_id, server_address, port, key, takeout_id = data["session"]
+        session._dc_id = dc_id
+        session._server_address = server_address
+        session._port = port
+        session._auth_key = AuthKey(data=key) if key else None
+        session._takeout_id = takeout_id
+
+        for row in data["entities"]:
+            session._entities[row[0]] = tuple(row)
+        for entity_id, pts, qts, date, seq in data["update_states"]:
+            session._update_states[entity_id] = types.updates.State(
+                pts=pts,
+                qts=qts,
+                date=datetime.datetime.fromtimestamp(date, tz=datetime.timezone.utc),
+                seq=seq,
+                unread_count=0
+            )
+        return session
+
+    def clone(self, to_instance=None):
+        # Exported/CDN senders get throwaway in-memory sessions
+        return super().clone(to_instance or MemorySession())
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty_session = True
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._dirty_session = True
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._dirty_session = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty_states.add(entity_id)
+
+    def process_entities(self, tlo):
+        for row in self._entities_to_rows(tlo):
+            if self._entities.get(row[0]) != row:
+                self._entities[row[0]] = row
+                self._dirty_entities.add(row[0])
+
+    def get_entity_rows_by_phone(self, phone):
+        return next(
+            ((row[0], row[1]) for row in self._entities.values() if row[3] == phone),
+            None
+        )
+
+    def get_entity_rows_by_username(self, username):
+        return next(
+            ((row[0], row[1]) for row in self._entities.values() if row[2] == username),
+            None
+        )
+
+    def get_entity_rows_by_name(self, name):
+        return next(
+            ((row[0], row[1]) for row in self._entities.values() if row[4] == name),
+            None
+        )
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        if exact:
+            ids = (id,)
+        else:
+            ids = (
+                utils.get_peer_id(PeerUser(id)),
+                utils.get_peer_id(PeerChat(id)),
+                utils.get_peer_id(PeerChannel(id))
+            )
+        for entity_id in ids:
+            row = self._entities.get(entity_id)
+            if row:
+                return row[0], row[1]
+        return None
+
+    async def save(self):
+        """Write pending changes through the shared write connection"""
+        if not (self._dirty_session or self._dirty_entities or self._dirty_states):
+            return
+
+        from db import save_session_data
+        session_row = None
+        if self._dirty_session:
+            session_row = (
+                self._dc_id,
+                self._server_address,
+                self._port,
+                self._auth_key.key if self._auth_key else b"",
+                self._takeout_id
+            )
+        now = int(time.time())
+        entities = [
+            self._entities[entity_id] + (now,) for entity_id in self._dirty_entities
+        ]
+        update_states = []
+        for entity_id in self._dirty_states:
+            state = self._update_states[entity_id]
+            update_states.append(
+                (entity_id, state.pts, state.qts, int(state.date.timestamp()), state.seq)
+            )
+
+        dirty = (self._dirty_session, self._dirty_entities, self._dirty_states)
+        self._dirty_session = False
+        self._dirty_entities = set()
+        self._dirty_states = set()
+        try:
+            await save_session_data(self.name, session_row, entities, update_states)
+        except Exception:
+            # Keep changes pending for the next save
+            self._dirty_session |= dirty[0]
+            self._dirty_entities |= dirty[1]
+            self._dirty_states |= dirty[2]
+            raise
+
+    async def close(self):
+        await self.save()
+
+    async def delete(self):
+        from db import delete_session_data
+        await delete_session_data(self.name)
+        return True
@@ -0,0 +1,166 @@
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from config import (
+    DB_READ_CONNECTIONS,
+    GROUP_INTERVAL_MINUTES,
+    MAX_ACCOUNT_DAYS,
+    MAX_GROUPS_PER_ACCOUNT,
+    RATE_LIMITS,
+    SLOW_ACCOUNTS_PER_TICK,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Setting:
+    """One runtime-tunable value: environment default plus allowed range"""
+
+    __slots__ = ("key", "label", "kind", "minimum", "maximum", "default", "unit")
+
+    def __init__(self, key: str, label: str, kind: type, minimum: float, maximum: float,
+                 default: Any, unit: str = ""):
+        self.key = key
+        self.label = label
+        self.kind = kind
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+        # Environment defaults get the same checks as values typed by an admin
+        self.default = self.parse(default)
+
+    def parse(self, raw: str):
+        """Convert and range-check a value typed by an admin or read from the DB"""
+        try:
+            value = self.kind(float(raw)) if self.kind is int else self.kind(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f"❌ {self.label} must be a number")
+        if self.kind is int and float(raw) != value:
+            raise ValueError(f"❌ {self.label} must be a whole number")
+        if not self.minimum <= value <= self.maximum:
+            raise ValueError(
+                f"❌ {self.label} must be between {self.minimum:g} and {self.maximum:g}"
+            )
+        return value
+
+    def format(self, value) -> str:
+        return f"{value:g} {self.unit}".rstrip()
+
+
+# key -> setting, in display order
+SETTINGS: Dict[str, Setting] = {}
+
+
+def _register(key: str, *args, **kwargs):
+    try:
+        setting = Setting(key, *args, **kwargs)
+    except ValueError as e:
+        raise ValueError(f"Invalid environment default for setting {key}: {e}") from None
+    SETTINGS[setting.key] = setting
+
+
+_register("group_interval_minutes", "⏰ Interval", int, 1, 10080, GROUP_INTERVAL_MINUTES, "min")
+_register("max_groups_per_account", "📊 Max groups", int, 1, 100000, MAX_GROUPS_PER_ACCOUNT)
+_register("max_account_days", "📅 Max days", int, 1, 3650, MAX_ACCOUNT_DAYS, "days")
+# At least 1: skipped slow accounts would get no new samples and stay flagged
+_register("slow_accounts_per_tick", "🐢 Slow per pass", int, 1, 1000, SLOW_ACCOUNTS_PER_TICK)
+for _method, (_per_minute, _burst) in RATE_LIMITS.items():
+    _register(f"rate_{_method}_per_minute", f"🚦 {_method}", float, 0.01, 600, _per_minute, "/min")
+    _register(f"rate_{_method}_burst", f"🚦 {_method} burst", float, 1, 100, _burst)
+_register("db_read_connections", "🗄 DB readers", int, 1, 64, DB_READ_CONNECTIONS)
+
+# Settings that change which accounts are due (next_due_at is recomputed)
+NEXT_DUE_KEYS = ("group_interval_minutes", "max_groups_per_account")
+
+# Live values in this process
+VALUES: Dict[str, Any] = {key: setting.default for key, setting in SETTINGS.items()}
+
+
+def get(key: str):
+    """Current value of a setting"""
+    return VALUES[key]
+
+
+def rate_limit(method: str) -> Tuple[float, float]:
+    """(calls per minute, burst) for a limiter method class"""
+    return VALUES[f"rate_{method}_per_minute"], VALUES[f"rate_{method}_burst"]
+
+
+def _on_change(key: str):
+    """Push a changed value into the parts that cache it"""
+    for method in RATE_LIMITS:
+        if key in (f"rate_{method}_per_minute", f"rate_{method}_burst"):
+            from limiter import reconfigure
+            reconfigure(method, *rate_limit(method))
+    if key == "db_read_connections":
+        from db import trim_read_pool
+        trim_read_pool()
+
+
+def apply_values(rows: Iterable[Tuple[str, str]]):
+    """Set live values from stored (key, value) rows; missing keys fall back to the default"""
+    stored = dict(rows)
+    for key, setting in SETTINGS.items():
+        value = setting.default
+        if stored.get(key) is not None:
+            try:
+                value = setting.parse(stored[key])
+            except ValueError:
+                logger.warning(f"Ignoring stored setting {key}={stored[key]!r}")
+        if VALUES[key] != value:
+            logger.info(f"⚙️ Setting {key}: {setting.format(VALUES[key])} → {setting.format(value)}")
+            VALUES[key] = value
+            _on_change(key)
+
+
+async def load_settings():
+    """Reload live values from the database"""
+    from db import get_settings
+    apply_values((key, row["value"]) for key, row in (await get_settings()).items())
+
+
+async def _after_update(key: str, old, new, admin_id: int, action: str):
+    from db import refresh_next_due
+    from notifications import notify
+
+    await load_settings()
+    if key in NEXT_DUE_KEYS:
+        await refresh_next_due()
+    setting = SETTINGS[key]
+    logger.info(
+        f"⚙️ Admin {admin_id} {action} {key}: {setting.format(old)} → {setting.format(new)}",
+        extra={"context": "settings"}
+    )
+    notify(
+        "settings",
+        f"⚙️ {setting.label} {action} by {admin_id}: {setting.format(old)} → {setting.format(new)}"
+    )
+
+
+async def update_setting(key: str, raw: str, admin_id: int) -> Tuple[Any, Any]:
+    """Validate, persist and apply a new value (the old one is kept for rollback)"""
+    from db import save_setting
+
+    setting = SETTINGS[key]
+    value = setting.parse(raw)
+    old = VALUES[key]
+    if value == old:
+        # Saving it again would overwrite the value a rollback returns to
+        raise ValueError(f"ℹ️ {setting.label} is already {setting.format(value)}")
+    await save_setting(key, str(value), str(old), admin_id)
+    await _after_update(key, old, value, admin_id, "changed")
+    return old, value
+
+
+async def rollback_setting(key: Optional[str], admin_id: int) -> Optional[Tuple[str, Any, Any]]:
+    """Swap a setting (default: the last changed one) back to its previous value"""
+    from db import swap_setting
+
+    swapped = await swap_setting([key] if key else list(SETTINGS), admin_id)
+    if swapped is None:
+        return None
+    key, value, previous = swapped
+    setting = SETTINGS[key]
+    old, new = setting.parse(previous), setting.parse(value)
+    await _after_update(key, old, new, admin_id, "rolled back")
+    return key, old, new
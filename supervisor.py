@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Restart backoff for crashed long-running tasks (seconds)
+RESTART_BACKOFF_MIN = 1
+RESTART_BACKOFF_MAX = 300
+# A task that ran this long before crashing restarts with the minimum backoff
+STABLE_AFTER = 600
+
+
+class SupervisedTask:
+    """Bookkeeping for one task owned by the supervisor"""
+
+    def __init__(self, name: str, factory: Callable[[], Coroutine], restart: bool):
+        self.name = name
+        self.factory = factory
+        self.restart = restart
+        self.task: Optional[asyncio.Task] = None
+        self.created_at = time.monotonic()
+        self.started_at = self.created_at
+        self.restarts = 0
+        self.state = "running"
+        self.last_error: Optional[str] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "state": self.state,
+            "runtime": round(now - self.started_at, 1),
+            "age": round(now - self.created_at, 1),
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+        }
+
+
+class TaskSupervisor:
+    """Owns background tasks: keeps references, restarts crashes, reports failures"""
+
+    def __init__(self):
+        self.tasks: Dict[str, SupervisedTask] = {}
+        self._stopping = False
+
+    def spawn(
+        self,
+        name: str,
+        factory: Callable[[], Coroutine],
+        restart: bool = False
+    ) -> asyncio.Task:
+        """Start `factory()` as a supervised task (restarted with backoff if `restart`)"""
+        if name in self.tasks:
+            suffix = 2
+            while f"{name}#{suffix}" in self.tasks:
+                suffix += 1
+            name = f"{name}#{suffix}"
+        entry = SupervisedTask(name, factory, restart)
+        self.tasks[name] = entry
+        entry.task = asyncio.create_task(self._run(entry), name=name)
+        return entry.task
+
+    async def _run(self, entry: SupervisedTask):
+        backoff = RESTART_BACKOFF_MIN
+        try:
+            while True:
+                entry.started_at = time.monotonic()
+                entry.state = "running"
+                try:
+                    await entry.factory()
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    entry.last_error = f"{type(e).__name__}: {e}"
+                    await self._report(entry, e)
+                    if not entry.restart or self._stopping:
+                        return
+
+                if time.monotonic() - entry.started_at >= STABLE_AFTER:
+                    backoff = RESTART_BACKOFF_MIN
+                entry.state = f"restarting in {backoff}s"
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+                entry.restarts += 1
+        finally:
+            self.tasks.pop(entry.name, None)
+
+    async def _report(self, entry: SupervisedTask, error: Exception):
+        logger.error(
+            f"Task {entry.name} crashed",
+            exc_info=error,
+            extra={"context": f"task_{entry.name}"}
+        )
+        try:
+            from db import log_error
+            await log_error(context=f"task_{entry.name}", error_text=entry.last_error)
+        except Exception:
+            logger.exception(f"Failed to record crash of task {entry.name}")
+
+        from notifications import notify
+        action = "restarting" if entry.restart and not self._stopping else "not restarted"
+        notify("task_crash", f"💥 Task {entry.name} crashed ({action})\n{entry.last_error}")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Live tasks sorted by name"""
+        return [self.tasks[name].snapshot() for name in sorted(self.tasks)]
+
+    async def cancel(self, exclude: Iterable[str] = (), timeout: Optional[float] = None):
+        """Cancel supervised tasks (except names starting with `exclude`) and wait for them"""
+        self._stopping = True
+        exclude = tuple(exclude)
+        tasks = [
+            entry.task for name, entry in list(self.tasks.items())
+            if not (exclude and name.startswith(exclude)) and entry.task is not None
+        ]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+
+# Supervisor of this process
+SUPERVISOR = TaskSupervisor()
+
+
+def spawn(name: str, factory: Callable[[], Coroutine], restart: bool = False) -> asyncio.Task:
+    """Start a task under this process's supervisor"""
+    return SUPERVISOR.spawn(name, factory, restart)
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from typing import Any, Dict, List, Optional
+
+from config import TRACE_MAX_MB, TRACE_PATH
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds between writes of the buffered events
+FLUSH_INTERVAL = 1.0
+# Events kept while the writer lags behind (older ones are dropped)
+BUFFER_LIMIT = 50000
+
+# Anonymization key of this run, shared with worker processes through the
+# environment and never written to the trace
+_SALT_ENV = "TRACE_SALT"
+
+_buffer: List[str] = []
+_written = 0
+_enabled = bool(TRACE_PATH)
+
+
+def _salt() -> bytes:
+    salt = os.environ.get(_SALT_ENV)
+    if not salt:
+        salt = os.environ[_SALT_ENV] = secrets.token_hex(16)
+    return bytes.fromhex(salt)
+
+
+# Set before worker processes are spawned so they inherit it
+_SALT = _salt() if _enabled else b""
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def anon(value: Any) -> str:
+    """Stable within one run, meaningless outside it"""
+    return hashlib.blake2b(str(value).encode(), key=_SALT, digest_size=6).hexdigest()
+
+
+def trace_path() -> str:
+    """TRACE_PATH for the main process, with the worker name inserted for workers"""
+    name = multiprocessing.current_process().name
+    if name == "MainProcess":
+        return TRACE_PATH
+    root, ext = os.path.splitext(TRACE_PATH)
+    return f"{root}.{name}{ext}"
+
+
+def _record(event: Dict[str, Any]):
+    event["ts"] = round(time.time(), 4)
+    if len(_buffer) >= BUFFER_LIMIT:
+        metrics.inc("trace_dropped")
+        return
+    _buffer.append(json.dumps(event, separators=(",", ":")))
+
+
+def api_call(
+    key: Any,
+    method: str,
+    name: str,
+    seconds: float,
+    attempt: int = 0,
+    error: Optional[BaseException] = None
+):
+    """One Telegram API call: method class, request name, latency and error type"""
+    if not _enabled:
+        return
+    event: Dict[str, Any] = {
+        "k": "api",
+        "a": anon(key),
+        "m": method,
+        "f": name,
+        "ms": round(seconds * 1000, 1),
+    }
+    if attempt:
+        event["r"] = attempt
+    if error is not None:
+        event["e"] = type(error).__name__
+        if hasattr(error, "seconds"):
+            event["w"] = error.seconds
+    _record(event)
+
+
+def _anon_numbers(text: str) -> str:
+    # Account ids, pages and cursors alike (0 carries no information)
+    return re.sub(r"\d+", lambda m: m.group() if m.group() == "0" else "#" + anon(int(m.group())), text)
+
+
+def admin_callback(sender_id: int, data: bytes):
+    """An admin button press, numbers in the callback data anonymized"""
+    if not _enabled:
+        return
+    _record({
+        "k": "cb",
+        "u": anon(sender_id),
+        "d": _anon_numbers(data.decode("utf-8", "replace")),
+    })
+
+
+def admin_message(sender_id: int, text: str):
+    """An admin message: the command name only (codes, passwords and proxies never recorded)"""
+    if not _enabled:
+        return
+    command = text.split(maxsplit=1)[0].split("@")[0] if text.startswith("/") else "text"
+    _record({"k": "msg", "u": anon(sender_id), "t": command})
+
+
+def _append(path: str, lines: List[str]) -> int:
+    data = ("\n".join(lines) + "\n").encode()
+    with open(path, "ab") as f:
+        f.write(data)
+    return len(data)
+
+
+def _flush_now(path: str):
+    """Write out the buffer in this thread (shutdown path)"""
+    global _written
+    if _buffer:
+        _written += _append(path, _buffer)
+        _buffer.clear()
+
+
+async def run_trace_writer():
+    """Append buffered events to the trace file until TRACE_MAX_MB is reached"""
+    global _written, _enabled
+    path = trace_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    logger.info(f"🎞 Recording trace to {path}")
+    try:
+        while _enabled:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            if not _buffer:
+                continue
+            lines = _buffer[:]
+            _buffer.clear()
+            _written += await asyncio.to_thread(_append, path, lines)
+            metrics.inc("trace_events", len(lines))
+            if _written >= TRACE_MAX_MB * 1024 * 1024:
+                _enabled = False
+                logger.warning(f"Trace {path} reached {TRACE_MAX_MB:g} MB, recording stopped")
+    finally:
+        _flush_now(path)